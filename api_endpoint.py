@@ -1,27 +1,129 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
+import datetime
+import json
 import sqlite3
+import threading
+import time
+
+from engagement import fetch_trajectories, to_epoch
+from keyword_discovery import load_emerging
+from lead_lag import INTERVALS, LeadLagCache
+from live_updates import ChangeFeed
+from metrics import counter, histogram, render as render_metrics
+from retention import fetch_history
+from search import search_index_exists, search_posts
+from sentiment_index import fetch_index, latest_index
+from source_comparison import compare_sources_json
+from spikes import WINDOWS, SpikeTracker
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 DB_FILE = "trend_data.db"
 
-def query_trend_data(crypto=None):
+# Created on first use so it follows DB_FILE; it then keeps up with inserts incrementally
+spike_tracker = None
+# Set once the full-text index is known to exist in DB_FILE
+search_index_ready = False
+# Created on first use so it follows DB_FILE; results are recomputed at most every 15 minutes
+lead_lag_cache = None
+# Started on first use; one poller thread serves every /trends/stream client
+change_feed = None
+# Held while creating the objects above, so concurrent first requests share a single one
+create_lock = threading.Lock()
+
+TRENDS_SECONDS = histogram("trends_response_seconds", "Time to stream a complete /trends response")
+TRENDS_ROWS_SCANNED = counter("trends_rows_scanned",
+                              "Rows SQLite visited for /trends (estimated from the query plan)")
+TRENDS_ROWS_RETURNED = counter("trends_rows_returned", "Rows returned by /trends")
+TRENDS_BYTES = counter("trends_bytes_serialized", "Bytes of JSON serialized for /trends")
+
+TIME_RANGE_ERROR = "start and end must be dates (YYYY-MM-DD) or epoch seconds"
+
+def time_range_args():
+    """
+    Read the optional 'start' and 'end' query parameters, given as dates (YYYY-MM-DD[ HH:MM:SS]) or
+    epoch seconds, as epoch seconds (None when absent). A bare end date includes the whole day.
+    Raises ValueError for anything else.
+    """
+    bounds = []
+    for name in ("start", "end"):
+        value = request.args.get(name)
+        if value is None:
+            bounds.append(None)
+        elif value.isdigit():
+            bounds.append(int(value))
+        elif name == "end" and len(value) == 10:
+            bounds.append(to_epoch(value) + 86399)
+        else:
+            bounds.append(to_epoch(value))
+    return tuple(bounds)
+
+def epoch_text(ts):
+    """Epoch seconds as the 'YYYY-MM-DD HH:MM:SS' text stored in trend_data (None stays None)."""
+    if ts is None:
+        return None
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+def estimate_rows_scanned(conn, sql, params, rows_returned):
+    """
+    Estimate how many rows a query visited: all of trend_data if the plan is a full table scan,
+    otherwise just the rows it returned. SQLite does not report the real count through sqlite3.
+    """
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    if any(row[-1].startswith("SCAN") and "INDEX" not in row[-1] for row in plan):
+        # MAX(id) reads one page of the rowid b-tree, unlike COUNT(*)
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM trend_data").fetchone()[0]
+    return rows_returned
+
+def query_trend_data(crypto=None, batch_size=500):
     """
     Query the trend_data table from the SQLite database.
     If a crypto is provided, filter the results.
+
+    Rows are yielded as sqlite3.Row objects straight off the cursor, `batch_size` at a time,
+    so memory use does not depend on how many rows match. Rows scanned and returned are counted
+    in the /metrics registry once the cursor is exhausted.
     """
     conn = sqlite3.connect(DB_FILE)
     conn.row_factory = sqlite3.Row  # Allows us to access columns by name
-    cur = conn.cursor()
     if crypto:
-        cur.execute("SELECT * FROM trend_data WHERE crypto = ? ORDER BY created DESC", (crypto,))
+        sql, params = "SELECT * FROM trend_data WHERE crypto = ? ORDER BY created DESC", (crypto,)
     else:
-        cur.execute("SELECT * FROM trend_data ORDER BY created DESC")
-    rows = cur.fetchall()
-    conn.close()
-    # Convert rows to a list of dictionaries
-    return [dict(row) for row in rows]
+        sql, params = "SELECT * FROM trend_data ORDER BY created DESC", ()
+    returned = 0
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            returned += len(rows)
+            yield from rows
+        TRENDS_ROWS_RETURNED.inc(returned)
+        TRENDS_ROWS_SCANNED.inc(estimate_rows_scanned(conn, sql, params, returned))
+    finally:
+        conn.close()
+
+def stream_json_array(rows):
+    """
+    Serialize rows as a JSON array one element at a time, for use as a streaming response body.
+    Keys are sorted to match the output of jsonify(). The serialized size is counted in /metrics.
+    """
+    yield "["
+    size = 2
+    first = True
+    for row in rows:
+        if not first:
+            yield ","
+            size += 1
+        first = False
+        chunk = json.dumps(dict(row), sort_keys=True)
+        size += len(chunk)
+        yield chunk
+    yield "]"
+    TRENDS_BYTES.inc(size)
 
 @app.route("/trends", methods=["GET"])
 def get_trends():
@@ -29,11 +131,252 @@ def get_trends():
     API endpoint to return aggregated trend data in JSON format.
     You can filter by a specific cryptocurrency using the 'crypto' query parameter.
     For example: http://127.0.0.1:5000/trends?crypto=bitcoin
+
+    The response is streamed out of the database cursor rather than built in memory.
     """
     crypto_filter = request.args.get("crypto")
     data = query_trend_data(crypto_filter)
+
+    def timed(chunks):
+        # The handler returns before the body is sent, so time the stream itself
+        start = time.perf_counter()
+        yield from chunks
+        TRENDS_SECONDS.observe(time.perf_counter() - start)
+
+    return Response(timed(stream_json_array(data)), mimetype="application/json")
+
+@app.route("/trends/stream", methods=["GET"])
+def get_trend_stream():
+    """
+    Server-Sent Events stream of newly committed trend rows, as `rows` events (the same fields as
+    /trends) each followed by a `rollup` event with per-day mention and sentiment deltas.
+    Filter with the 'crypto' query parameter. Reconnecting clients resume from their Last-Event-ID
+    header (or 'since', a row id); one that missed more rows than are replayed gets a `reset` event
+    first and should reload /trends.
+    For example: new EventSource("http://127.0.0.1:5000/trends/stream?crypto=bitcoin")
+    """
+    global change_feed
+    with create_lock:
+        if change_feed is None:
+            change_feed = ChangeFeed(DB_FILE)
+
+    since = request.headers.get("Last-Event-ID") or request.args.get("since")
+    if since is not None and not since.isdigit():
+        return jsonify({"error": "since must be a row id"}), 400
+    body = change_feed.stream(request.args.get("crypto"), int(since) if since else None)
+    return Response(body, mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/trends/spikes", methods=["GET"])
+def get_spikes():
+    """
+    API endpoint to return the cryptocurrencies whose mention rate is currently spiking.
+    Optional query parameters: 'window' (1h, 6h or 24h), 'min_z' (z-score threshold, default 3),
+    'min_count' (minimum mentions in the window, default 5) and 'all' to return every crypto's scores.
+    For example: http://127.0.0.1:5000/trends/spikes?window=6h&min_z=2.5
+    """
+    global spike_tracker
+    with create_lock:
+        if spike_tracker is None:
+            spike_tracker = SpikeTracker(DB_FILE)
+
+    window = request.args.get("window", "1h")
+    if window not in WINDOWS:
+        return jsonify({"error": f"window must be one of {', '.join(WINDOWS)}"}), 400
+    try:
+        min_z = float(request.args.get("min_z", 3.0))
+        min_count = int(request.args.get("min_count", 5))
+    except ValueError:
+        return jsonify({"error": "min_z must be a number and min_count an integer"}), 400
+    if request.args.get("all"):
+        return jsonify(spike_tracker.scores(window))
+    return jsonify(spike_tracker.spikes(window, min_z, min_count))
+
+@app.route("/trends/emerging", methods=["GET"])
+def get_emerging():
+    """
+    API endpoint to return terms (words, phrases, $TICKERs) whose frequency is accelerating,
+    as saved by the last aggregation run. Use 'limit' to cap the number of terms (default 25).
+    For example: http://127.0.0.1:5000/trends/emerging?limit=10
+    """
+    limit = request.args.get("limit", "25")
+    if not limit.isdigit():
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        data = load_emerging(conn, int(limit))
+    finally:
+        conn.close()
     return jsonify(data)
 
+@app.route("/search", methods=["GET"])
+def get_search():
+    """
+    API endpoint for full-text search over post titles, ranked by relevance, with hits per day.
+    'q' is required; 'crypto', 'start' and 'end' (YYYY-MM-DD or epoch seconds) and 'limit' are optional.
+    For example: http://127.0.0.1:5000/search?q=ETF%20approval&crypto=bitcoin&start=2025-01-01
+    """
+    global search_index_ready
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    limit = request.args.get("limit", "50")
+    if not limit.isdigit():
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    try:
+        start, end = time_range_args()
+    except ValueError:
+        return jsonify({"error": TIME_RANGE_ERROR}), 400
+
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        if not search_index_ready:
+            # Read-only: the writers create and fill the index (writer_daemon.create_tables)
+            if not search_index_exists(conn):
+                return jsonify({"error": "the search index has not been built yet"}), 503
+            search_index_ready = True
+        data = search_posts(
+            conn,
+            query,
+            crypto=request.args.get("crypto"),
+            start=epoch_text(start),
+            end=epoch_text(end),
+            limit=int(limit),
+        )
+    finally:
+        conn.close()
+    data["query"] = query
+    return jsonify(data)
+
+@app.route("/engagement", methods=["GET"])
+def get_engagement():
+    """
+    API endpoint to return score/comment trajectories for every post about a cryptocurrency.
+    'crypto' is required; 'start' and 'end' (YYYY-MM-DD or epoch seconds) bound the snapshot times,
+    and a bare end date includes that whole day.
+    For example: http://127.0.0.1:5000/engagement?crypto=bitcoin&start=2025-02-01&end=2025-02-28
+    """
+    crypto = request.args.get("crypto")
+    if not crypto:
+        return jsonify({"error": "crypto is required"}), 400
+    try:
+        start, end = time_range_args()
+    except ValueError:
+        return jsonify({"error": TIME_RANGE_ERROR}), 400
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        data = fetch_trajectories(conn, crypto, start, end)
+    finally:
+        conn.close()
+    return jsonify(data)
+
+@app.route("/trends/history", methods=["GET"])
+def get_history():
+    """
+    API endpoint to return mentions and mean sentiment per crypto and hour or day over the whole
+    retained history, including periods retention.py has already rolled up.
+    Optional query parameters: 'crypto', 'start' and 'end' (YYYY-MM-DD or epoch seconds) and 'interval'
+    (hour or day).
+    For example: http://127.0.0.1:5000/trends/history?crypto=bitcoin&start=2024-01-01&interval=day
+    """
+    interval = request.args.get("interval", "day")
+    if interval not in ("hour", "day"):
+        return jsonify({"error": "interval must be hour or day"}), 400
+    try:
+        start, end = time_range_args()
+    except ValueError:
+        return jsonify({"error": TIME_RANGE_ERROR}), 400
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        data = fetch_history(
+            conn,
+            crypto=request.args.get("crypto"),
+            start=epoch_text(start),
+            end=epoch_text(end),
+            interval=interval,
+        )
+    finally:
+        conn.close()
+    return jsonify(data)
+
+@app.route("/trends/sentiment-index", methods=["GET"])
+def get_sentiment_index():
+    """
+    API endpoint to return the engagement-weighted, time-decayed sentiment index (see sentiment_index.py).
+    With 'crypto', returns its hourly series, optionally bounded by 'start' and 'end' (YYYY-MM-DD or
+    epoch seconds); without it, the current index of every crypto.
+    For example: http://127.0.0.1:5000/trends/sentiment-index?crypto=bitcoin&start=2025-02-01
+    """
+    crypto = request.args.get("crypto")
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        if not crypto:
+            return jsonify(latest_index(conn))
+        try:
+            start, end = time_range_args()
+        except ValueError:
+            return jsonify({"error": TIME_RANGE_ERROR}), 400
+        return jsonify(fetch_index(conn, crypto, start, end))
+    finally:
+        conn.close()
+
+@app.route("/trends/compare", methods=["GET"])
+def get_source_comparison():
+    """
+    API endpoint to return Reddit and Twitter mention counts and mean sentiment side by side per crypto
+    and hour, with flags for hours where the sources diverge (see source_comparison.py).
+    Optional query parameters: 'crypto', 'start' and 'end' (YYYY-MM-DD or epoch seconds) and
+    'divergent' (1 for flagged hours only).
+    For example: http://127.0.0.1:5000/trends/compare?crypto=bitcoin&start=2025-01-01&divergent=1
+    """
+    try:
+        start, end = time_range_args()
+    except ValueError:
+        return jsonify({"error": TIME_RANGE_ERROR}), 400
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        # The rows are stored as JSON, so the response is sent as read
+        body = compare_sources_json(
+            conn,
+            crypto=request.args.get("crypto"),
+            start=start,
+            end=end,
+            divergent_only=request.args.get("divergent") == "1",
+        )
+    finally:
+        conn.close()
+    return Response(body, mimetype="application/json")
+
+@app.route("/trends/lead-lag", methods=["GET"])
+def get_lead_lag():
+    """
+    API endpoint to return how sentiment and mention counts correlate with price returns at several
+    lags, per crypto with imported price data (see prices.py and lead_lag.py). Positive lags mean
+    the signal leads price. Optional query parameters: 'interval' (1h, 4h or 1d) and 'window'
+    (intervals in the rolling correlation, default 168).
+    For example: http://127.0.0.1:5000/trends/lead-lag?interval=1d&window=30
+    """
+    global lead_lag_cache
+    with create_lock:
+        if lead_lag_cache is None:
+            lead_lag_cache = LeadLagCache(DB_FILE)
+
+    interval = request.args.get("interval", "1h")
+    if interval not in INTERVALS:
+        return jsonify({"error": f"interval must be one of {', '.join(INTERVALS)}"}), 400
+    window = request.args.get("window", "168")
+    if not window.isdigit() or int(window) < 2:
+        return jsonify({"error": "window must be an integer of at least 2"}), 400
+    return jsonify(lead_lag_cache.get(INTERVALS[interval], int(window)))
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Prometheus scrape endpoint: request and row counters for this API process, in the text
+    exposition format. The aggregators export their own metrics (see metrics.py).
+    """
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     # Run the Flask development server on port 5000
     app.run(debug=True, port=5000)
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+"""
+benchmark.py
+
+Reproducible benchmarks for the hot paths, driven by synthetic_corpus.py:
+
+  match          identify_crypto_in_text() over synthetic titles
+  sentiment      VADER polarity_scores() over the same titles
+  insert_single  insert_trend_data(), one connection and commit per record
+  insert_batch   insert_trend_data_batch(), the pipeline's batched write path
+  pipeline       the whole aggregation pipeline over a replayed synthetic fixture
+  query          query_trend_data() for one crypto, at each table size
+  trends_api     GET /trends?crypto=... through Flask's test client, at each table size
+
+Synthetic databases for the table-size benchmarks are cached in --workdir, keyed by size, density
+and seed, so repeated runs (and runs on different commits) measure against identical data.
+
+Each run writes a JSON file to benchmark_results/ named after the time and git commit. Compare two
+runs with the `compare` command, which exits non-zero if anything got slower than --threshold.
+
+Usage:
+  python benchmark.py run
+  python benchmark.py run --sizes 10000,100000,1000000 --density 0.4
+  python benchmark.py compare benchmark_results/old.json benchmark_results/new.json --threshold 0.1
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+RESULTS_DIR = "benchmark_results"
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def result(name, ops, seconds, size=None, latencies=None, **extra):
+    """Build one result entry; latencies (seconds) add p50/p95 in milliseconds."""
+    entry = {"name": name, "size": size, "ops": ops, "seconds": round(seconds, 6),
+             "ops_per_sec": round(ops / seconds, 2) if seconds else None}
+    if latencies:
+        entry["p50_ms"] = round(percentile(latencies, 50) * 1000, 3)
+        entry["p95_ms"] = round(percentile(latencies, 95) * 1000, 3)
+    entry.update(extra)
+    return entry
+
+
+def bench_match(aggregator, titles):
+    start = time.perf_counter()
+    for title in titles:
+        aggregator.identify_crypto_in_text(title)
+    return result("match", len(titles), time.perf_counter() - start)
+
+
+def bench_sentiment(aggregator, titles):
+    sia = aggregator.SentimentIntensityAnalyzer()
+    start = time.perf_counter()
+    for title in titles:
+        sia.polarity_scores(title)
+    return result("sentiment", len(titles), time.perf_counter() - start)
+
+
+def bench_insert(aggregator, generator, workdir, single_rows, batch_rows, batch_size):
+    aggregator.DB_FILE = os.path.join(workdir, "insert.db")
+    if os.path.exists(aggregator.DB_FILE):
+        os.remove(aggregator.DB_FILE)
+    aggregator.create_database()
+
+    records = list(generator.records(single_rows, scored=True))
+    start = time.perf_counter()
+    for record in records:
+        aggregator.insert_trend_data(record)
+    single = result("insert_single", single_rows, time.perf_counter() - start)
+
+    records = list(generator.records(batch_rows, scored=True))
+    start = time.perf_counter()
+    for i in range(0, len(records), batch_size):
+        aggregator.insert_trend_data_batch(records[i:i + batch_size])
+    batch = result("insert_batch", batch_rows, time.perf_counter() - start, batch_size=batch_size)
+    return [single, batch]
+
+
+def bench_pipeline(aggregator, workdir, rows, density, seed):
+    from connectors import ReplayConnector
+    from synthetic_corpus import write_fixture
+
+    fixture = os.path.join(workdir, f"fixture-{rows}-{density}-{seed}.jsonl")
+    if not os.path.exists(fixture):
+        write_fixture(fixture, rows, density, seed)
+    aggregator.DB_FILE = os.path.join(workdir, "pipeline.db")
+    if os.path.exists(aggregator.DB_FILE):
+        os.remove(aggregator.DB_FILE)
+    aggregator.create_database()
+
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        # Never through a running writer daemon: that would write the synthetic rows to the live database
+        aggregator.aggregate_trend_data(ReplayConnector(fixture), max_batches=None, use_writer=False)
+    return result("pipeline", rows, time.perf_counter() - start)
+
+
+def synthetic_db(workdir, size, density, seed):
+    """Return the path of a cached synthetic database with `size` rows, building it if needed."""
+    from synthetic_corpus import build_database
+
+    path = os.path.join(workdir, f"trends-{size}-{density}-{seed}.db")
+    if not os.path.exists(path):
+        print(f"  building {size}-row synthetic database...", file=sys.stderr)
+        building = path + ".building"
+        if os.path.exists(building):
+            os.remove(building)
+        build_database(building, size, density, seed)
+        os.replace(building, path)
+    return path
+
+
+def bench_queries(db_file, size, crypto, repeat):
+    import api_endpoint
+
+    api_endpoint.DB_FILE = db_file
+    latencies = []
+    rows = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = sum(1 for _ in api_endpoint.query_trend_data(crypto))
+        latencies.append(time.perf_counter() - start)
+    query = result("query", repeat, sum(latencies), size=size, latencies=latencies, rows=rows)
+
+    client = api_endpoint.app.test_client()
+    latencies = []
+    size_bytes = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(f"/trends?crypto={crypto}")
+        size_bytes = len(response.data)
+        latencies.append(time.perf_counter() - start)
+    api = result("trends_api", repeat, sum(latencies), size=size, latencies=latencies, bytes=size_bytes)
+    return [query, api]
+
+
+def run(args):
+    import data_aggregator_with_crypto_filter_and_comments as aggregator
+    from synthetic_corpus import CorpusGenerator
+
+    os.makedirs(args.workdir, exist_ok=True)
+    generator = CorpusGenerator(density=args.density, seed=args.seed)
+    titles = [record.title for record in generator.records(args.text_rows)]
+
+    results = []
+    print("match / sentiment...", file=sys.stderr)
+    results.append(bench_match(aggregator, titles))
+    results.append(bench_sentiment(aggregator, titles[:args.sentiment_rows]))
+    print("inserts...", file=sys.stderr)
+    results.extend(bench_insert(aggregator, generator, args.workdir, args.single_rows,
+                                args.batch_rows, args.batch_size))
+    print("pipeline...", file=sys.stderr)
+    results.append(bench_pipeline(aggregator, args.workdir, args.pipeline_rows, args.density, args.seed))
+    for size in args.sizes:
+        print(f"queries at {size} rows...", file=sys.stderr)
+        db_file = synthetic_db(args.workdir, size, args.density, args.seed)
+        results.extend(bench_queries(db_file, size, args.crypto, args.repeat))
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "params": {key: value for key, value in vars(args).items() if key != "func"},
+        "results": results,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = args.output or os.path.join(RESULTS_DIR, f"{stamp}-{commit}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'benchmark':<14} {'size':>9} {'ops':>8} {'ops/s':>12} {'p50 ms':>9} {'p95 ms':>9}")
+    for r in results:
+        print(f"{r['name']:<14} {r['size'] or '':>9} {r['ops']:>8} {r['ops_per_sec'] or 0:>12.1f} "
+              f"{r.get('p50_ms', ''):>9} {r.get('p95_ms', ''):>9}")
+    print(f"Results written to {path}")
+
+
+def compare(args):
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    baseline = {(r["name"], r["size"]): r for r in old["results"]}
+
+    regressions = 0
+    print(f"{old['commit']} -> {new['commit']}")
+    print(f"{'benchmark':<14} {'size':>9} {'old ops/s':>12} {'new ops/s':>12} {'change':>8}")
+    for r in new["results"]:
+        before = baseline.get((r["name"], r["size"]))
+        if not before or not before["ops_per_sec"] or not r["ops_per_sec"]:
+            continue
+        change = r["ops_per_sec"] / before["ops_per_sec"] - 1
+        flag = ""
+        if change < -args.threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{r['name']:<14} {r['size'] or '':>9} {before['ops_per_sec']:>12.1f} "
+              f"{r['ops_per_sec']:>12.1f} {change:>+7.1%}{flag}")
+    if regressions:
+        print(f"{regressions} benchmark(s) slower by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion and serving hot paths.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Run the benchmarks and write a results file")
+    run_parser.add_argument("--sizes", default="1000,10000,100000",
+                            type=lambda value: [int(size) for size in value.split(",")],
+                            help="Comma-separated table sizes for the query benchmarks (up to 10000000)")
+    run_parser.add_argument("--density", type=float, default=0.6, help="Fraction of items mentioning a crypto")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--text-rows", type=int, default=20000)
+    run_parser.add_argument("--sentiment-rows", type=int, default=5000)
+    run_parser.add_argument("--single-rows", type=int, default=1000)
+    run_parser.add_argument("--batch-rows", type=int, default=20000)
+    run_parser.add_argument("--batch-size", type=int, default=200)
+    run_parser.add_argument("--pipeline-rows", type=int, default=5000)
+    run_parser.add_argument("--crypto", default="bitcoin")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "cryptotrend-bench"),
+                            help="Where synthetic databases and fixtures are cached")
+    run_parser.add_argument("--output", help="Results file (default: benchmark_results/<time>-<commit>.json)")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = sub.add_parser("compare", help="Compare two results files")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="Relative slowdown that counts as a regression (default 0.1 = 10%%)")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
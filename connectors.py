@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+"""
+connectors.py
+
+A common connector interface for the sources this project ingests from: Reddit (via PRAW), Pushshift
+(via requests) and Twitter (via Tweepy). Every connector answers the same question:
+
+    records, cursor = connector.fetch_batch(cursor)
+
+"give me the next batch of posts after this cursor", where `records` is a list of normalized TrendRecord
+objects (see records.py) and `cursor` is what to pass on the next call to pick up where this batch
+stopped. Connectors fill in:
+
+    source, post_id, title, selftext, score, num_comments, created
+
+with `created` as a naive UTC datetime, so the same matching/scoring/storage code works on any source.
+
+Each connector does its work in two halves: fetch_raw() talks to the API and returns JSON-serializable
+payloads, and normalize() turns one payload into a record. The record/replay layer sits between the two:
+RecordingConnector appends every raw response to a JSONL fixture file, and ReplayConnector serves those
+responses back (optionally looped, with fresh ids and shifted timestamps on every pass) without touching
+the network, so the full pipeline can be benchmarked and load-tested offline at any volume.
+
+Dependencies:
+  - praw (Reddit only)
+  - requests (Pushshift only)
+  - tweepy (Twitter only)
+  Replaying fixtures needs none of them.
+
+Usage:
+  python connectors.py record reddit fixtures/reddit.jsonl --batches 3
+  python connectors.py replay fixtures/reddit.jsonl --loops 10
+"""
+
+import argparse
+import datetime
+import json
+import os
+import time
+
+from metrics import counter, histogram
+from records import TrendRecord
+
+FETCH_SECONDS = histogram("source_fetch_seconds", "Time to fetch one batch from a source API", ("source",))
+RECORDS_FETCHED = counter("source_records_fetched", "Records fetched from source APIs", ("source",))
+COMMENT_SECONDS = histogram("comment_fetch_seconds", "Time to fetch the top comments of one post", ("source",))
+
+
+class SourceConnector:
+    """
+    Base class for all source connectors.
+
+    Subclasses set `source` and implement fetch_raw() and normalize(); fetch_batch() and
+    fetch_comments() are what the ingestion scripts call.
+    """
+
+    source = None
+
+    def fetch_raw(self, cursor):
+        """
+        Fetch one raw batch from the upstream API.
+
+        Returns:
+          (payload, next_cursor) where payload is a list of JSON-serializable dicts.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def normalize(item):
+        """Convert one raw payload item into a normalized TrendRecord."""
+        raise NotImplementedError
+
+    def fetch_comments_raw(self, post_id, limit=5):
+        """Fetch the raw text of the top comments for a post. Sources without comments return []."""
+        return []
+
+    def fetch_batch(self, cursor=None):
+        """
+        Fetch the next batch of normalized records after `cursor`.
+
+        Returns:
+          (records, next_cursor). An empty records list means there is nothing new yet.
+        """
+        payload, next_cursor = self.fetch_raw(cursor)
+        return [self.normalize(item) for item in payload], next_cursor
+
+    def fetch_comments(self, post_id, limit=5):
+        """Return the bodies of the top `limit` comments for a post."""
+        with COMMENT_SECONDS.time(source=self.source):
+            return self.fetch_comments_raw(post_id, limit)
+
+
+class RedditConnector(SourceConnector):
+    """
+    Newest posts from a subreddit through PRAW. The cursor is the fullname (t3_xxx) of the newest post
+    already seen; Reddit's `before` listing parameter then returns only posts newer than it.
+    """
+
+    source = "reddit"
+
+    def __init__(self, client_id, client_secret, user_agent, subreddit="CryptoCurrency", limit=100):
+        import praw  # Imported lazily so replaying fixtures does not require praw
+
+        self.reddit = praw.Reddit(client_id=client_id, client_secret=client_secret, user_agent=user_agent)
+        self.subreddit = subreddit
+        self.limit = limit
+
+    def fetch_raw(self, cursor):
+        params = {"before": cursor} if cursor else {}
+        listing = self.reddit.subreddit(self.subreddit).new(limit=self.limit, params=params)
+        payload = [
+            {
+                "id": post.id,
+                "name": post.name,
+                "title": post.title,
+                "selftext": post.selftext or "",
+                "score": post.score,
+                "num_comments": post.num_comments,
+                "created_utc": post.created_utc,
+            }
+            for post in listing
+        ]
+        # Listings are newest first, so the first post becomes the new high-water mark
+        next_cursor = payload[0]["name"] if payload else cursor
+        return payload, next_cursor
+
+    @staticmethod
+    def normalize(item):
+        return TrendRecord(
+            source="reddit",
+            post_id=item["id"],
+            title=item["title"],
+            selftext=item.get("selftext", ""),
+            score=item.get("score", 0),
+            num_comments=item.get("num_comments", 0),
+            created=datetime.datetime.utcfromtimestamp(item["created_utc"]),
+        )
+
+    def fetch_comments_raw(self, post_id, limit=5):
+        submission = self.reddit.submission(id=post_id)
+        submission.comments.replace_more(limit=0)
+        return [comment.body for comment in submission.comments.list()[:limit]]
+
+
+class PushshiftConnector(SourceConnector):
+    """
+    Historical submissions from the Pushshift API. The cursor is the epoch `after` timestamp; each batch
+    is sorted ascending, so the last post's created_utc becomes the next cursor.
+    """
+
+    source = "pushshift"
+
+    def __init__(self, subreddit="CryptoCurrency", start=None, end=None, size=100):
+        self.subreddit = subreddit
+        self.start = start or 0
+        self.end = end
+        self.size = size
+
+    def fetch_raw(self, cursor):
+        # Reuse the existing request/retry logic from the backfill script
+        from data_aggregator_pushshift import fetch_pushshift_data
+
+        after = cursor if cursor is not None else self.start
+        before = self.end or int(time.time())
+        if after >= before:
+            return [], after
+        posts = fetch_pushshift_data(self.subreddit, after, before, size=self.size)
+        payload = [
+            {
+                "id": post.get("id"),
+                "title": post.get("title", ""),
+                "selftext": post.get("selftext", ""),
+                "score": post.get("score", 0),
+                "num_comments": post.get("num_comments", 0),
+                "created_utc": post["created_utc"],
+            }
+            for post in posts
+        ]
+        next_cursor = int(payload[-1]["created_utc"]) if payload else after
+        return payload, next_cursor
+
+    @staticmethod
+    def normalize(item):
+        return TrendRecord(
+            source="pushshift",
+            post_id=item["id"],
+            title=item["title"],
+            selftext=item.get("selftext", ""),
+            score=item.get("score", 0),
+            num_comments=item.get("num_comments", 0),
+            created=datetime.datetime.utcfromtimestamp(item["created_utc"]),
+        )
+
+
+class TwitterConnector(SourceConnector):
+    """
+    Recent tweets matching a keyword through Tweepy (Twitter API v2). The cursor is the newest tweet id
+    already seen and is passed as `since_id`. Likes map to `score` and replies to `num_comments`.
+    """
+
+    source = "twitter"
+
+    def __init__(self, bearer_token, keyword, max_results=100):
+        import tweepy  # Imported lazily so replaying fixtures does not require tweepy
+
+        self.client = tweepy.Client(bearer_token=bearer_token)
+        self.keyword = keyword
+        self.max_results = max_results
+
+    def fetch_raw(self, cursor):
+        query = f"{self.keyword} -is:retweet lang:en"
+        response = self.client.search_recent_tweets(
+            query=query,
+            max_results=self.max_results,
+            since_id=cursor,
+            tweet_fields=["created_at", "text", "public_metrics"],
+        )
+        if response.data is None:
+            return [], cursor
+        payload = [tweet.data for tweet in response.data]
+        next_cursor = response.meta.get("newest_id", cursor)
+        return payload, next_cursor
+
+    @staticmethod
+    def normalize(item):
+        metrics = item.get("public_metrics", {})
+        created = datetime.datetime.strptime(item["created_at"][:19], "%Y-%m-%dT%H:%M:%S")
+        return TrendRecord(
+            source="twitter",
+            post_id=item["id"],
+            title=item["text"],
+            selftext="",
+            score=metrics.get("like_count", 0),
+            num_comments=metrics.get("reply_count", 0),
+            created=created,
+        )
+
+
+# Used by replay to normalize payloads without instantiating (and authenticating) a live connector
+CONNECTORS = {
+    "reddit": RedditConnector,
+    "pushshift": PushshiftConnector,
+    "twitter": TwitterConnector,
+}
+
+
+class RecordingConnector(SourceConnector):
+    """
+    Wraps a live connector and appends every raw response it returns to a JSONL fixture file.
+
+    Each line is either {"kind": "batch", "source", "cursor", "next_cursor", "payload"} or
+    {"kind": "comments", "source", "post_id", "payload"}.
+    """
+
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.source = inner.source
+        self.normalize = inner.normalize
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _append(self, entry):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def fetch_raw(self, cursor):
+        payload, next_cursor = self.inner.fetch_raw(cursor)
+        self._append({
+            "kind": "batch",
+            "source": self.source,
+            "cursor": cursor,
+            "next_cursor": next_cursor,
+            "payload": payload,
+        })
+        return payload, next_cursor
+
+    def fetch_comments_raw(self, post_id, limit=5):
+        payload = self.inner.fetch_comments_raw(post_id, limit)
+        self._append({"kind": "comments", "source": self.source, "post_id": post_id, "payload": payload})
+        return payload
+
+
+class ReplayConnector(SourceConnector):
+    """
+    Serves recorded batches from a fixture file instead of calling the network.
+
+    The cursor is simply the index of the next batch to serve. With `loops` > 1 (or None for no limit)
+    the fixture is replayed again and again; every pass after the first gets a "-<pass>" suffix on its
+    post ids and has its timestamps shifted forward by the fixture's time span, so replayed volume looks
+    like new data to anything downstream.
+    """
+
+    def __init__(self, path, loops=1):
+        self.path = path
+        self.loops = loops
+        self.batches = []
+        self.comments = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry["kind"] == "batch":
+                    if entry["payload"]:
+                        self.batches.append(entry)
+                else:
+                    self.comments[entry["post_id"]] = entry["payload"]
+        if not self.batches:
+            raise ValueError(f"No recorded batches in {path}")
+        self.source = self.batches[0]["source"]
+        self._normalize_raw = CONNECTORS[self.source].normalize
+
+        created = [self._normalize_raw(item).created for entry in self.batches for item in entry["payload"]]
+        # Shift each pass past the previous one; at least one second so single-post fixtures still advance
+        self.span = max(max(created) - min(created), datetime.timedelta(seconds=1))
+
+    def fetch_raw(self, cursor):
+        position = cursor or 0
+        if self.loops is not None and position >= self.loops * len(self.batches):
+            return [], position
+        return self.batches[position % len(self.batches)]["payload"], position + 1
+
+    def fetch_batch(self, cursor=None):
+        position = cursor or 0
+        payload, next_cursor = self.fetch_raw(position)
+        replay_pass = position // len(self.batches)
+        records = []
+        for item in payload:
+            record = self._normalize_raw(item)
+            if replay_pass:
+                record.post_id = f"{record.post_id}-{replay_pass}"
+                record.created += self.span * replay_pass
+            records.append(record)
+        return records, next_cursor
+
+    def normalize(self, item):
+        return self._normalize_raw(item)
+
+    def fetch_comments_raw(self, post_id, limit=5):
+        # Looped passes carry a "-<pass>" suffix; the recorded comments belong to the original id
+        original_id = str(post_id).rsplit("-", 1)[0] if str(post_id) not in self.comments else post_id
+        return self.comments.get(original_id, [])[:limit]
+
+
+def iter_records(connector, cursor=None, max_batches=None):
+    """
+    Yield (record, cursor) pairs from a connector until it returns an empty batch or `max_batches`
+    batches have been read. The cursor yielded alongside each record is the one to resume from.
+    """
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with FETCH_SECONDS.time(source=connector.source):
+            records, cursor = connector.fetch_batch(cursor)
+        RECORDS_FETCHED.inc(len(records), source=connector.source)
+        if not records:
+            break
+        batches += 1
+        for record in records:
+            yield record, cursor
+
+
+def build_connector(source, **kwargs):
+    """Build a live connector for `source` using credentials from the environment."""
+    if source == "reddit":
+        return RedditConnector(
+            client_id=os.getenv("REDDIT_CLIENT_ID", ""),
+            client_secret=os.getenv("REDDIT_CLIENT_SECRET", ""),
+            user_agent=os.getenv("REDDIT_USER_AGENT", "CryptoTrendDashboard"),
+            **kwargs,
+        )
+    if source == "pushshift":
+        return PushshiftConnector(**kwargs)
+    if source == "twitter":
+        return TwitterConnector(
+            bearer_token=os.getenv("TWITTER_BEARER_TOKEN", ""),
+            keyword=kwargs.pop("keyword", "bitcoin"),
+            **kwargs,
+        )
+    raise ValueError(f"Unknown source: {source}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record live API responses to fixtures, or replay them.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    record = sub.add_parser("record", help="Fetch live batches and save the raw responses")
+    record.add_argument("source", choices=sorted(CONNECTORS))
+    record.add_argument("path")
+    record.add_argument("--batches", type=int, default=1)
+    record.add_argument("--comments", type=int, default=0, help="Also record this many comments per post")
+
+    replay = sub.add_parser("replay", help="Replay a fixture and print what it yields")
+    replay.add_argument("path")
+    replay.add_argument("--loops", type=int, default=1)
+
+    args = parser.parse_args()
+
+    if args.command == "record":
+        connector = RecordingConnector(build_connector(args.source), args.path)
+        count = 0
+        for record, _ in iter_records(connector, max_batches=args.batches):
+            if args.comments:
+                connector.fetch_comments(record.post_id, limit=args.comments)
+            count += 1
+        print(f"Recorded {count} {args.source} records to {args.path}")
+    else:
+        connector = ReplayConnector(args.path, loops=args.loops)
+        start = time.perf_counter()
+        count = sum(1 for _ in iter_records(connector))
+        elapsed = time.perf_counter() - start
+        print(f"Replayed {count} {connector.source} records in {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
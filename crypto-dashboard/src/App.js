@@ -1,5 +1,5 @@
 // File: src/App.js
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useMemo, useRef } from 'react';
 import axios from 'axios';
 import { Line } from 'react-chartjs-2';
 import { Chart, LineElement, CategoryScale, LinearScale, PointElement, Tooltip, Legend } from 'chart.js';
@@ -8,73 +8,173 @@ import 'react-datepicker/dist/react-datepicker.css';
 
 Chart.register(LineElement, CategoryScale, LinearScale, PointElement, Tooltip, Legend);
 
+const API_URL = 'http://127.0.0.1:5000';
+
 // Helper function to format a date as YYYY-MM-DD
 const formatDate = (date) => new Date(date).toISOString().split('T')[0];
 
-// Group sentiment data by day using the "YYYY-MM-DD" date string as key
-const groupSentimentByDay = (data) => {
-  const grouped = {};
+// Average the compound score of each day's posts, keyed by "YYYY-MM-DD"
+const meanSentimentByDay = (data) => {
+  const totals = {};
   data.forEach(item => {
     const day = formatDate(item.created);
-    if (!grouped[day]) {
-      grouped[day] = [];
+    if (!totals[day]) {
+      totals[day] = { sum: 0, count: 0 };
     }
-    grouped[day].push(item);
+    totals[day].sum += item.sentiment_compound;
+    totals[day].count += 1;
   });
-  // For each day, select the last data point (you could also average the values)
-  const result = Object.keys(grouped).map(day => {
-    const items = grouped[day];
-    return items[items.length - 1];
+  const result = {};
+  Object.keys(totals).forEach(day => {
+    result[day] = totals[day].sum / totals[day].count;
   });
-  // Sort the results by date
-  result.sort((a, b) => new Date(a.created) - new Date(b.created));
   return result;
 };
 
+// The sentiment index at the end of each day: the last hourly point of the day, in date order
+const indexByDay = (points) => {
+  const result = {};
+  points.forEach(point => {
+    result[point.time.split(' ')[0]] = point.value;
+  });
+  return Object.keys(result).sort().map(day => ({ day, value: result[day] }));
+};
+
 function App() {
   // State for trend (sentiment) data
   const [trendData, setTrendData] = useState([]);
+  // Hourly points of the engagement-weighted sentiment index
+  const [indexPoints, setIndexPoints] = useState([]);
+  // ts of the newest index point received, so pushes only fetch what is newer
+  const lastIndexTs = useRef(null);
   
   // Selected cryptocurrency and date range
   const [crypto, setCrypto] = useState('bitcoin');
+  // The crypto on screen, so responses that arrive after the user switched away are dropped
+  const currentCrypto = useRef(crypto);
   const [startDate, setStartDate] = useState(new Date(new Date().setDate(new Date().getDate() - 7))); // Default 7 days ago
   const [endDate, setEndDate] = useState(new Date());
 
-  // Fetch sentiment/trend data from our Flask API
+  // Fetch the full history for the selected crypto from our Flask API
   const fetchTrendData = async () => {
     try {
-      const response = await axios.get(`http://127.0.0.1:5000/trends?crypto=${crypto}`);
-      console.log('Trend API response:', response.data);
-      // Filter data by the selected date range
-      const filtered = response.data.filter(item => {
-        const itemDate = new Date(item.created);
-        return itemDate >= startDate && itemDate <= endDate;
+      const response = await axios.get(`${API_URL}/trends?crypto=${crypto}`);
+      if (crypto !== currentCrypto.current) {
+        return;
+      }
+      // Keep the rows the stream appended while this request was in flight
+      setTrendData(previous => {
+        const fetched = new Set(response.data.map(item => item.id));
+        return [...response.data, ...previous.filter(item => !fetched.has(item.id))];
       });
-      setTrendData(filtered);
     } catch (error) {
       console.error('Error fetching trend data:', error);
     }
   };
 
-  // Fetch data when crypto or date range changes
+  // The index is stored server-side as a time series, so this is a small range read
+  const fetchIndex = async () => {
+    try {
+      const response = await axios.get(`${API_URL}/trends/sentiment-index?crypto=${crypto}`);
+      if (crypto !== currentCrypto.current) {
+        return;
+      }
+      setIndexPoints(response.data);
+      lastIndexTs.current = response.data.length ? response.data[response.data.length - 1].ts : null;
+    } catch (error) {
+      console.error('Error fetching sentiment index:', error);
+    }
+  };
+
+  // Fetch only the points from the newest one received onwards. That point comes back too, since
+  // later posts in its hour update it, and replaces the copy we have.
+  const fetchIndexUpdates = async () => {
+    if (lastIndexTs.current === null) {
+      fetchIndex();
+      return;
+    }
+    try {
+      const response = await axios.get(
+        `${API_URL}/trends/sentiment-index?crypto=${crypto}&start=${lastIndexTs.current}`);
+      const points = response.data;
+      if (!points.length || crypto !== currentCrypto.current) {
+        return;
+      }
+      setIndexPoints(previous => [...previous.filter(point => point.ts < points[0].ts), ...points]);
+      lastIndexTs.current = points[points.length - 1].ts;
+    } catch (error) {
+      console.error('Error fetching sentiment index:', error);
+    }
+  };
+
+  // Fetch the history only when the crypto changes; date changes are filtered locally below.
+  // The previous crypto's rows and index position are dropped first, before its stream is replaced.
   useEffect(() => {
+    currentCrypto.current = crypto;
+    setTrendData([]);
+    setIndexPoints([]);
+    lastIndexTs.current = null;
     fetchTrendData();
-  }, [crypto, startDate, endDate]);
+    fetchIndex();
+  }, [crypto]);
 
-  // Group sentiment data by day
-  const dailySentiment = groupSentimentByDay(trendData);
+  // Append rows pushed by the API as the aggregators commit them, instead of polling /trends.
+  // EventSource reconnects by itself and resumes from the last event it received.
+  useEffect(() => {
+    const source = new EventSource(`${API_URL}/trends/stream?crypto=${crypto}`);
+    source.addEventListener('rows', (event) => {
+      const rows = JSON.parse(event.data);
+      setTrendData(previous => {
+        // Rows committed while the initial fetch was in flight may arrive both ways
+        const seen = new Set(previous.map(item => item.id));
+        return [...previous, ...rows.filter(row => !seen.has(row.id))];
+      });
+      // New rows move the index too
+      fetchIndexUpdates();
+    });
+    // More rows were missed while disconnected than the server replays: reload the history
+    source.addEventListener('reset', () => {
+      fetchTrendData();
+      fetchIndex();
+    });
+    return () => source.close();
+  }, [crypto]);
+
+  // Keep the rows in the selected date range (the end date counts in full, so live rows show up)
+  const filteredData = useMemo(() => {
+    const end = new Date(endDate);
+    end.setHours(23, 59, 59, 999);
+    return trendData.filter(item => {
+      const itemDate = new Date(item.created);
+      return itemDate >= startDate && itemDate <= end;
+    });
+  }, [trendData, startDate, endDate]);
+
+  // Daily index values in the selected date range, plus the plain daily mean for comparison
+  const dailySentiment = useMemo(() => {
+    const start = formatDate(startDate);
+    const end = formatDate(endDate);
+    return indexByDay(indexPoints).filter(item => item.day >= start && item.day <= end);
+  }, [indexPoints, startDate, endDate]);
+  const dailyMean = meanSentimentByDay(filteredData);
 
-  // Prepare chart data using only sentiment compound scores
   const chartData = {
-    labels: dailySentiment.map(item => formatDate(item.created)),
+    labels: dailySentiment.map(item => item.day),
     datasets: [
       {
-        label: 'Sentiment Compound Score',
-        data: dailySentiment.map(item => item.sentiment_compound),
+        label: 'Sentiment Index (engagement-weighted)',
+        data: dailySentiment.map(item => item.value),
         fill: false,
         backgroundColor: 'rgb(75, 192, 192)',
         borderColor: 'rgba(75, 192, 192, 0.4)',
       },
+      {
+        label: 'Mean Compound Score',
+        data: dailySentiment.map(item => dailyMean[item.day] ?? null),
+        fill: false,
+        backgroundColor: 'rgb(201, 203, 207)',
+        borderColor: 'rgba(201, 203, 207, 0.4)',
+      },
     ],
   };
 
@@ -111,7 +211,7 @@ function App() {
         <label style={{ marginRight: '10px' }}>End Date:</label>
         <DatePicker selected={endDate} onChange={date => setEndDate(date)} />
       </div>
-      <button onClick={fetchTrendData}>Fetch Data</button>
+      <button onClick={() => { fetchTrendData(); fetchIndex(); }}>Fetch Data</button>
       <div style={{ marginTop: '40px' }}>
         {dailySentiment.length === 0 ? (
           <p>No data available for the selected criteria.</p>
@@ -4,7 +4,10 @@ data_aggregator_pushshift.py
 
 This script uses the Pushshift API to fetch historical Reddit posts from the r/CryptoCurrency subreddit
 for a specified historical period (set here to January 2024). The posts are retrieved in daily chunks and
-saved to a local SQLite database.
+saved to a local SQLite database. When writer_daemon.py is running, each day's posts are sent to it instead,
+so the backfill can run alongside the aggregators without fighting over the database write lock.
+Fetch latencies are exported at the end of the run if TREND_METRICS_FILE or TREND_PUSHGATEWAY is set
+(see metrics.py).
 
 Dependencies:
   - requests
@@ -21,55 +24,30 @@ import sqlite3
 import datetime
 import time
 
+from connectors import FETCH_SECONDS, RECORDS_FETCHED
+from metrics import export
+from records import TrendRecord
+from writer_daemon import connect_writer, create_tables, write_records
+
 DB_FILE = "trend_data.db"
 
 def create_database():
-    """Create the SQLite database and the trend_data table if it does not already exist."""
+    """Create the SQLite database, the trend_data table and its full-text index if they do not already exist."""
     conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS trend_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT,
-            crypto TEXT,
-            score INTEGER,
-            num_comments INTEGER,
-            created TEXT,
-            sentiment_compound REAL,
-            sentiment_neg REAL,
-            sentiment_neu REAL,
-            sentiment_pos REAL
-        )
-    ''')
-    conn.commit()
+    create_tables(conn)
     conn.close()
 
-def insert_trend_data(data):
+def insert_trend_data_batch(records):
     """
-    Insert a record into the trend_data table.
-    
+    Insert a day's records into the database in a single transaction, through the same write path as
+    the writer daemon, so rows are stored with source 'pushshift' and the derived tables stay in step.
+
     Parameters:
-      data (dict): Dictionary with keys: title, crypto, score, num_comments, created,
-                   sentiment_compound, sentiment_neg, sentiment_neu, sentiment_pos.
+      records (list): TrendRecord objects built by to_trend_record().
     """
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('''
-        INSERT INTO trend_data 
-        (title, crypto, score, num_comments, created, sentiment_compound, sentiment_neg, sentiment_neu, sentiment_pos)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        data["title"],
-        data["crypto"],
-        data["score"],
-        data["num_comments"],
-        data["created"].strftime("%Y-%m-%d %H:%M:%S"),
-        data["sentiment_compound"],
-        data["sentiment_neg"],
-        data["sentiment_neu"],
-        data["sentiment_pos"]
-    ))
-    conn.commit()
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    with conn:
+        write_records(conn, records)
     conn.close()
 
 def fetch_pushshift_data(subreddit, after, before, size=100, retries=3, retry_delay=5):
@@ -101,9 +79,12 @@ def fetch_pushshift_data(subreddit, after, before, size=100, retries=3, retry_de
     
     attempt = 0
     while attempt < retries:
-        response = requests.get(url, params=params, headers=headers)
+        with FETCH_SECONDS.time(source="pushshift"):
+            response = requests.get(url, params=params, headers=headers)
         if response.status_code == 200:
-            return response.json().get("data", [])
+            posts = response.json().get("data", [])
+            RECORDS_FETCHED.inc(len(posts), source="pushshift")
+            return posts
         else:
             print(f"Error fetching data: {response.status_code} for interval {datetime.datetime.fromtimestamp(after)} to {datetime.datetime.fromtimestamp(before)}")
             print("Response text:", response.text)
@@ -112,8 +93,29 @@ def fetch_pushshift_data(subreddit, after, before, size=100, retries=3, retry_de
             time.sleep(retry_delay)
     return []
 
+def to_trend_record(data, post_id):
+    """Convert a backfill data dictionary into a TrendRecord for the writer daemon or the direct write path."""
+    return TrendRecord(
+        source="pushshift",
+        post_id=post_id,
+        title=data["title"],
+        score=data["score"],
+        num_comments=data["num_comments"],
+        created=data["created"],
+        crypto=data["crypto"],
+        sentiment_neg=data["sentiment_neg"],
+        sentiment_neu=data["sentiment_neu"],
+        sentiment_pos=data["sentiment_pos"],
+        sentiment_compound=data["sentiment_compound"],
+    )
+
 def main():
     create_database()
+
+    # If a writer daemon is running, send each day's posts to it instead of competing for the write lock
+    writer = connect_writer()
+    if writer:
+        print("Sending records to the writer daemon.")
     
     # Define the date range for historical data. For testing, we use January 2024.
     start_date = datetime.datetime(2024, 1, 1)
@@ -135,6 +137,7 @@ def main():
         posts = fetch_pushshift_data(subreddit, current_after, current_before, size=100)
         
         if posts:
+            batch = []
             for post in posts:
                 created = datetime.datetime.fromtimestamp(post["created_utc"])
                 data = {
@@ -149,7 +152,11 @@ def main():
                     "sentiment_neu": 1.0,
                     "sentiment_pos": 0.0,
                 }
-                insert_trend_data(data)
+                batch.append(to_trend_record(data, post.get("id")))
+            if writer:
+                writer.send(batch)
+            else:
+                insert_trend_data_batch(batch)
         else:
             print("No posts found in this interval.")
         
@@ -157,6 +164,10 @@ def main():
         # Pause briefly to avoid rate limiting
         time.sleep(1)
         
+    if writer:
+        writer.flush()
+        writer.close()
+    export("pushshift_backfill")
     print("Data aggregation for the specified period completed.")
 
 if __name__ == "__main__":
@@ -5,9 +5,14 @@ data_aggregator_with_crypto_filter.py
 This script connects to the Reddit API using PRAW to query the latest posts from the r/CryptoCurrency subreddit,
 extracts key metrics (title, score, number of comments, creation time), and analyzes the sentiment of each post’s title
 using NLTK's VADER sentiment analyzer. Additionally, it checks the post title for mentions of specific cryptocurrencies
-based on a predefined keyword list. The aggregated data is then saved to a local SQLite database.
+based on a predefined keyword list. The aggregated data is then saved to a local SQLite database,
+through writer_daemon.py when it is running.
 The job is scheduled to run every 6 hours.
 
+Fetch and write latencies are collected in metrics.py and, after every run, written to --metrics-file
+(node_exporter textfile collector) and/or pushed to --pushgateway. Individual records are only printed
+with --verbose.
+
 Dependencies:
   - praw
   - nltk
@@ -19,8 +24,13 @@ Install dependencies via:
 Before running, create a Reddit app at:
   https://old.reddit.com/prefs/apps/
 and update the CLIENT_ID, CLIENT_SECRET, and USER_AGENT below.
+
+Usage:
+  python data_aggregator_with_crypto_filter.py
+  python data_aggregator_with_crypto_filter.py --verbose --metrics-file /var/lib/node_exporter/cryptotrend.prom
 """
 
+import argparse
 import praw
 import datetime
 import nltk
@@ -29,6 +39,11 @@ from nltk.sentiment import SentimentIntensityAnalyzer
 import schedule
 import time
 
+from connectors import FETCH_SECONDS, RECORDS_FETCHED
+from metrics import METRICS_FILE, PUSHGATEWAY_URL, export
+from records import TrendRecord
+from writer_daemon import connect_writer, create_tables, write_records
+
 # Download VADER lexicon if not already present
 nltk.download('vader_lexicon')
 
@@ -63,54 +78,33 @@ def identify_crypto(text):
     return "Unknown"
 
 def create_database():
-    """Create the SQLite database and the trend_data table if they do not already exist."""
+    """Create the SQLite database, the trend_data table and its full-text index if they do not already exist."""
     conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS trend_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT,
-            crypto TEXT,
-            score INTEGER,
-            num_comments INTEGER,
-            created TEXT,
-            sentiment_neg REAL,
-            sentiment_neu REAL,
-            sentiment_pos REAL,
-            sentiment_compound REAL
-        )
-    ''')
-    conn.commit()
+    create_tables(conn)
     conn.close()
 
-def insert_trend_data(data):
+def insert_trend_data_batch(records):
     """
-    Insert a record into the trend_data table.
-    
+    Insert a run's records into the trend_data table in a single transaction, through the same write
+    path as the writer daemon (writer_daemon.write_records).
+
     Parameters:
-      data (dict): Should contain keys: title, crypto, score, num_comments, created, and sentiment (a dict).
+      records (list): TrendRecord objects with sentiment filled in.
     """
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('''
-        INSERT INTO trend_data (title, crypto, score, num_comments, created, sentiment_neg, sentiment_neu, sentiment_pos, sentiment_compound)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        data["title"],
-        data["crypto"],
-        data["score"],
-        data["num_comments"],
-        data["created"].strftime("%Y-%m-%d %H:%M:%S"),
-        data["sentiment"]["neg"],
-        data["sentiment"]["neu"],
-        data["sentiment"]["pos"],
-        data["sentiment"]["compound"]
-    ))
-    conn.commit()
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    with conn:
+        write_records(conn, records)
     conn.close()
 
-def aggregate_trend_data():
-    """Query the subreddit, analyze posts, identify crypto mentions, and store the data in the database."""
+def aggregate_trend_data(verbose=False):
+    """
+    Query the subreddit, analyze posts, identify crypto mentions, and store the data in the database.
+    If a writer daemon (writer_daemon.py) is running, the records are sent to it instead of being
+    committed to DB_FILE here.
+
+    Parameters:
+      verbose (bool): Print every record once the run is saved.
+    """
     reddit = praw.Reddit(
         client_id=CLIENT_ID,
         client_secret=CLIENT_SECRET,
@@ -118,56 +112,77 @@ def aggregate_trend_data():
     )
     subreddit_name = "CryptoCurrency"
     subreddit = reddit.subreddit(subreddit_name)
-    posts = subreddit.new(limit=100)
+    # The listing is lazy; reading it is the API round-trip
+    with FETCH_SECONDS.time(source="reddit"):
+        posts = list(subreddit.new(limit=100))
+    RECORDS_FETCHED.inc(len(posts), source="reddit")
 
     sia = SentimentIntensityAnalyzer()
     trend_data = []
 
     for post in posts:
-        title = post.title
-        score = post.score
-        num_comments = post.num_comments
-        created = datetime.datetime.utcfromtimestamp(post.created_utc)
-        sentiment = sia.polarity_scores(title)
+        record = TrendRecord(
+            source="reddit",
+            post_id=post.id,
+            title=post.title,
+            score=post.score,
+            num_comments=post.num_comments,
+            created=datetime.datetime.utcfromtimestamp(post.created_utc),
+        )
+        record.set_sentiment(sia.polarity_scores(record.title))
         # Identify which cryptocurrency is mentioned in the title
-        crypto = identify_crypto(title)
-
-        record = {
-            "title": title,
-            "crypto": crypto,
-            "score": score,
-            "num_comments": num_comments,
-            "created": created,
-            "sentiment": sentiment
-        }
+        record.crypto = identify_crypto(record.title)
         trend_data.append(record)
-        insert_trend_data(record)  # Save each record to the database
-
-    print(f"\n--- Aggregated Trend Data ({datetime.datetime.now()}) ---")
-    for data in trend_data:
-        print(f"Title: {data['title']}")
-        print(f"Crypto: {data['crypto']}")
-        print(f"Score: {data['score']}, Comments: {data['num_comments']}")
-        print(f"Created: {data['created']}")
-        print(f"Sentiment: {data['sentiment']}")
-        print("-" * 80)
-
-def job():
-    """Job to run the data aggregation."""
+
+    # Save the whole run at once, through the writer daemon when one is running
+    writer = connect_writer()
+    if writer:
+        try:
+            writer.send(trend_data)
+            writer.flush()
+        finally:
+            writer.close()
+    else:
+        insert_trend_data_batch(trend_data)
+
+    if verbose:
+        print(f"\n--- Aggregated Trend Data ({datetime.datetime.now()}) ---")
+        for data in trend_data:
+            print(f"Title: {data.title}")
+            print(f"Crypto: {data.crypto}")
+            print(f"Score: {data.score}, Comments: {data.num_comments}")
+            print(f"Created: {data.created}")
+            print(f"Sentiment: {data.sentiment}")
+            print("-" * 80)
+    else:
+        print(f"Saved {len(trend_data)} records.")
+
+def job(verbose=False, metrics_file=METRICS_FILE, pushgateway=PUSHGATEWAY_URL):
+    """Job to run the data aggregation, then export the run's metrics if a destination is set."""
     print("\nStarting data aggregation job...")
-    aggregate_trend_data()
+    aggregate_trend_data(verbose)
+    export("reddit_crypto_filter_aggregator", metrics_file, pushgateway)
     print("Data aggregation job completed.\n")
 
 def main():
+    parser = argparse.ArgumentParser(description="Aggregate crypto trend data from r/CryptoCurrency.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print every record after each run")
+    parser.add_argument("--metrics-file", default=METRICS_FILE,
+                        help="Write Prometheus metrics here after every run (node_exporter textfile collector)")
+    parser.add_argument("--pushgateway", default=PUSHGATEWAY_URL,
+                        help="Push Prometheus metrics to this Pushgateway after every run")
+    args = parser.parse_args()
+    job_options = {"verbose": args.verbose, "metrics_file": args.metrics_file, "pushgateway": args.pushgateway}
+
     # Create the database and table if not exists
     create_database()
 
     # Schedule the job to run every 6 hours
-    schedule.every(6).hours.do(job)
+    schedule.every(6).hours.do(job, **job_options)
     print("Data aggregator is running. Press Ctrl+C to exit.")
 
     # Optionally, run the job once immediately
-    job()
+    job(**job_options)
 
     # Keep the script running and check for pending scheduled jobs
     while True:
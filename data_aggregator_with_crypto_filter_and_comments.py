@@ -8,6 +8,14 @@ using NLTK's VADER sentiment analyzer. It now checks both the post (title and se
 of specific cryptocurrencies based on a predefined keyword list. The aggregated data is saved to a local SQLite database.
 The job is scheduled to run every 6 hours.
 
+Each run is a staged pipeline (fetch -> match -> score -> write, see pipeline.py) so that network waits,
+sentiment scoring and database writes overlap; per-stage throughput is printed after every run.
+Pass --replay with a fixture recorded by connectors.py to run the whole job offline.
+
+Fetch, comment, matching, sentiment and write latencies are collected in metrics.py and, after every run,
+written to --metrics-file (node_exporter textfile collector) and/or pushed to --pushgateway. Individual
+records are only printed with --verbose.
+
 Dependencies:
   - praw
   - nltk
@@ -19,16 +27,29 @@ Install dependencies via:
 Before running, create a Reddit app at:
   https://old.reddit.com/prefs/apps/
 and update the CLIENT_ID, CLIENT_SECRET, and USER_AGENT below.
+
+Usage:
+  python data_aggregator_with_crypto_filter_and_comments.py
+  python data_aggregator_with_crypto_filter_and_comments.py --replay fixtures/reddit.jsonl --loops 50 --once
+  python data_aggregator_with_crypto_filter_and_comments.py --metrics-file /var/lib/node_exporter/cryptotrend.prom
 """
 
-import praw
+import argparse
 import datetime
 import nltk
 import sqlite3
 from nltk.sentiment import SentimentIntensityAnalyzer
 import schedule
+import threading
 import time
 
+from connectors import RedditConnector, ReplayConnector, iter_records
+from keyword_discovery import KeywordDiscovery, save_emerging
+from metrics import METRICS_FILE, PUSHGATEWAY_URL, counter, export, histogram
+from pipeline import Pipeline, Stage, BatchStage, format_stats
+from spikes import parse_created
+from writer_daemon import INSERT_SQL, connect_writer, create_tables, write_records
+
 # Download VADER lexicon if not already present
 nltk.download('vader_lexicon')
 
@@ -40,6 +61,17 @@ USER_AGENT = "CryptoTrendDashboard by divinedavis"
 # Database file name
 DB_FILE = "trend_data.db"
 
+# Pipeline concurrency: comment lookups wait on the network, so matching gets the most threads
+MATCH_WORKERS = 4
+SCORE_WORKERS = 1
+WRITE_BATCH_SIZE = 200
+
+MATCH_SECONDS = histogram("match_seconds", "Time to identify the crypto of one post, including comment lookups")
+MATCHES = counter("posts_matched", "Posts by identified crypto", ("crypto",))
+SENTIMENT_SECONDS = histogram("sentiment_seconds", "Time to score the sentiment of one post")
+STAGE_ITEMS = counter("pipeline_stage_items", "Items that entered each pipeline stage", ("stage",))
+STAGE_BUSY = counter("pipeline_stage_busy_seconds", "Seconds each pipeline stage spent working", ("stage",))
+
 # Define a list of cryptocurrency keywords (names or symbols in lowercase)
 CRYPTO_KEYWORDS = {
     "bitcoin": ["bitcoin", "btc"],
@@ -50,6 +82,12 @@ CRYPTO_KEYWORDS = {
     # Add more as needed...
 }
 
+# Emerging-term discovery spans job runs, so its windows live at module level.
+# Terms that are already tracked keywords are left out of its report.
+keyword_discovery = KeywordDiscovery(
+    known=set(CRYPTO_KEYWORDS) | {keyword for keywords in CRYPTO_KEYWORDS.values() for keyword in keywords}
+)
+
 def identify_crypto_in_text(text):
     """
     Checks the given text for any crypto keyword.
@@ -62,50 +100,34 @@ def identify_crypto_in_text(text):
                 return crypto
     return None
 
-def identify_crypto(post):
+def identify_crypto(record, connector):
     """
     Identify which cryptocurrency is mentioned in the post.
     First, check the title and selftext. If not found, check the top few comments.
     Returns the first matching crypto name, or 'Unknown' if none are found.
     """
     # Combine title and selftext (if available)
-    text_to_search = post.title
-    if hasattr(post, 'selftext') and post.selftext:
-        text_to_search += " " + post.selftext
+    text_to_search = record.title
+    if record.selftext:
+        text_to_search += " " + record.selftext
     crypto = identify_crypto_in_text(text_to_search)
     if crypto:
         return crypto
 
-    # If not found in the post content, check top few comments
-    post.comments.replace_more(limit=0)
-    comments = post.comments.list()
-    # Check first 5 comments (or fewer if less available)
-    for comment in comments[:5]:
-        crypto = identify_crypto_in_text(comment.body)
+    # If not found in the post content, check the first 5 comments (an extra API round-trip).
+    # Keep them on the record so keyword discovery can read them without fetching again.
+    record.comments = connector.fetch_comments(record.post_id, limit=5)
+    for body in record.comments:
+        crypto = identify_crypto_in_text(body)
         if crypto:
             return crypto
 
     return "Unknown"
 
 def create_database():
-    """Create the SQLite database and the trend_data table if they do not already exist."""
+    """Create the SQLite database, the trend_data table and its full-text index if they do not already exist."""
     conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS trend_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT,
-            crypto TEXT,
-            score INTEGER,
-            num_comments INTEGER,
-            created TEXT,
-            sentiment_neg REAL,
-            sentiment_neu REAL,
-            sentiment_pos REAL,
-            sentiment_compound REAL
-        )
-    ''')
-    conn.commit()
+    create_tables(conn)
     conn.close()
 
 def insert_trend_data(data):
@@ -113,87 +135,186 @@ def insert_trend_data(data):
     Insert a record into the trend_data table.
     
     Parameters:
-      data (dict): Should contain keys: title, crypto, score, num_comments, created, and sentiment (a dict).
+      data (TrendRecord): A record with crypto and sentiment filled in.
     """
     conn = sqlite3.connect(DB_FILE)
     c = conn.cursor()
-    c.execute('''
-        INSERT INTO trend_data (title, crypto, score, num_comments, created, sentiment_neg, sentiment_neu, sentiment_pos, sentiment_compound)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        data["title"],
-        data["crypto"],
-        data["score"],
-        data["num_comments"],
-        data["created"].strftime("%Y-%m-%d %H:%M:%S"),
-        data["sentiment"]["neg"],
-        data["sentiment"]["neu"],
-        data["sentiment"]["pos"],
-        data["sentiment"]["compound"]
-    ))
+    c.execute(INSERT_SQL, data.as_row())
     conn.commit()
     conn.close()
 
-def aggregate_trend_data():
-    """Query the subreddit, analyze posts (including comments), and store the data in the database."""
-    reddit = praw.Reddit(
-        client_id=CLIENT_ID,
-        client_secret=CLIENT_SECRET,
-        user_agent=USER_AGENT
-    )
-    subreddit_name = "CryptoCurrency"
-    subreddit = reddit.subreddit(subreddit_name)
-    posts = subreddit.new(limit=100)
-
-    sia = SentimentIntensityAnalyzer()
-    trend_data = []
-
-    for post in posts:
-        title = post.title
-        score = post.score
-        num_comments = post.num_comments
-        created = datetime.datetime.utcfromtimestamp(post.created_utc)
-        sentiment = sia.polarity_scores(title)
+def insert_trend_data_batch(records):
+    """
+    Insert a list of records into the trend_data table in a single transaction, and append an
+    engagement snapshot for every post whose score or comment count changed since the last poll.
+
+    Parameters:
+      records (list): TrendRecord objects, as accepted by insert_trend_data().
+
+    Returns:
+      The records, so the write stage can pass them on.
+    """
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    with conn:
+        write_records(conn, records)
+    conn.close()
+    return records
+
+def aggregate_trend_data(connector=None, match_workers=MATCH_WORKERS, score_workers=SCORE_WORKERS,
+                         write_batch_size=WRITE_BATCH_SIZE, max_batches=1, verbose=False, use_writer=True):
+    """
+    Fetch posts, analyze them (including comments), and store the data in the database.
+
+    The job runs as a pipeline: fetch -> match -> discover -> score -> write, with bounded queues
+    between the stages and a configurable number of worker threads per stage, so comment round-trips,
+    sentiment scoring and database writes overlap. Per-stage throughput is printed at the end of the run.
+
+    For every post not seen on an earlier poll, the discover stage feeds its title, selftext and any
+    comments fetched while matching into keyword_discovery; the terms it finds accelerating are saved
+    to emerging_terms after the run.
+
+    If a writer daemon (writer_daemon.py) is running and `use_writer` is set, the write stage hands
+    batches to it instead of committing to DB_FILE itself.
+
+    Stage latencies are recorded in the metrics registry (metrics.py); the caller exports them.
+
+    Parameters:
+      connector (SourceConnector): Where posts come from. Defaults to the live Reddit connector;
+                                   pass a ReplayConnector to run offline.
+      match_workers (int): Threads identifying cryptos (may wait on comment round-trips).
+      score_workers (int): Threads running sentiment analysis.
+      write_batch_size (int): Records per database transaction.
+      max_batches (int): Number of batches to read from the connector (None for all).
+      verbose (bool): Print every record as it is written.
+      use_writer (bool): Use a running writer daemon; False always writes to DB_FILE directly.
+    """
+    if connector is None:
+        connector = RedditConnector(CLIENT_ID, CLIENT_SECRET, USER_AGENT, subreddit="CryptoCurrency", limit=100)
+
+    # The analyzer is not documented as thread-safe, so each scoring thread gets its own
+    local = threading.local()
+
+    def match(record):
         # Identify cryptocurrency from post title, selftext, or top comments
-        crypto = identify_crypto(post)
-
-        record = {
-            "title": title,
-            "crypto": crypto,
-            "score": score,
-            "num_comments": num_comments,
-            "created": created,
-            "sentiment": sentiment
-        }
-        trend_data.append(record)
-        insert_trend_data(record)  # Save each record to the database
-
-    print(f"\n--- Aggregated Trend Data ({datetime.datetime.now()}) ---")
-    for data in trend_data:
-        print(f"Title: {data['title']}")
-        print(f"Crypto: {data['crypto']}")
-        print(f"Score: {data['score']}, Comments: {data['num_comments']}")
-        print(f"Created: {data['created']}")
-        print(f"Sentiment: {data['sentiment']}")
+        with MATCH_SECONDS.time():
+            record.crypto = identify_crypto(record, connector)
+        MATCHES.inc(crypto=record.crypto)
+        return record
+
+    def discover(record):
+        # Single-threaded stage: the sketches are not thread-safe
+        ts = parse_created(record.created)
+        # Posts seen on an earlier poll were counted then
+        if keyword_discovery.first_sighting((record.source, record.post_id), ts):
+            keyword_discovery.observe(record.title, ts)
+            keyword_discovery.observe(record.selftext, ts)
+            for body in record.comments:
+                keyword_discovery.observe(body, ts)
+        record.comments = ()
+        return record
+
+    def score(record):
+        if not hasattr(local, "sia"):
+            local.sia = SentimentIntensityAnalyzer()
+        with SENTIMENT_SECONDS.time():
+            record.set_sentiment(local.sia.polarity_scores(record.title))
+        return record
+
+    if verbose:
+        print(f"\n--- Aggregated Trend Data ({datetime.datetime.now()}) ---")
+
+    def report(data):
+        # Records are printed as they leave the write stage and then dropped, so memory stays flat
+        print(f"Title: {data.title}")
+        print(f"Crypto: {data.crypto}")
+        print(f"Score: {data.score}, Comments: {data.num_comments}")
+        print(f"Created: {data.created}")
+        print(f"Sentiment: {data.sentiment}")
         print("-" * 80)
 
-def job():
-    """Job to run the data aggregation."""
+    writer = connect_writer() if use_writer else None
+    pipeline = Pipeline(
+        source=(record for record, _ in iter_records(connector, max_batches=max_batches)),
+        stages=[
+            Stage("match", match, workers=match_workers),
+            Stage("discover", discover),
+            Stage("score", score, workers=score_workers),
+            BatchStage("write", writer.send if writer else insert_trend_data_batch, batch_size=write_batch_size),
+        ],
+        sink=report if verbose else None,
+    )
+    start = time.perf_counter()
+    try:
+        stats = pipeline.run()
+    finally:
+        if writer:
+            writer.flush()
+            writer.close()
+    wall_time = time.perf_counter() - start
+
+    print(format_stats(stats, wall_time))
+    for s in stats:
+        STAGE_ITEMS.inc(s.items_in, stage=s.name)
+        STAGE_BUSY.inc(s.busy, stage=s.name)
+
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    with conn:
+        save_emerging(conn, keyword_discovery)
+    conn.close()
+    emerging = keyword_discovery.emerging(limit=10)
+    if emerging:
+        print("Emerging terms: " + ", ".join(f"{r['term']} (x{r['ratio']})" for r in emerging))
+
+def job(connector=None, metrics_file=METRICS_FILE, pushgateway=PUSHGATEWAY_URL, **pipeline_options):
+    """Job to run the data aggregation, then export the run's metrics if a destination is set."""
     print("\nStarting data aggregation job...")
-    aggregate_trend_data()
+    aggregate_trend_data(connector, **pipeline_options)
+    export("reddit_aggregator", metrics_file, pushgateway)
     print("Data aggregation job completed.\n")
 
 def main():
+    parser = argparse.ArgumentParser(description="Aggregate crypto trend data from r/CryptoCurrency.")
+    parser.add_argument("--replay", help="Replay a recorded fixture file instead of calling Reddit")
+    parser.add_argument("--loops", type=int, default=1, help="Times to loop the replayed fixture")
+    parser.add_argument("--once", action="store_true", help="Run a single job and exit")
+    parser.add_argument("--match-workers", type=int, default=MATCH_WORKERS)
+    parser.add_argument("--score-workers", type=int, default=SCORE_WORKERS)
+    parser.add_argument("--write-batch-size", type=int, default=WRITE_BATCH_SIZE)
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print every record as it is written")
+    parser.add_argument("--metrics-file", default=METRICS_FILE,
+                        help="Write Prometheus metrics here after every run (node_exporter textfile collector)")
+    parser.add_argument("--pushgateway", default=PUSHGATEWAY_URL,
+                        help="Push Prometheus metrics to this Pushgateway after every run")
+    args = parser.parse_args()
+
+    pipeline_options = {
+        "match_workers": args.match_workers,
+        "score_workers": args.score_workers,
+        "write_batch_size": args.write_batch_size,
+        "verbose": args.verbose,
+        "metrics_file": args.metrics_file,
+        "pushgateway": args.pushgateway,
+    }
+    if args.replay:
+        pipeline_options["max_batches"] = None
+
+    def run_job():
+        # A replay connector serves its fixture once, so build a fresh one per run
+        connector = ReplayConnector(args.replay, loops=args.loops) if args.replay else None
+        job(connector, **pipeline_options)
+
     # Create the database and table if not exists
     create_database()
 
+    # Optionally, run the job once immediately
+    run_job()
+    if args.once:
+        return
+
     # Schedule the job to run every 6 hours
-    schedule.every(6).hours.do(job)
+    schedule.every(6).hours.do(run_job)
     print("Data aggregator is running. Press Ctrl+C to exit.")
 
-    # Optionally, run the job once immediately
-    job()
-
     # Keep the script running and check for pending scheduled jobs
     while True:
         schedule.run_pending()
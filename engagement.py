@@ -0,0 +1,171 @@
+"""
+engagement.py
+
+Append-only engagement snapshots: how a post's score and comment count change over time.
+
+trend_data only keeps a post's latest score/num_comments, overwritten on every poll. Every time an
+aggregator polls a source it hands the posts it saw to record_snapshots(), which appends a
+(post, ts, score, num_comments) row -- but only when the numbers differ from that post's previous
+snapshot, so posts that have not moved cost nothing.
+
+Storage is kept compact:
+  - engagement_posts maps each (source, post_id) to a small integer key once, along with its crypto.
+  - engagement_snapshots holds integers only (post_key, ts, score, num_comments) in a WITHOUT ROWID
+    table clustered on (post_key, ts), so there is no separate rowid b-tree and a post's trajectory
+    is one contiguous range scan.
+
+fetch_trajectories() returns the score/comment trajectories of every post for a crypto over a time
+range; api_endpoint.py serves it at /engagement.
+"""
+
+import datetime
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS engagement_posts (
+        post_key INTEGER PRIMARY KEY,
+        source TEXT NOT NULL,
+        post_id TEXT NOT NULL,
+        crypto TEXT,
+        UNIQUE (source, post_id)
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_engagement_posts_crypto ON engagement_posts (crypto)",
+    '''
+    CREATE TABLE IF NOT EXISTS engagement_snapshots (
+        post_key INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        score INTEGER NOT NULL,
+        num_comments INTEGER NOT NULL,
+        PRIMARY KEY (post_key, ts)
+    ) WITHOUT ROWID
+    ''',
+]
+
+
+def create_engagement_tables(conn):
+    """Create the engagement snapshot tables if they do not already exist."""
+    # Statement by statement: executescript() would commit the caller's open transaction
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+
+def to_epoch(value):
+    """
+    Convert a datetime, a 'YYYY-MM-DD[ HH:MM:SS]' string or an epoch number to integer epoch seconds (UTC).
+    Returns None for None.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return int(value.timestamp())
+
+
+# Posts looked up per query; two parameters each, well under SQLite's variable limit
+LOOKUP_CHUNK = 400
+
+
+def _lookup_posts(conn, ids):
+    """
+    Return {(source, post_id): (post_key, (score, num_comments) of the last snapshot or None)} for the
+    ids that are already registered, with one query per LOOKUP_CHUNK ids.
+    """
+    ids = list(ids)
+    found = {}
+    for i in range(0, len(ids), LOOKUP_CHUNK):
+        chunk = ids[i:i + LOOKUP_CHUNK]
+        rows = conn.execute(f'''
+            WITH batch (source, post_id) AS (VALUES {", ".join("(?, ?)" for _ in chunk)})
+            SELECT p.source, p.post_id, p.post_key, s.score, s.num_comments
+            FROM batch b
+            JOIN engagement_posts p ON p.source = b.source AND p.post_id = b.post_id
+            LEFT JOIN engagement_snapshots s ON s.post_key = p.post_key
+                AND s.ts = (SELECT MAX(ts) FROM engagement_snapshots WHERE post_key = p.post_key)
+        ''', [value for pair in chunk for value in pair])
+        for source, post_id, key, score, num_comments in rows:
+            found[(source, post_id)] = (key, (score, num_comments) if score is not None else None)
+    return found
+
+
+def record_snapshots(conn, records, ts=None):
+    """
+    Append an engagement snapshot for every record whose score or comment count changed since its
+    last snapshot. Runs inside the caller's transaction.
+
+    Parameters:
+      conn (sqlite3.Connection): Open connection; the tables are created if needed.
+      records (list): TrendRecord objects (source, post_id, crypto, score and num_comments are used).
+      ts: Poll time (datetime or epoch seconds). Defaults to now.
+
+    Returns:
+      Number of snapshots written.
+    """
+    if not records:
+        return 0
+    ts = to_epoch(ts) if ts is not None else int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+    create_engagement_tables(conn)
+
+    ids = {(r.source, str(r.post_id)): r.crypto for r in records}
+    posts = _lookup_posts(conn, ids)
+    unseen = [post for post in ids if post not in posts]
+    if unseen:
+        conn.executemany(
+            "INSERT OR IGNORE INTO engagement_posts (source, post_id, crypto) VALUES (?, ?, ?)",
+            [(source, post_id, ids[(source, post_id)]) for source, post_id in unseen],
+        )
+        posts.update(_lookup_posts(conn, unseen))
+
+    rows = {}
+    for record in records:
+        rows[(record.source, str(record.post_id))] = (int(record.score), int(record.num_comments))
+
+    changed = []
+    for post, numbers in rows.items():
+        key, last = posts[post]
+        if last != numbers:
+            changed.append((key, ts) + numbers)
+
+    conn.executemany(
+        "INSERT OR REPLACE INTO engagement_snapshots (post_key, ts, score, num_comments) VALUES (?, ?, ?, ?)",
+        changed,
+    )
+    return len(changed)
+
+
+def fetch_trajectories(conn, crypto, start=None, end=None):
+    """
+    Return the engagement trajectories of all posts about `crypto` with snapshots in [start, end].
+
+    Parameters:
+      conn (sqlite3.Connection): Open connection.
+      crypto (str): Crypto name as stored by the aggregators.
+      start, end: Optional bounds (datetime, date string or epoch seconds).
+
+    Returns:
+      A list of {"source", "post_id", "points": [[ts, score, num_comments], ...]} dictionaries,
+      with points in time order.
+    """
+    create_engagement_tables(conn)
+    start = to_epoch(start) if start is not None else 0
+    end = to_epoch(end) if end is not None else 2 ** 62
+    rows = conn.execute('''
+        SELECT p.source, p.post_id, s.ts, s.score, s.num_comments
+        FROM engagement_posts p
+        JOIN engagement_snapshots s ON s.post_key = p.post_key
+        WHERE p.crypto = ? AND s.ts BETWEEN ? AND ?
+        ORDER BY p.post_key, s.ts
+    ''', (crypto, start, end))
+
+    trajectories = []
+    current = None
+    for source, post_id, ts, score, num_comments in rows:
+        if current is None or current["post_id"] != post_id or current["source"] != source:
+            current = {"source": source, "post_id": post_id, "points": []}
+            trajectories.append(current)
+        current["points"].append([ts, score, num_comments])
+    return trajectories
@@ -0,0 +1,273 @@
+"""
+keyword_discovery.py
+
+Streaming discovery of emerging terms: new coins and narratives that are not in CRYPTO_KEYWORDS yet.
+
+Every title, selftext and comment that passes through the aggregation pipeline is tokenized into
+unigrams, bigrams and $TICKER tokens. Counts are kept per time window in bounded-memory sketches:
+
+  - a Count-Min sketch (depth x width counters) estimates the frequency of any term, and
+  - a top-K table holds the K terms with the highest estimates seen so far in the window.
+
+Two windows are kept, the current and the previous one. A term is "emerging" when its rate in the
+current window is well above its rate in the previous window. Memory is 2 x (depth x width + K) entries
+however many distinct terms the stream contains, plus the keys of the posts counted in each window.
+
+Text is counted in the window of its post's creation time. The matching stage runs on several threads
+and listings come newest first, so text that arrives after its window was rolled over still counts
+towards the previous window; only text older than that is dropped. Posts are counted once per window,
+so a post seen again on a later poll does not inflate its terms.
+
+The pipeline saves the current ranking to the emerging_terms table at the end of each run, and
+api_endpoint.py serves it at /trends/emerging.
+"""
+
+import heapq
+import re
+import sqlite3
+from array import array
+
+# Words that dominate any text stream and carry no signal on their own
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be been but by can could did do does for from get got
+had has have he her his how i if in into is it its just like me more most my no not now of on one or
+our out over so some than that the their them then there these they this to too up us was we were what
+when which who why will with would you your
+""".split())
+
+WORD_RE = re.compile(r"\$[a-z][a-z0-9]{1,9}\b|[a-z][a-z0-9']{1,29}")
+
+
+def tokenize(text):
+    """
+    Yield the terms in `text`: $TICKER tokens, unigrams and bigrams of adjacent non-stopwords.
+    Terms are lowercased; tickers keep their leading '$'.
+    """
+    previous = None
+    for match in WORD_RE.finditer(text.lower()):
+        word = match.group()
+        if word.startswith("$"):
+            yield word
+            previous = None
+            continue
+        if word in STOPWORDS:
+            previous = None
+            continue
+        yield word
+        if previous is not None:
+            yield f"{previous} {word}"
+        previous = word
+
+
+class CountMinSketch:
+    """
+    Approximate term counts in fixed memory. Estimates never undercount; with width w the overcount
+    is at most about 2N/w (N = total count) with probability 1 - 2^-depth.
+    """
+
+    __slots__ = ("width", "depth", "rows", "total")
+
+    def __init__(self, width=2 ** 14, depth=4):
+        self.width = width
+        self.depth = depth
+        self.rows = [array("I", bytes(4 * width)) for _ in range(depth)]
+        self.total = 0
+
+    def _positions(self, term):
+        h = hash(term)
+        # Double hashing: derive `depth` positions from two halves of one hash
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, term, count=1):
+        """Add `count` occurrences of `term` and return its new estimate."""
+        self.total += count
+        estimate = None
+        for row, position in zip(self.rows, self._positions(term)):
+            row[position] += count
+            value = row[position]
+            if estimate is None or value < estimate:
+                estimate = value
+        return estimate
+
+    def estimate(self, term):
+        return min(row[position] for row, position in zip(self.rows, self._positions(term)))
+
+
+class TopK:
+    """
+    The `k` terms with the highest Count-Min estimates. A min-heap with lazy updates finds the
+    term to evict; heap entries whose count is out of date are refreshed when they reach the top.
+    """
+
+    __slots__ = ("k", "counts", "heap")
+
+    def __init__(self, k=500):
+        self.k = k
+        self.counts = {}
+        self.heap = []
+
+    def offer(self, term, estimate):
+        if term in self.counts:
+            self.counts[term] = estimate
+            return
+        if len(self.counts) < self.k:
+            self.counts[term] = estimate
+            heapq.heappush(self.heap, (estimate, term))
+            return
+        while True:
+            count, smallest = self.heap[0]
+            current = self.counts[smallest]
+            if count == current:
+                break
+            heapq.heapreplace(self.heap, (current, smallest))
+        if estimate > count:
+            heapq.heapreplace(self.heap, (estimate, term))
+            del self.counts[smallest]
+            self.counts[term] = estimate
+
+    def items(self):
+        return self.counts.items()
+
+
+class TermWindow:
+    """Sketch and top-K table for one time window, and the posts already counted in it."""
+
+    __slots__ = ("start", "sketch", "top", "posts")
+
+    def __init__(self, start, width, depth, k):
+        self.start = start
+        self.sketch = CountMinSketch(width, depth)
+        self.top = TopK(k)
+        self.posts = set()
+
+    def add(self, term):
+        self.top.offer(term, self.sketch.add(term))
+
+
+class KeywordDiscovery:
+    """
+    Tracks term frequencies over consecutive windows and reports terms that are accelerating.
+
+    Parameters:
+      window (int): Window length in seconds.
+      width, depth (int): Count-Min sketch dimensions.
+      k (int): Number of heavy hitters tracked per window.
+      known (iterable): Terms to leave out of the report, e.g. keywords already in CRYPTO_KEYWORDS.
+    """
+
+    def __init__(self, window=24 * 3600, width=2 ** 14, depth=4, k=500, known=()):
+        self.window = window
+        self.width = width
+        self.depth = depth
+        self.k = k
+        self.known = frozenset(known)
+        self.current = None
+        self.previous = None
+        self.clock = 0
+
+    def _roll(self, ts):
+        start = int(ts) // self.window * self.window
+        if self.current is None:
+            self.current = TermWindow(start, self.width, self.depth, self.k)
+        elif start > self.current.start:
+            # Keep the window just finished as the baseline; anything older is dropped
+            adjacent = start == self.current.start + self.window
+            self.previous = self.current if adjacent else None
+            self.current = TermWindow(start, self.width, self.depth, self.k)
+
+    def _window(self, ts):
+        """The window `ts` falls in, after rolling forward to it; None if it is older than the previous window."""
+        self._roll(ts)
+        if ts >= self.current.start:
+            return self.current
+        start = self.current.start - self.window
+        if ts < start:
+            return None
+        if self.previous is None:
+            # Late text from the window just before the first (or after a gap) starts the baseline
+            self.previous = TermWindow(start, self.width, self.depth, self.k)
+        return self.previous
+
+    def first_sighting(self, post, ts):
+        """
+        Return True if `post` (any hashable key, e.g. (source, post_id)) created at epoch time `ts` has
+        not been seen before, and remember it. Re-polled posts return False and should not be observed.
+        """
+        window = self._window(ts)
+        if window is None or post in window.posts:
+            return False
+        window.posts.add(post)
+        return True
+
+    def observe(self, text, ts):
+        """Count the terms of `text`, observed at epoch time `ts`. Text older than the previous window is ignored."""
+        if not text:
+            return
+        window = self._window(ts)
+        if window is None:
+            return
+        self.clock = max(self.clock, ts)
+        for term in tokenize(text):
+            window.add(term)
+
+    def emerging(self, limit=25, min_count=5, min_ratio=2.0):
+        """
+        Return up to `limit` terms whose rate in the current window is at least `min_ratio` times
+        their rate in the previous one, fastest-accelerating first.
+        """
+        if self.current is None or self.previous is None:
+            return []  # No baseline yet
+        # Compare rates, not raw counts: the current window is usually only partly elapsed.
+        # The floor keeps the first few minutes of a window from extrapolating wildly.
+        elapsed = max((self.clock - self.current.start) / self.window, 0.1)
+        results = []
+        for term, count in self.current.top.items():
+            if count < min_count or term in self.known:
+                continue
+            previous = self.previous.sketch.estimate(term)
+            ratio = (count / elapsed + 1) / (previous + 1)
+            if ratio >= min_ratio:
+                results.append({"term": term, "count": count, "previous": previous, "ratio": round(ratio, 2)})
+        results.sort(key=lambda r: r["ratio"], reverse=True)
+        return results[:limit]
+
+
+def save_emerging(conn, discovery, limit=100):
+    """
+    Replace the contents of the emerging_terms table with the current ranking.
+    Runs inside the caller's transaction.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS emerging_terms (
+            term TEXT PRIMARY KEY,
+            window_start INTEGER,
+            count INTEGER,
+            previous INTEGER,
+            ratio REAL
+        )
+    ''')
+    conn.execute("DELETE FROM emerging_terms")
+    if discovery.current is None:
+        return
+    conn.executemany(
+        "INSERT INTO emerging_terms (term, window_start, count, previous, ratio) VALUES (?, ?, ?, ?, ?)",
+        [(r["term"], discovery.current.start, r["count"], r["previous"], r["ratio"])
+         for r in discovery.emerging(limit=limit)],
+    )
+
+
+def load_emerging(conn, limit=25):
+    """Return the saved emerging terms, fastest-accelerating first."""
+    try:
+        rows = conn.execute(
+            "SELECT term, window_start, count, previous, ratio FROM emerging_terms ORDER BY ratio DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+    except sqlite3.OperationalError:
+        # No run has saved a ranking yet
+        return []
+    return [
+        {"term": term, "window_start": window_start, "count": count, "previous": previous, "ratio": ratio}
+        for term, window_start, count, previous, ratio in rows
+    ]
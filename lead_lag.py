@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+"""
+lead_lag.py
+
+Does Reddit/Twitter sentiment lead price? For every crypto with price history (see prices.py), this
+compares the log return of each interval with the mean sentiment and the number of mentions in the
+same interval some `lag` intervals earlier:
+
+  lag > 0   the signal leads price (sentiment at t - lag vs. the return at t)
+  lag < 0   price leads the signal
+  lag = 0   same interval
+
+Everything is NumPy-vectorized. Posts and candles are bucketed onto one shared time grid with
+bincount, the signals of all cryptos are stacked into a (lags, cryptos, intervals) array, and Pearson
+correlations are computed from cumulative sums. The full-sample correlation and the rolling
+correlation over the last `window` intervals come out of one pass for every crypto and lag at once.
+Intervals with no posts have no sentiment and are left out of the sentiment correlations rather than
+counted as neutral. Posts that retention.py has rolled up into trend_hourly/trend_daily are read from
+the rollups, so long ranges do not drop to zero mentions past the raw-row horizon.
+
+Results take a while on a large table and only change when new posts or candles arrive, so
+api_endpoint.py serves them at /trends/lead-lag through LeadLagCache. The cache recomputes only when
+its entry is older than `ttl` and the data has changed.
+
+Dependencies:
+  - numpy
+
+Usage:
+  python lead_lag.py --interval 1h --window 168
+  python lead_lag.py --interval 1d --window 30 --lags=-3,-1,0,1,3
+"""
+
+import argparse
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from prices import create_price_table
+from retention import create_rollup_tables
+
+DB_FILE = "trend_data.db"
+INTERVALS = {"1h": 3600, "4h": 4 * 3600, "1d": 86400}
+DEFAULT_LAGS = (-24, -12, -6, -3, -1, 0, 1, 3, 6, 12, 24)
+MIN_POINTS = 10  # Fewest paired intervals a correlation is reported for
+SIGNALS = ("sentiment", "mentions")
+
+
+def _bucket_last(bucket, values, size):
+    """The last value per bucket (inputs sorted by time), NaN for empty buckets."""
+    out = np.full(size, np.nan)
+    # np.unique on the reversed buckets finds the last occurrence of each bucket
+    reversed_buckets = bucket[::-1]
+    unique, first = np.unique(reversed_buckets, return_index=True)
+    out[unique] = values[::-1][first]
+    return out
+
+
+def _forward_fill(values):
+    """Fill NaNs along the last axis with the previous non-NaN value."""
+    valid = ~np.isnan(values)
+    index = np.where(valid, np.arange(values.shape[-1]), 0)
+    np.maximum.accumulate(index, axis=-1, out=index)
+    filled = np.take_along_axis(values, index, axis=-1)
+    # Leading gaps have nothing to fill from
+    seen = np.maximum.accumulate(valid, axis=-1)
+    return np.where(seen, filled, np.nan)
+
+
+def load_series(conn, interval):
+    """
+    Bucket prices and posts onto one grid of `interval` seconds.
+
+    Returns:
+      (cryptos, start, returns, sentiment, mentions) where the last three are (cryptos, intervals)
+      arrays: log returns of the close, mean compound sentiment (NaN where there were no posts) and
+      post counts, from raw posts and retention.py's rollups (NaN where unknown: before the oldest
+      retained post, or within a day only kept as a daily rollup when `interval` is shorter than a
+      day). None if there is no price data.
+    """
+    create_price_table(conn)
+    prices = conn.execute("SELECT crypto, ts, close FROM prices ORDER BY crypto, ts").fetchall()
+    if not prices:
+        return None
+    cryptos = sorted({row[0] for row in prices})
+    index = {crypto: i for i, crypto in enumerate(cryptos)}
+    price_crypto = np.fromiter((index[row[0]] for row in prices), dtype=np.int64, count=len(prices))
+    price_ts = np.fromiter((row[1] for row in prices), dtype=np.int64, count=len(prices))
+    close = np.fromiter((row[2] for row in prices), dtype=np.float64, count=len(prices))
+
+    start = int(price_ts.min()) // interval * interval
+    size = int(price_ts.max() - start) // interval + 1
+    # Flatten (crypto, bucket) into one index so every crypto is bucketed in the same call
+    price_bucket = price_crypto * size + (price_ts - start) // interval
+    last_close = _bucket_last(price_bucket, close, len(cryptos) * size).reshape(len(cryptos), size)
+    log_close = np.log(_forward_fill(last_close))
+    returns = np.full_like(log_close, np.nan)
+    returns[:, 1:] = np.diff(log_close, axis=-1)
+
+    # Past retention.py's horizons, posts only survive as hourly and then daily rollups; they are part
+    # of the series too, or those periods would read as zero mentions
+    create_rollup_tables(conn)
+    placeholders = ", ".join("?" for _ in cryptos)
+    end = start + size * interval
+    posts = conn.execute(f'''
+        SELECT crypto, CAST(strftime('%s', created) AS INTEGER), 1, sentiment_compound
+        FROM trend_data
+        WHERE crypto IN ({placeholders}) AND created >= datetime(?, 'unixepoch')
+              AND created < datetime(?, 'unixepoch')
+        UNION ALL
+        SELECT crypto, CAST(strftime('%s', bucket) AS INTEGER), mentions, sentiment_compound_sum
+        FROM trend_hourly
+        WHERE crypto IN ({placeholders}) AND bucket >= datetime(?, 'unixepoch')
+              AND bucket < datetime(?, 'unixepoch')
+    ''', (*cryptos, start, end, *cryptos, start, end)).fetchall()
+    daily = conn.execute(f'''
+        SELECT crypto, CAST(strftime('%s', bucket) AS INTEGER), mentions, sentiment_compound_sum
+        FROM trend_daily
+        WHERE crypto IN ({placeholders}) AND bucket >= date(?, 'unixepoch') AND bucket < date(?, 'unixepoch')
+    ''', (*cryptos, start, end)).fetchall()
+    whole_days = interval % 86400 == 0
+    if whole_days:
+        posts += daily
+
+    cells = len(cryptos) * size
+    mentions = np.zeros(cells)
+    sentiment = np.full(cells, np.nan)
+    if posts:
+        post_crypto = np.fromiter((index[row[0]] for row in posts), dtype=np.int64, count=len(posts))
+        post_ts = np.fromiter((row[1] for row in posts), dtype=np.int64, count=len(posts))
+        count = np.fromiter((row[2] for row in posts), dtype=np.float64, count=len(posts))
+        compound = np.fromiter((row[3] or 0.0 for row in posts), dtype=np.float64, count=len(posts))
+        post_bucket = post_crypto * size + (post_ts - start) // interval
+        mentions = np.bincount(post_bucket, weights=count, minlength=cells)
+        totals = np.bincount(post_bucket, weights=compound, minlength=cells)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sentiment = np.where(mentions > 0, totals / mentions, np.nan)
+    mentions = mentions.reshape(len(cryptos), size)
+    if daily and not whole_days:
+        # Daily rollups cannot be split into shorter intervals: those intervals are unknown, not empty
+        for crypto, day, _, _ in daily:
+            first = max((day - start) // interval, 0)
+            last = min((day + 86400 - start - 1) // interval + 1, size)
+            row = mentions[index[crypto], first:last]
+            row[row == 0] = np.nan
+    # Before a crypto's oldest retained post nothing is known either
+    seen = np.maximum.accumulate(np.nan_to_num(mentions, nan=1.0) > 0, axis=-1)
+    mentions = np.where(seen, mentions, np.nan)
+    return cryptos, start, returns, sentiment.reshape(len(cryptos), size), mentions
+
+
+def shift(signal, lags):
+    """
+    Stack `signal` (cryptos, T) shifted by each lag into a (lags, cryptos, T) array, NaN-padded. Lags of
+    T or more leave their row all NaN, so short histories just have no correlation at long lags.
+    """
+    out = np.full((len(lags),) + signal.shape, np.nan)
+    length = signal.shape[-1]
+    for i, lag in enumerate(lags):
+        if abs(lag) >= length:
+            continue  # No overlap with the series at all; stays NaN
+        if lag >= 0:
+            out[i, :, lag:] = signal[:, :length - lag]
+        else:
+            out[i, :, :length + lag] = signal[:, -lag:]
+    return out
+
+
+def rolling_correlation(x, y, window, min_points=MIN_POINTS):
+    """
+    Pearson correlation of x and y over every trailing `window` along the last axis, skipping pairs
+    where either is NaN. Returns an array one `window - 1` shorter than the inputs; NaN where fewer
+    than `min_points` pairs are available or either side is constant.
+    """
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+
+    def window_sums(a):
+        total = np.cumsum(a, axis=-1)
+        total = np.concatenate([np.zeros(a.shape[:-1] + (1,)), total], axis=-1)
+        return total[..., window:] - total[..., :-window]
+
+    n = window_sums(valid.astype(np.float64))
+    sx, sy = window_sums(x), window_sums(y)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = window_sums(x * y) - sx * sy / n
+        var_x = window_sums(x * x) - sx * sx / n
+        var_y = window_sums(y * y) - sy * sy / n
+        corr = cov / np.sqrt(var_x * var_y)
+    ok = (n >= min_points) & (var_x > 1e-12) & (var_y > 1e-12)
+    return np.where(ok, np.clip(corr, -1.0, 1.0), np.nan)
+
+
+def compute_lead_lag(conn, interval=3600, window=168, lags=DEFAULT_LAGS):
+    """
+    Correlate sentiment and mentions with price returns for every crypto with price data.
+
+    Parameters:
+      conn (sqlite3.Connection): Open connection.
+      interval (int): Grid spacing in seconds.
+      window (int): Intervals in the rolling correlation window.
+      lags (tuple): Lags in intervals; positive means the signal leads price.
+
+    Returns:
+      {"interval", "window", "lags", "start", "end", "cryptos": {crypto: {signal: {"corr": [...],
+       "rolling": [...], "points": [...], "best_lag"}}}} where corr is the full-sample correlation and
+      rolling the correlation over the last `window` intervals, both per lag (None where undefined),
+      and points the number of paired intervals per lag.
+    """
+    series = load_series(conn, interval)
+    result = {"interval": interval, "window": window, "lags": list(lags), "cryptos": {}}
+    if series is None:
+        result["start"] = result["end"] = None
+        return result
+    cryptos, start, returns, sentiment, mentions = series
+    length = returns.shape[-1]
+    result["start"] = start
+    result["end"] = start + length * interval
+
+    target = np.broadcast_to(returns, (len(lags),) + returns.shape)
+    for name, signal in zip(SIGNALS, (sentiment, mentions)):
+        shifted = shift(signal, lags)
+        full = rolling_correlation(shifted, target, length)[..., -1]
+        recent = rolling_correlation(shifted, target, min(window, length))[..., -1]
+        points = (~(np.isnan(shifted) | np.isnan(target))).sum(axis=-1)
+        for c, crypto in enumerate(cryptos):
+            corr = [None if np.isnan(value) else round(float(value), 4) for value in full[:, c]]
+            defined = [(abs(value), lag) for value, lag in zip(corr, lags) if value is not None]
+            result["cryptos"].setdefault(crypto, {})[name] = {
+                "corr": corr,
+                "rolling": [None if np.isnan(value) else round(float(value), 4) for value in recent[:, c]],
+                "points": [int(p) for p in points[:, c]],
+                "best_lag": max(defined)[1] if defined else None,
+            }
+    return result
+
+
+class LeadLagCache:
+    """
+    Serves compute_lead_lag() results per (interval, window), recomputing an entry only when it is
+    older than `ttl` seconds and the newest post id or the price table has changed since.
+    """
+
+    def __init__(self, db_file=DB_FILE, ttl=900):
+        self.db_file = db_file
+        self.ttl = ttl
+        self.entries = {}  # (interval, window) -> (computed_at, data_version, result)
+        self._lock = threading.Lock()
+
+    def _data_version(self, conn):
+        create_price_table(conn)
+        last_id = conn.execute("SELECT MAX(id) FROM trend_data").fetchone()[0]
+        # Re-importing replaces candles, so the newest time alone would miss corrections; the table is small
+        prices = conn.execute("SELECT COUNT(*), MAX(ts), TOTAL(close) FROM prices").fetchone()
+        return (last_id,) + tuple(prices)
+
+    def get(self, interval, window):
+        key = (interval, window)
+        with self._lock:
+            entry = self.entries.get(key)
+        if entry and time.time() - entry[0] < self.ttl:
+            return entry[2]
+        # Computed without holding the lock, so readers of other (or fresh) entries are never blocked;
+        # two requests for the same stale entry may both compute it, and the later one is kept
+        conn = sqlite3.connect(self.db_file)
+        try:
+            version = self._data_version(conn)
+            if entry and entry[1] == version:
+                result = entry[2]
+            else:
+                result = compute_lead_lag(conn, interval, window)
+        finally:
+            conn.close()
+        with self._lock:
+            self.entries[key] = (time.time(), version, result)
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Correlate sentiment and mentions with price returns at several lags.")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--interval", choices=sorted(INTERVALS), default="1h")
+    parser.add_argument("--window", type=int, default=168, help="Intervals in the rolling window")
+    parser.add_argument("--lags", default=",".join(str(lag) for lag in DEFAULT_LAGS),
+                        type=lambda value: tuple(int(lag) for lag in value.split(",")),
+                        help="Comma-separated lags in intervals; positive means sentiment leads")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        start = time.perf_counter()
+        result = compute_lead_lag(conn, INTERVALS[args.interval], args.window, args.lags)
+        elapsed = time.perf_counter() - start
+    finally:
+        conn.close()
+    if not result["cryptos"]:
+        print("No price data; import some with prices.py first.")
+        return
+    print(f"{'crypto':<10} {'signal':<10} " + " ".join(f"{lag:>7}" for lag in result["lags"]) + "  best")
+    for crypto, signals in result["cryptos"].items():
+        for name, stats in signals.items():
+            cells = " ".join(f"{value:>7.3f}" if value is not None else f"{'-':>7}" for value in stats["corr"])
+            print(f"{crypto:<10} {name:<10} {cells}  {stats['best_lag']}")
+    print(f"Computed in {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+live_updates.py
+
+Pushes newly committed trend_data rows to dashboards as Server-Sent Events, instead of dashboards
+polling the whole /trends history.
+
+One ChangeFeed per API process watches the database with PRAGMA data_version, which changes whenever
+another connection (an aggregator, the writer daemon) commits. Only then does it read the rows past the
+highest id it has seen, so an idle database costs one cheap pragma per poll however many clients are
+connected. New rows are fanned out to every subscriber whose crypto filter matches, together with a
+rollup delta: per crypto and day, how many posts arrived and the sum of their compound sentiment, which
+a dashboard can add to the daily totals it already has.
+
+Each SSE event carries the highest row id it covers. Browsers send it back as Last-Event-ID when they
+reconnect, and the feed replays the rows committed in between (a client that falls too far behind is
+disconnected and catches up the same way). Replay is capped at MAX_REPLAY_ROWS; a client that missed
+more than that gets a `reset` event first and should refetch /trends instead of patching its data.
+
+A database error while polling (e.g. "database is locked") is logged and the poller backs off and
+tries again, so connected clients resume receiving rows once the database is available.
+
+api_endpoint.py serves the stream at /trends/stream.
+"""
+
+import json
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+POLL_INTERVAL = 0.5
+KEEPALIVE_INTERVAL = 15
+MAX_QUEUED_EVENTS = 1000
+MAX_REPLAY_ROWS = 5000
+MAX_BACKOFF = 30
+
+# Queued ahead of a truncated replay: the client has missed rows and must reload
+RESET = object()
+
+ROW_COLUMNS = (
+    "id", "title", "crypto", "score", "num_comments", "created",
+    "sentiment_neg", "sentiment_neu", "sentiment_pos", "sentiment_compound", "source",
+)
+
+
+def _fetch_rows(conn, after_id, until_id=None, limit=MAX_REPLAY_ROWS):
+    sql = f"SELECT {', '.join(ROW_COLUMNS)} FROM trend_data WHERE id > ?"
+    params = [after_id]
+    if until_id is not None:
+        sql += " AND id <= ?"
+        params.append(until_id)
+    sql += " ORDER BY id LIMIT ?"
+    params.append(limit)
+    return [dict(zip(ROW_COLUMNS, row)) for row in conn.execute(sql, params)]
+
+
+def rollup_delta(rows):
+    """Per (crypto, day): the number of rows and the sum of their compound sentiment."""
+    totals = {}
+    for row in rows:
+        key = (row["crypto"], (row["created"] or "")[:10])
+        mentions, sentiment_sum = totals.get(key, (0, 0.0))
+        totals[key] = (mentions + 1, sentiment_sum + (row["sentiment_compound"] or 0.0))
+    return [
+        {"crypto": crypto, "day": day, "mentions": mentions, "sentiment_sum": round(sentiment_sum, 4)}
+        for (crypto, day), (mentions, sentiment_sum) in sorted(totals.items(), key=lambda item: str(item[0]))
+    ]
+
+
+def format_event(rows):
+    """Format a list of rows as an SSE `rows` event followed by a `rollup` event, both with the last row id."""
+    last_id = rows[-1]["id"]
+    return (
+        f"id: {last_id}\nevent: rows\ndata: {json.dumps(rows, sort_keys=True)}\n\n"
+        f"id: {last_id}\nevent: rollup\ndata: {json.dumps(rollup_delta(rows))}\n\n"
+    )
+
+
+def format_reset(last_id):
+    """
+    Format a `reset` event: rows up to `last_id` were not all replayed, so the client should reload
+    /trends. The rows that follow continue from the newest MAX_REPLAY_ROWS.
+    """
+    return f"id: {last_id}\nevent: reset\ndata: {json.dumps({'last_id': last_id})}\n\n"
+
+
+class Subscription:
+    """One connected client: its crypto filter and the queue of row batches waiting to be sent."""
+
+    def __init__(self, crypto=None):
+        self.crypto = crypto
+        self.queue = queue.Queue(MAX_QUEUED_EVENTS)
+        self.overflowed = False
+
+    def reset(self, last_id):
+        """Tell the client its replay was cut short and it should reload everything up to `last_id`."""
+        try:
+            self.queue.put_nowait((RESET, last_id))
+        except queue.Full:
+            self.overflowed = True
+
+    def offer(self, rows):
+        if self.crypto:
+            rows = [row for row in rows if row["crypto"] == self.crypto]
+        if not rows:
+            return
+        try:
+            self.queue.put_nowait(rows)
+        except queue.Full:
+            # Too far behind: drop it, and let the client reconnect and replay from its last event id
+            self.overflowed = True
+
+
+class ChangeFeed:
+    """
+    Tails trend_data for new commits and broadcasts the new rows to subscribers.
+
+    Parameters:
+      db_file (str): SQLite database path.
+      poll_interval (float): Seconds between PRAGMA data_version checks.
+    """
+
+    def __init__(self, db_file, poll_interval=POLL_INTERVAL):
+        self.db_file = db_file
+        self.poll_interval = poll_interval
+        self.subscribers = set()
+        self._lock = threading.Lock()
+        conn = sqlite3.connect(db_file)
+        try:
+            self.last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM trend_data").fetchone()[0]
+        finally:
+            conn.close()
+        self._thread = threading.Thread(target=self._poll_loop, daemon=True)
+        self._thread.start()
+
+    def _poll_loop(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        version = None
+        delay = self.poll_interval
+        while True:
+            try:
+                current = conn.execute("PRAGMA data_version").fetchone()[0]
+                if current != version:
+                    self.poll(conn)
+                    # Only once the new rows are out, so a failed poll is retried
+                    version = current
+                delay = self.poll_interval
+            except sqlite3.Error as exc:
+                delay = min(max(delay * 2, 1.0), MAX_BACKOFF)
+                print(f"ChangeFeed: polling {self.db_file} failed ({exc}), retrying in {delay:g}s", file=sys.stderr)
+            time.sleep(delay)
+
+    def poll(self, conn):
+        """Read rows committed since the last poll and hand them to every subscriber."""
+        while True:
+            rows = _fetch_rows(conn, self.last_id)
+            if not rows:
+                return
+            with self._lock:
+                self.last_id = rows[-1]["id"]
+                for subscription in self.subscribers:
+                    subscription.offer(rows)
+
+    def subscribe(self, crypto=None, since=None):
+        """
+        Register a client. If `since` (a row id, e.g. from Last-Event-ID) is given, rows committed
+        after it are queued first, up to MAX_REPLAY_ROWS; if more were missed, a reset comes first.
+        """
+        subscription = Subscription(crypto)
+        with self._lock:
+            if since is not None and since < self.last_id:
+                if since < self.last_id - MAX_REPLAY_ROWS:
+                    subscription.reset(self.last_id)
+                conn = sqlite3.connect(self.db_file)
+                try:
+                    after = max(since, self.last_id - MAX_REPLAY_ROWS)
+                    while True:
+                        rows = _fetch_rows(conn, after, self.last_id, limit=500)
+                        if not rows:
+                            break
+                        subscription.offer(rows)
+                        after = rows[-1]["id"]
+                finally:
+                    conn.close()
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscribers.discard(subscription)
+
+    def stream(self, crypto=None, since=None):
+        """Yield the SSE response body for one client until it disconnects or falls behind."""
+        subscription = self.subscribe(crypto, since)
+        try:
+            # Tells EventSource how long to wait before reconnecting
+            yield "retry: 3000\n\n"
+            while not subscription.overflowed:
+                try:
+                    rows = subscription.queue.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    # Comment line; keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                if rows[0] is RESET:
+                    yield format_reset(rows[1])
+                    continue
+                yield format_event(rows)
+        finally:
+            self.unsubscribe(subscription)
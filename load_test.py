@@ -0,0 +1,428 @@
+#!/usr/bin/env python
+"""
+load_test.py
+
+Load tests the trends API with the traffic the dashboard actually sends and reports throughput and
+latency percentiles per endpoint and number of open dashboards, for capacity planning and for
+comparing serving setups.
+
+Each simulated user opens the dashboard for one crypto, the way crypto-dashboard/src/App.js does:
+load the history (GET /trends?crypto=...) and the sentiment index (GET /trends/sentiment-index),
+then subscribe to GET /trends/stream and keep it open for a while (--session-length on average).
+Every `rows` event pushed on the stream triggers an incremental index fetch (sentiment-index with
+start= the newest point received), and a `reset` event reloads both. When the session ends the user
+switches to another crypto and starts over.
+
+Pushes need new rows: a feeder thread writes --push-rows synthetic rows through write_records() every
+--push-interval seconds, as the aggregators do, into the database the server reads. The "push" row of
+the report is the time from a batch's commit to its `rows` event reaching a subscriber (it includes
+the change feed's poll interval); the stream's own latency is the time to the response headers.
+
+By default the API is started in a subprocess (Flask's threaded server) against a copy of a cached
+synthetic database of --size rows built with synthetic_corpus.py, so the feeder never changes the
+cache. To measure another serving setup, start it yourself and pass --url, plus --db with the
+database it reads so the feeder can write there (without --db nothing is pushed).
+
+Results are printed as a table and written to benchmark_results/ as JSON, like benchmark.py.
+
+Usage:
+  python load_test.py --size 100000 --concurrency 1,16,64 --duration 30
+  python load_test.py --url http://127.0.0.1:8000 --db /tmp/served.db --concurrency 8,64
+"""
+
+import argparse
+import bisect
+import collections
+import datetime
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from benchmark import RESULTS_DIR, git_commit, percentile, synthetic_db
+from synthetic_corpus import COINS, COIN_WEIGHTS, CorpusGenerator
+
+# Not a request: commit-to-subscriber latency of pushed rows, left out of the "all" row
+PUSH = "push"
+
+
+class DashboardUser:
+    """
+    Generates the request paths of one simulated dashboard user.
+
+    Parameters:
+      rng (random.Random): This user's RNG.
+      session_length (float): Mean seconds a dashboard stays open on one crypto.
+    """
+
+    def __init__(self, rng, session_length):
+        self.rng = rng
+        self.session_length = session_length
+
+    def crypto(self):
+        """The crypto for the next session, popular coins more often."""
+        return self.rng.choices([coin for coin, _ in COINS], COIN_WEIGHTS)[0]
+
+    def session_seconds(self):
+        return self.rng.expovariate(1 / self.session_length)
+
+    @staticmethod
+    def load_paths(crypto):
+        """(endpoint, path) pairs fetched when the dashboard opens or reloads after a reset."""
+        query = urllib.parse.urlencode({"crypto": crypto})
+        return [("/trends", "/trends?" + query), ("/trends/sentiment-index", "/trends/sentiment-index?" + query)]
+
+    @staticmethod
+    def stream_path(crypto):
+        return "/trends/stream?" + urllib.parse.urlencode({"crypto": crypto})
+
+    @staticmethod
+    def index_update_path(crypto, last_ts):
+        """The incremental index fetch after a push; everything when no point has been received yet."""
+        params = {"crypto": crypto}
+        if last_ts is not None:
+            params["start"] = last_ts
+        return "/trends/sentiment-index?" + urllib.parse.urlencode(params)
+
+
+class Feeder(threading.Thread):
+    """
+    Writes a batch of synthetic rows into `db_file` every `interval` seconds and remembers when each
+    batch committed, so subscribers can measure how long its push took.
+
+    Parameters:
+      db_file (str): Database the server reads.
+      rows (int): Rows per batch.
+      interval (float): Seconds between batches.
+      seed (int): RNG seed.
+    """
+
+    def __init__(self, db_file, rows, interval, seed):
+        super().__init__(daemon=True)
+        self.db_file = db_file
+        self.rows = rows
+        self.interval = interval
+        self.seed = seed
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        # Highest row id of each committed batch and its commit time, in commit order
+        self.last_ids = []
+        self.commit_times = []
+
+    def commit_time(self, row_id):
+        """perf_counter() time at which the batch holding `row_id` committed, or None if unknown."""
+        with self.lock:
+            index = bisect.bisect_left(self.last_ids, row_id)
+            return self.commit_times[index] if index < len(self.commit_times) else None
+
+    def run(self):
+        from writer_daemon import write_records
+
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            last_id, latest = conn.execute("SELECT MAX(id), MAX(created) FROM trend_data").fetchone()
+            start = datetime.datetime.strptime(latest, "%Y-%m-%d %H:%M:%S") if latest else datetime.datetime.now()
+            generator = CorpusGenerator(seed=self.seed + 1, start=start)
+            # Continue the post ids, so fed posts are new rather than re-polls of the existing ones
+            generator.count = last_id or 0
+            while not self.stopped.wait(self.interval):
+                with conn:
+                    write_records(conn, list(generator.records(self.rows, scored=True)))
+                    last_id = conn.execute("SELECT MAX(id) FROM trend_data").fetchone()[0]
+                with self.lock:
+                    self.last_ids.append(last_id)
+                    self.commit_times.append(time.perf_counter())
+        finally:
+            conn.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def request(host, port, path, timeout=60):
+    """Send one GET and read the whole body. Returns (status, body)."""
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def read_events(response):
+    """Yield (event, id, data) for each SSE event in `response` until the stream ends."""
+    event, event_id, data = None, None, []
+    while True:
+        line = response.readline()
+        if not line:
+            return
+        line = line.decode("utf-8").rstrip("\n")
+        if not line:
+            if event:
+                yield event, event_id, "\n".join(data)
+            event, event_id, data = None, None, []
+        elif line.startswith("event: "):
+            event = line[7:]
+        elif line.startswith("id: "):
+            event_id = int(line[4:])
+        elif line.startswith("data: "):
+            data.append(line[6:])
+
+
+def run_level(host, port, concurrency, duration, seed, session_length, feeder):
+    """
+    Keep `concurrency` dashboards open for `duration` seconds.
+
+    Returns:
+      {endpoint: {"latencies": [...], "errors": n, "bytes": n}} and the measured wall time.
+    """
+    results = collections.defaultdict(lambda: {"latencies": [], "errors": 0, "bytes": 0})
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def record(endpoint, elapsed, ok, size=0):
+        with lock:
+            entry = results[endpoint]
+            if ok:
+                entry["latencies"].append(elapsed)
+                entry["bytes"] += size
+            else:
+                entry["errors"] += 1
+
+    def fetch(endpoint, path):
+        """GET `path`, record it under `endpoint` and return the body (None on failure)."""
+        began = time.perf_counter()
+        try:
+            status, body = request(host, port, path)
+        except (OSError, http.client.HTTPException):
+            status, body = None, b""
+        record(endpoint, time.perf_counter() - began, status == 200, len(body))
+        return body if status == 200 else None
+
+    def load(crypto):
+        """Open the dashboard on `crypto`; returns the ts of the newest index point."""
+        last_ts = None
+        for endpoint, path in DashboardUser.load_paths(crypto):
+            body = fetch(endpoint, path)
+            if endpoint == "/trends/sentiment-index" and body:
+                points = json.loads(body)
+                last_ts = points[-1]["ts"] if points else None
+        return last_ts
+
+    def watch(crypto, last_ts, until):
+        """Hold the stream open until `until`, reacting to pushes like the dashboard does."""
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        sockets = []
+
+        def hang_up():
+            # Shutting the socket down from outside is what ends a blocked readline() on time
+            try:
+                sockets[0].shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+        closer = threading.Timer(max(0.0, until - time.perf_counter()), hang_up)
+        began = time.perf_counter()
+        try:
+            conn.request("GET", DashboardUser.stream_path(crypto))
+            # getresponse() drops the connection's reference when the server will close it
+            sockets.append(conn.sock)
+            response = conn.getresponse()
+            record("/trends/stream", time.perf_counter() - began, response.status == 200)
+            if response.status != 200:
+                return
+            closer.start()
+            for event, event_id, data in read_events(response):
+                if event == "rows":
+                    committed = feeder.commit_time(event_id) if feeder else None
+                    if committed is not None:
+                        record(PUSH, time.perf_counter() - committed, True, len(data))
+                    body = fetch("/trends/sentiment-index", DashboardUser.index_update_path(crypto, last_ts))
+                    if body:
+                        points = json.loads(body)
+                        last_ts = points[-1]["ts"] if points else last_ts
+                elif event == "reset":
+                    last_ts = load(crypto)
+        except (OSError, http.client.HTTPException):
+            # Expected when the closer shuts the socket; a failure before the headers is an error
+            if time.perf_counter() < until:
+                record("/trends/stream", 0, False)
+        finally:
+            closer.cancel()
+            conn.close()
+
+    def user(index):
+        visitor = DashboardUser(random.Random(seed * 1000 + index), session_length)
+        while time.perf_counter() < deadline:
+            crypto = visitor.crypto()
+            last_ts = load(crypto)
+            until = min(deadline, time.perf_counter() + visitor.session_seconds())
+            if time.perf_counter() < until:
+                watch(crypto, last_ts, until)
+
+    began = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - began
+
+
+def summarize(results, wall_time, concurrency):
+    """
+    One row per endpoint plus an "all" row over the requests: throughput, errors and p50/p95/p99 in
+    milliseconds. The push row counts delivered `rows` events instead of requests.
+    """
+    rows = []
+    everything = []
+    for endpoint in sorted(results):
+        entry = results[endpoint]
+        if endpoint != PUSH:
+            everything.extend(entry["latencies"])
+        rows.append(_row(endpoint, concurrency, entry["latencies"], entry["errors"], entry["bytes"], wall_time))
+    requests = [entry for endpoint, entry in results.items() if endpoint != PUSH]
+    errors = sum(entry["errors"] for entry in requests)
+    total_bytes = sum(entry["bytes"] for entry in requests)
+    rows.append(_row("all", concurrency, everything, errors, total_bytes, wall_time))
+    return rows
+
+
+def _row(endpoint, concurrency, latencies, errors, size, wall_time):
+    row = {"endpoint": endpoint, "concurrency": concurrency, "requests": len(latencies), "errors": errors,
+           "rps": round(len(latencies) / wall_time, 2), "bytes": size}
+    if latencies:
+        for pct in (50, 95, 99):
+            row[f"p{pct}_ms"] = round(percentile(latencies, pct) * 1000, 2)
+    return row
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(db_file, port):
+    """Start api_endpoint.py on `port` against `db_file` in a subprocess and wait until it answers."""
+    code = (
+        "import api_endpoint\n"
+        f"api_endpoint.DB_FILE = {db_file!r}\n"
+        f"api_endpoint.app.run(host='127.0.0.1', port={port}, threaded=True, debug=False)\n"
+    )
+    server = subprocess.Popen([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            if request("127.0.0.1", port, "/trends/sentiment-index?crypto=bitcoin&start=0&end=0", timeout=5)[0] == 200:
+                return server
+        except OSError:
+            pass
+        if server.poll() is not None:
+            break
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("API server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the trends API with simulated dashboard traffic.")
+    parser.add_argument("--size", type=int, default=100000, help="Rows in the synthetic database")
+    parser.add_argument("--density", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", default="1,4,16",
+                        type=lambda value: [int(level) for level in value.split(",")],
+                        help="Comma-separated numbers of open dashboards")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per concurrency level")
+    parser.add_argument("--session-length", type=float, default=30,
+                        help="Mean seconds a dashboard stays open on one crypto")
+    parser.add_argument("--push-rows", type=int, default=100, help="Rows per fed batch (0: no feeder)")
+    parser.add_argument("--push-interval", type=float, default=2, help="Seconds between fed batches")
+    parser.add_argument("--url", help="Test an already running server instead of starting one")
+    parser.add_argument("--db", help="With --url: the database that server reads, for the feeder to write to")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "cryptotrend-bench"),
+                        help="Where synthetic databases are cached (shared with benchmark.py)")
+    parser.add_argument("--output", help="Results file (default: benchmark_results/load-<time>-<commit>.json)")
+    args = parser.parse_args()
+
+    server = None
+    served = None
+    if args.url:
+        parsed = urllib.parse.urlparse(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+        feed_db = args.db
+        if not feed_db:
+            print("No --db given: nothing will be pushed to the streams", file=sys.stderr)
+    else:
+        os.makedirs(args.workdir, exist_ok=True)
+        db_file = synthetic_db(args.workdir, args.size, args.density, args.seed)
+        # The feeder writes into a copy, so the cached database stays as benchmark.py expects it
+        served = os.path.join(args.workdir, f"load-{os.getpid()}.db")
+        shutil.copyfile(db_file, served)
+        print(f"Synthetic database: {served}", file=sys.stderr)
+        feed_db = served
+        host, port = "127.0.0.1", free_port()
+        server = start_server(served, port)
+
+    feeder = None
+    if feed_db and args.push_rows > 0:
+        feeder = Feeder(feed_db, args.push_rows, args.push_interval, args.seed)
+        feeder.start()
+
+    rows = []
+    try:
+        # Warm-up: the first stream request starts the server's change feed
+        for endpoint, path in DashboardUser.load_paths("bitcoin"):
+            request(host, port, path)
+        run_level(host, port, 1, 1, args.seed, 1, None)
+        for concurrency in args.concurrency:
+            print(f"{concurrency} open dashboards for {args.duration:.0f}s...", file=sys.stderr)
+            results, wall_time = run_level(host, port, concurrency, args.duration, args.seed,
+                                           args.session_length, feeder)
+            rows.extend(summarize(results, wall_time, concurrency))
+    finally:
+        if feeder:
+            feeder.stop()
+        if server:
+            server.terminate()
+            server.wait()
+        if served:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(served + suffix):
+                    os.remove(served + suffix)
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "target": args.url or "flask threaded (subprocess)",
+        "params": vars(args),
+        "results": rows,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = args.output or os.path.join(RESULTS_DIR, f"load-{stamp}-{commit}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'endpoint':<24} {'users':>5} {'reqs':>7} {'errors':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for r in rows:
+        print(f"{r['endpoint']:<24} {r['concurrency']:>5} {r['requests']:>7} {r['errors']:>6} {r['rps']:>8.1f} "
+              f"{r.get('p50_ms', ''):>9} {r.get('p95_ms', ''):>9} {r.get('p99_ms', ''):>9}")
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+metrics.py
+
+A small in-process metrics layer: counters and latency histograms with labels, rendered in the
+Prometheus text exposition format.
+
+Modules create their metrics once at import time with counter() / histogram(), which return the
+existing metric if another module already registered the same name:
+
+    WRITE_SECONDS = histogram("db_write_seconds", "Time spent writing a batch to trend_data")
+    with WRITE_SECONDS.time():
+        ...
+
+api_endpoint.py serves the registry at /metrics. Short-lived processes such as the aggregators can
+instead write it to a file for node_exporter's textfile collector (write_textfile) or push it to a
+Prometheus Pushgateway (push); export() does whichever of the two is configured, by argument or through
+the TREND_METRICS_FILE and TREND_PUSHGATEWAY environment variables. Neither needs any extra dependency.
+"""
+
+import contextlib
+import math
+import os
+import threading
+import time
+import urllib.request
+
+PREFIX = "cryptotrend_"
+METRICS_FILE = os.getenv("TREND_METRICS_FILE")
+PUSHGATEWAY_URL = os.getenv("TREND_PUSHGATEWAY")
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _label_text(names, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """A monotonically increasing value per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = PREFIX + name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(_escape(labels.get(name, "")) for name in self.labels)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self.values.items())
+        for key, value in items:
+            yield f"{self.name}_total{_label_text(self.labels, key)} {value}"
+
+
+class Histogram:
+    """Observations counted into cumulative buckets, plus their sum and count, per label combination."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = PREFIX + name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(_escape(labels.get(name, "")) for name in self.labels)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the `with` block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(state[0]), state[1], state[2]) for key, state in self.values.items()]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == math.inf else f'le="{bound}"'
+                yield f"{self.name}_bucket{_label_text(self.labels, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_label_text(self.labels, key)} {total}"
+            yield f"{self.name}_count{_label_text(self.labels, key)} {count}"
+
+
+class Registry:
+    """All metrics of this process, keyed by name."""
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(self, cls, name, help_text, labels, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text, labels, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in list(self.metrics.values()):
+            name = metric.name
+            lines.append(f"# HELP {name}{'_total' if metric.kind == 'counter' else ''} {metric.help}")
+            lines.append(f"# TYPE {name}{'_total' if metric.kind == 'counter' else ''} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help_text, labels=()):
+    """Return the counter `name`, creating it on first use."""
+    return REGISTRY.get_or_create(Counter, name, help_text, labels)
+
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    """Return the histogram `name`, creating it on first use."""
+    return REGISTRY.get_or_create(Histogram, name, help_text, labels, buckets=buckets)
+
+
+def render():
+    return REGISTRY.render()
+
+
+def write_textfile(path):
+    """
+    Write the registry to `path` for node_exporter's textfile collector. The file is written under a
+    temporary name and renamed, so the collector never reads a half-written file.
+    """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+def push(gateway_url, job, timeout=10):
+    """Replace this job's metrics on a Prometheus Pushgateway (e.g. http://localhost:9091)."""
+    request = urllib.request.Request(
+        f"{gateway_url.rstrip('/')}/metrics/job/{job}",
+        data=render().encode("utf-8"),
+        method="PUT",
+        headers={"Content-Type": "text/plain; version=0.0.4"},
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+
+
+def export(job, textfile=METRICS_FILE, gateway_url=PUSHGATEWAY_URL):
+    """
+    Write and/or push the registry at the end of a batch job, if a destination is configured.
+    A Pushgateway that cannot be reached is reported but does not fail the job.
+    """
+    if textfile:
+        write_textfile(textfile)
+    if gateway_url:
+        try:
+            push(gateway_url, job)
+        except OSError as e:
+            print(f"Could not push metrics to {gateway_url}: {e}")
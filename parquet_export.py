@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+"""
+parquet_export.py
+
+Exports trend_data.db to Parquet for analysis, so historical number crunching runs off columnar files
+instead of pulling everything through /trends as JSON and loading the serving database.
+
+Layout (Hive-style partitions, readable by pyarrow, pandas, DuckDB, Spark, ...):
+
+  <out>/trend_data/day=2024-01-05/crypto=bitcoin/part-<first id>-<last id>-0.parquet
+  <out>/engagement/day=2024-01-05/crypto=bitcoin/part-<first ts>-<last ts>-0.parquet
+  <out>/trend_hourly/data.parquet, <out>/trend_daily/data.parquet   (retention.py rollups, if any)
+  <out>/_export_state.json
+
+Exports are incremental: _export_state.json remembers the highest trend_data id and engagement snapshot
+time already written, and each run only appends new part files for rows after them, into whichever
+day/crypto partitions they fall in. Part file names are derived from the exported range, so a run that
+is interrupted before the state is saved just rewrites the same files next time. The rollup tables are
+small and updated in place by retention.py, so they are rewritten whole. Rows that retention.py later
+deletes from the database stay in the export.
+
+Frequent runs leave several small files per partition; `compact` merges them into one.
+
+The query helpers read through pyarrow.dataset, pruning partitions by day and crypto before any file
+is opened, and aggregate with pyarrow.compute kernels:
+
+  table = load("trend_export", crypto="bitcoin", start="2024-01-01", end="2024-03-31")
+  summary = summarize("trend_export", by="day", start="2024-01-01")   # pyarrow.Table; .to_pandas()
+
+Dependencies:
+  - pyarrow
+
+Usage:
+  python parquet_export.py export --db trend_data.db --out trend_export
+  python parquet_export.py compact trend_export
+  python parquet_export.py summary trend_export --by day --crypto bitcoin --start 2024-01-01
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+DB_FILE = "trend_data.db"
+EXPORT_DIR = "trend_export"
+STATE_FILE = "_export_state.json"
+CHUNK_ROWS = 200000
+
+PARTITIONING = ds.partitioning(pa.schema([("day", pa.string()), ("crypto", pa.string())]), flavor="hive")
+
+TREND_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("title", pa.string()),
+    ("score", pa.int64()),
+    ("num_comments", pa.int64()),
+    ("created", pa.timestamp("s")),
+    ("sentiment_neg", pa.float64()),
+    ("sentiment_neu", pa.float64()),
+    ("sentiment_pos", pa.float64()),
+    ("sentiment_compound", pa.float64()),
+    ("source", pa.string()),
+    ("day", pa.string()),
+    ("crypto", pa.string()),
+])
+
+ENGAGEMENT_SCHEMA = pa.schema([
+    ("source", pa.string()),
+    ("post_id", pa.string()),
+    ("ts", pa.timestamp("s")),
+    ("score", pa.int64()),
+    ("num_comments", pa.int64()),
+    ("day", pa.string()),
+    ("crypto", pa.string()),
+])
+
+
+def load_state(out_dir):
+    path = os.path.join(out_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {"trend_data_last_id": 0, "engagement_last_ts": 0}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(out_dir, state):
+    path = os.path.join(out_dir, STATE_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _table(rows, schema):
+    """Build a pyarrow Table from row tuples in `schema` order."""
+    columns = list(zip(*rows))
+    return pa.table([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+
+def _write(table, out_dir, name, basename):
+    ds.write_dataset(
+        table,
+        os.path.join(out_dir, name),
+        format="parquet",
+        partitioning=PARTITIONING,
+        basename_template=basename + "-{i}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+
+def export_trend_data(conn, out_dir, last_id, chunk_rows=CHUNK_ROWS):
+    """
+    Append trend_data rows with id > `last_id` to <out_dir>/trend_data, `chunk_rows` at a time.
+
+    Returns:
+      (rows exported, new last id)
+    """
+    exported = 0
+    while True:
+        rows = conn.execute('''
+            SELECT id, title, score, num_comments, CAST(strftime('%s', created) AS INTEGER),
+                   sentiment_neg, sentiment_neu, sentiment_pos, sentiment_compound, COALESCE(source, 'reddit'),
+                   COALESCE(substr(created, 1, 10), 'unknown'), COALESCE(crypto, 'Unknown')
+            FROM trend_data
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', (last_id, chunk_rows)).fetchall()
+        if not rows:
+            return exported, last_id
+        first_id, last_id = rows[0][0], rows[-1][0]
+        _write(_table(rows, TREND_SCHEMA), out_dir, "trend_data", f"part-{first_id}-{last_id}")
+        exported += len(rows)
+
+
+def export_engagement(conn, out_dir, last_ts, now=None, chunk_rows=CHUNK_ROWS):
+    """
+    Append engagement snapshots taken after `last_ts` (epoch seconds) to <out_dir>/engagement, `chunk_rows`
+    at a time. Snapshots from the current second are left for the next run, since more may still be
+    written with that time.
+
+    Returns:
+      (snapshots exported, new last ts)
+    """
+    until = int(now or time.time())
+    try:
+        cur = conn.execute('''
+            SELECT p.source, p.post_id, s.ts, s.score, s.num_comments,
+                   date(s.ts, 'unixepoch'), COALESCE(p.crypto, 'Unknown')
+            FROM engagement_snapshots s
+            JOIN engagement_posts p ON p.post_key = s.post_key
+            WHERE s.ts > ? AND s.ts < ?
+            ORDER BY s.ts
+        ''', (last_ts, until))
+    except sqlite3.OperationalError:
+        return 0, last_ts  # No engagement tables in this database
+    exported = 0
+    while True:
+        rows = cur.fetchmany(chunk_rows)
+        if not rows:
+            return exported, last_ts
+        # One batch of snapshots shares a ts, so the chunk number keeps part names apart
+        first_ts, last_ts = rows[0][2], rows[-1][2]
+        _write(_table(rows, ENGAGEMENT_SCHEMA), out_dir, "engagement",
+               f"part-{first_ts}-{last_ts}-{exported // chunk_rows}")
+        exported += len(rows)
+
+
+def export_rollups(conn, out_dir):
+    """Rewrite the retention.py rollup tables, if present. Returns the number of rows written."""
+    written = 0
+    for name in ("trend_hourly", "trend_daily"):
+        cur = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+        if not cur.fetchone():
+            continue
+        cur = conn.execute(f"SELECT * FROM {name} ORDER BY crypto, bucket")
+        columns = [description[0] for description in cur.description]
+        rows = cur.fetchall()
+        table = pa.table({column: [row[i] for row in rows] for i, column in enumerate(columns)})
+        os.makedirs(os.path.join(out_dir, name), exist_ok=True)
+        path = os.path.join(out_dir, name, "data.parquet")
+        pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        written += len(rows)
+    return written
+
+
+def export(db_file=DB_FILE, out_dir=EXPORT_DIR):
+    """
+    Export everything new since the last run.
+
+    Returns:
+      {"trend_data": rows, "engagement": snapshots, "rollups": rows}
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    state = load_state(out_dir)
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        trend_rows, state["trend_data_last_id"] = export_trend_data(conn, out_dir, state["trend_data_last_id"])
+        snapshots, state["engagement_last_ts"] = export_engagement(conn, out_dir, state["engagement_last_ts"])
+        rollups = export_rollups(conn, out_dir)
+    finally:
+        conn.close()
+    state["exported_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+    save_state(out_dir, state)
+    return {"trend_data": trend_rows, "engagement": snapshots, "rollups": rollups}
+
+
+def compact(out_dir=EXPORT_DIR, min_files=4):
+    """
+    Merge the part files of every partition that has at least `min_files` of them into one file.
+    Run it while no export is running. Returns the number of partitions compacted.
+    """
+    compacted = 0
+    for name in ("trend_data", "engagement"):
+        root = os.path.join(out_dir, name)
+        for directory, _, files in os.walk(root):
+            parts = sorted(f for f in files if f.startswith("part-") and f.endswith(".parquet"))
+            if len(parts) < min_files:
+                continue
+            table = pa.concat_tables(pq.read_table(os.path.join(directory, f), partitioning=None) for f in parts)
+            merged = os.path.join(directory, f"{parts[0][:-len('.parquet')]}-merged.parquet")
+            pq.write_table(table, merged + ".tmp")
+            os.replace(merged + ".tmp", merged)
+            for f in parts:
+                os.remove(os.path.join(directory, f))
+            compacted += 1
+    return compacted
+
+
+def dataset(out_dir=EXPORT_DIR, table="trend_data"):
+    """Open one exported table as a pyarrow Dataset, with `day` and `crypto` as partition columns."""
+    return ds.dataset(os.path.join(out_dir, table), format="parquet", partitioning=PARTITIONING)
+
+
+def _filter(crypto=None, start=None, end=None):
+    expression = None
+    for condition in (
+        ds.field("crypto") == crypto if crypto else None,
+        ds.field("day") >= start[:10] if start else None,
+        ds.field("day") <= end[:10] if end else None,
+    ):
+        if condition is not None:
+            expression = condition if expression is None else expression & condition
+    return expression
+
+
+def load(out_dir=EXPORT_DIR, table="trend_data", crypto=None, start=None, end=None, columns=None):
+    """
+    Read exported rows as a pyarrow Table. Only the partitions matching `crypto` and the inclusive
+    YYYY-MM-DD `start`/`end` bounds are opened, and only `columns` (default all) are decoded.
+    """
+    return dataset(out_dir, table).to_table(columns=columns, filter=_filter(crypto, start, end))
+
+
+def summarize(out_dir=EXPORT_DIR, by="day", crypto=None, start=None, end=None):
+    """
+    Mentions, total and mean score, total comments and mean sentiment per crypto and `by` ("day",
+    "hour" or "week"), computed with vectorized pyarrow kernels over the exported trend_data.
+
+    Returns:
+      A pyarrow Table sorted by crypto and period (call .to_pandas() for a DataFrame).
+    """
+    columns = ["crypto", "day", "created", "score", "num_comments", "sentiment_compound"]
+    table = load(out_dir, "trend_data", crypto, start, end, columns)
+    if by == "day":
+        period = table["day"]
+    elif by in ("hour", "week"):
+        # Weeks start on Monday
+        period = pc.strftime(pc.floor_temporal(table["created"], unit=by),
+                             format="%Y-%m-%d %H:00:00" if by == "hour" else "%Y-%m-%d")
+    else:
+        raise ValueError("by must be day, hour or week")
+    table = table.append_column("period", period)
+    result = table.group_by(["crypto", "period"]).aggregate([
+        ("score", "count"),
+        ("score", "sum"),
+        ("score", "mean"),
+        ("num_comments", "sum"),
+        ("sentiment_compound", "mean"),
+    ])
+    result = result.rename_columns(["crypto", "period", "mentions", "score_sum", "score_mean",
+                                    "comments_sum", "sentiment_mean"])
+    return result.sort_by([("crypto", "ascending"), ("period", "ascending")])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export trend_data.db to partitioned Parquet and query it.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = sub.add_parser("export", help="Append everything new since the last export")
+    export_parser.add_argument("--db", default=DB_FILE)
+    export_parser.add_argument("--out", default=EXPORT_DIR)
+
+    compact_parser = sub.add_parser("compact", help="Merge small part files within each partition")
+    compact_parser.add_argument("out", nargs="?", default=EXPORT_DIR)
+    compact_parser.add_argument("--min-files", type=int, default=4)
+
+    summary_parser = sub.add_parser("summary", help="Print mentions and sentiment per crypto and period")
+    summary_parser.add_argument("out", nargs="?", default=EXPORT_DIR)
+    summary_parser.add_argument("--by", choices=["hour", "day", "week"], default="day")
+    summary_parser.add_argument("--crypto")
+    summary_parser.add_argument("--start", help="YYYY-MM-DD")
+    summary_parser.add_argument("--end", help="YYYY-MM-DD")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        start = time.perf_counter()
+        counts = export(args.db, args.out)
+        print(f"Exported {counts['trend_data']} trend_data rows, {counts['engagement']} engagement snapshots "
+              f"and {counts['rollups']} rollup rows to {args.out} in {time.perf_counter() - start:.2f}s")
+    elif args.command == "compact":
+        print(f"Compacted {compact(args.out, args.min_files)} partitions")
+    else:
+        summary = summarize(args.out, args.by, args.crypto, args.start, args.end)
+        for row in summary.to_pylist():
+            print(f"{row['crypto']:<10} {row['period']:<20} {row['mentions']:>7} "
+                  f"{row['score_mean']:>8.2f} {row['sentiment_mean']:>8.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+pipeline.py
+
+A small staged pipeline for the aggregation jobs. Work flows from a source iterator through a chain of
+stages connected by bounded queues; each stage runs its own pool of worker threads, so network waits
+(fetching posts, comment round-trips), CPU work (matching, sentiment scoring) and disk writes overlap
+instead of running one after another. With enough workers on the slow stages, a run's wall time
+approaches that of its slowest stage rather than the sum of all of them.
+
+Bounded queues give back-pressure: a fast stage blocks once the next queue is full instead of buffering
+an unbounded backlog in memory.
+
+Example:
+  pipeline = Pipeline(
+      source=iter(posts),
+      stages=[
+          Stage("match", identify, workers=4),
+          Stage("score", score),
+          BatchStage("write", insert_batch, batch_size=200),
+      ],
+  )
+  stats = pipeline.run()
+  print(format_stats(stats))
+"""
+
+import queue
+import threading
+import time
+
+# Marks the end of the stream on a queue; each worker that sees it passes it on exactly once
+_DONE = object()
+
+
+class StageStats:
+    """Per-stage counters collected while the pipeline runs."""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items_in = 0
+        self.items_out = 0
+        self.busy = 0.0  # Seconds spent inside the stage function, summed over workers
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def record(self, items_in, items_out, busy):
+        now = time.perf_counter()
+        with self._lock:
+            if self.started is None:
+                self.started = now - busy
+            self.finished = now
+            self.items_in += items_in
+            self.items_out += items_out
+            self.busy += busy
+
+    @property
+    def wall(self):
+        if self.started is None:
+            return 0.0
+        return self.finished - self.started
+
+    @property
+    def throughput(self):
+        """Items per second this stage could sustain on its own: input items over busy time per worker."""
+        if not self.busy:
+            return 0.0
+        return self.items_in / (self.busy / self.workers)
+
+
+class Stage:
+    """
+    A pipeline stage that applies `func` to each item.
+
+    Parameters:
+      name (str): Stage name used in the stats report.
+      func (callable): Called with one item; its return value is passed downstream.
+                       Returning None drops the item.
+      workers (int): Number of threads running this stage.
+      queue_size (int): Capacity of the queue feeding this stage.
+    """
+
+    def __init__(self, name, func, workers=1, queue_size=100):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue_size = queue_size
+
+    def process(self, item):
+        result = self.func(item)
+        return [] if result is None else [result]
+
+
+class BatchStage(Stage):
+    """
+    A stage whose function receives lists of up to `batch_size` items, e.g. to write many records in a
+    single transaction. Partial batches are flushed when the stream ends. Its return value, if a list,
+    is passed downstream item by item.
+    """
+
+    def __init__(self, name, func, batch_size=100, workers=1, queue_size=None):
+        super().__init__(name, func, workers, queue_size or batch_size * 2)
+        self.batch_size = batch_size
+
+    def process(self, batch):
+        result = self.func(batch)
+        return list(result) if result else []
+
+
+class Pipeline:
+    """
+    Runs a source iterator through a sequence of stages.
+
+    Parameters:
+      source (iterable): Produces the items fed to the first stage. It is consumed on its own thread
+                         and reported as the "fetch" stage.
+      stages (list): Stage / BatchStage instances, in order.
+      sink (callable): Optional; called with every item that leaves the last stage.
+    """
+
+    def __init__(self, source, stages, sink=None, source_name="fetch"):
+        self.source = source
+        self.stages = stages
+        self.sink = sink
+        self.source_stats = StageStats(source_name, 1)
+        self.stats = [StageStats(stage.name, stage.workers) for stage in stages]
+        self._errors = []
+        self._stop = threading.Event()
+
+    def _fail(self, exc):
+        self._errors.append(exc)
+        self._stop.set()
+
+    def _put(self, q, item):
+        # Retry with a timeout so a failed run can stop producers blocked on a full queue
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _run_source(self, out_q):
+        iterator = iter(self.source)
+        try:
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                self.source_stats.record(1, 1, time.perf_counter() - start)
+                self._put(out_q, item)
+        except Exception as exc:
+            self._fail(exc)
+        finally:
+            out_q.put(_DONE)
+
+    def _emit(self, out_q, items):
+        for item in items:
+            if out_q is None:
+                if self.sink:
+                    self.sink(item)
+            else:
+                self._put(out_q, item)
+
+    def _run_worker(self, stage, stats, in_q, out_q, done_counter):
+        batch = []
+        while True:
+            item = in_q.get()
+            if item is _DONE:
+                # Let sibling workers see the sentinel too
+                in_q.put(_DONE)
+                break
+            if self._stop.is_set():
+                continue
+            if isinstance(stage, BatchStage):
+                batch.append(item)
+                if len(batch) < stage.batch_size:
+                    continue
+                work, batch = batch, []
+            else:
+                work = item
+            self._process(stage, stats, work, out_q)
+
+        if batch and not self._stop.is_set():
+            self._process(stage, stats, batch, out_q)
+
+        with done_counter["lock"]:
+            done_counter["count"] += 1
+            last = done_counter["count"] == stage.workers
+        if last and out_q is not None:
+            out_q.put(_DONE)
+
+    def _process(self, stage, stats, work, out_q):
+        start = time.perf_counter()
+        try:
+            results = stage.process(work)
+            items_in = len(work) if isinstance(stage, BatchStage) else 1
+            stats.record(items_in, len(results), time.perf_counter() - start)
+            # The last stage hands its results to the sink on this thread; a failing sink fails the run
+            self._emit(out_q, results)
+        except Exception as exc:
+            self._fail(exc)
+
+    def run(self):
+        """
+        Run the pipeline to completion and return the list of StageStats (source first).
+        If any stage or the sink raised, the pipeline stops early and the first exception is re-raised.
+        """
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        threads = [threading.Thread(target=self._run_source, args=(queues[0],), daemon=True)]
+
+        for index, stage in enumerate(self.stages):
+            out_q = queues[index + 1] if index + 1 < len(queues) else None
+            done_counter = {"count": 0, "lock": threading.Lock()}
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._run_worker,
+                    args=(stage, self.stats[index], queues[index], out_q, done_counter),
+                    daemon=True,
+                ))
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+        return [self.source_stats] + self.stats
+
+
+def format_stats(stats, wall_time=None):
+    """Format a list of StageStats as a small table, optionally followed by the run's wall time."""
+    lines = [f"{'stage':<10} {'workers':>7} {'in':>8} {'out':>8} {'busy s':>9} {'items/s':>10}"]
+    for s in stats:
+        lines.append(f"{s.name:<10} {s.workers:>7} {s.items_in:>8} {s.items_out:>8} {s.busy:>9.3f} {s.throughput:>10.1f}")
+    if wall_time is not None:
+        lines.append(f"wall time: {wall_time:.3f}s")
+    return "\n".join(lines)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+"""
+prices.py
+
+Imports OHLCV price history from local CSV files into trend_data.db, so sentiment can be compared
+against price (see lead_lag.py).
+
+Exchange and data-vendor exports disagree on column names and time formats, so the importer looks for
+a time column (timestamp, time, date, datetime, open time, unix) holding epoch seconds, epoch
+milliseconds or ISO dates, and for open/high/low/close/volume columns by name, case-insensitively.
+Times are stored as integer epoch seconds (UTC).
+
+Candles live in a WITHOUT ROWID table clustered on (crypto, ts), so one coin's history over a time
+range is a single contiguous range scan and re-importing an overlapping file simply replaces the
+candles it repeats.
+
+Usage:
+  python prices.py import bitcoin data/BTC-USD.csv
+  python prices.py import ethereum data/ETH-USD-1h.csv --db trend_data.db
+  python prices.py list
+"""
+
+import argparse
+import csv
+import datetime
+import sqlite3
+
+DB_FILE = "trend_data.db"
+
+PRICE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS prices (
+        crypto TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL NOT NULL,
+        volume REAL,
+        PRIMARY KEY (crypto, ts)
+    ) WITHOUT ROWID
+'''
+
+TIME_COLUMNS = ("timestamp", "time", "date", "datetime", "open time", "open_time", "unix")
+
+
+def create_price_table(conn):
+    """Create the prices table if it does not already exist."""
+    conn.execute(PRICE_SCHEMA)
+
+
+def parse_time(value):
+    """Convert epoch seconds, epoch milliseconds or an ISO date/time (naive means UTC) to epoch seconds."""
+    value = value.strip()
+    try:
+        number = float(value)
+    except ValueError:
+        parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return int(parsed.timestamp())
+    # Anything past the year 5000 in seconds is really milliseconds
+    return int(number / 1000) if number > 1e11 else int(number)
+
+
+def _find_columns(header):
+    """Map time/open/high/low/close/volume to their positions in a CSV header."""
+    names = [name.strip().lower() for name in header]
+    columns = {}
+    for i, name in enumerate(names):
+        if "time" not in columns and name in TIME_COLUMNS:
+            columns["time"] = i
+        for field in ("open", "high", "low", "close"):
+            if field not in columns and name == field:
+                columns[field] = i
+        if "volume" not in columns and name.startswith("volume"):
+            columns["volume"] = i
+    missing = [field for field in ("time", "close") if field not in columns]
+    if missing:
+        raise ValueError(f"CSV header has no {' or '.join(missing)} column: {header}")
+    return columns
+
+
+def read_ohlcv(path):
+    """
+    Yield (ts, open, high, low, close, volume) tuples from an OHLCV CSV file. Missing optional
+    columns and empty cells come back as None; rows without a close price are skipped.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        columns = _find_columns(next(reader))
+
+        def number(row, field):
+            i = columns.get(field)
+            if i is None or i >= len(row) or not row[i].strip():
+                return None
+            return float(row[i])
+
+        for row in reader:
+            if not row:
+                continue
+            close = number(row, "close")
+            if close is None:
+                continue
+            yield (parse_time(row[columns["time"]]), number(row, "open"), number(row, "high"),
+                   number(row, "low"), close, number(row, "volume"))
+
+
+def import_csv(conn, crypto, path, batch_size=10000):
+    """
+    Import an OHLCV CSV file as the price history of `crypto` (a name from CRYPTO_KEYWORDS, e.g.
+    "bitcoin"). Candles already stored for the same times are replaced. Commits.
+
+    Returns:
+      The number of candles imported.
+    """
+    create_price_table(conn)
+    imported = 0
+    batch = []
+    with conn:
+        for candle in read_ohlcv(path):
+            batch.append((crypto,) + candle)
+            if len(batch) >= batch_size:
+                conn.executemany("INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+                imported += len(batch)
+                batch = []
+        if batch:
+            conn.executemany("INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+            imported += len(batch)
+    return imported
+
+
+def price_coverage(conn):
+    """Return [{"crypto", "candles", "start", "end"}, ...] for every crypto with price data."""
+    create_price_table(conn)
+    rows = conn.execute(
+        "SELECT crypto, COUNT(*), MIN(ts), MAX(ts) FROM prices GROUP BY crypto ORDER BY crypto"
+    ).fetchall()
+    return [{"crypto": crypto, "candles": count, "start": start, "end": end} for crypto, count, start, end in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import OHLCV price history from CSV files.")
+    parser.add_argument("--db", default=DB_FILE)
+    sub = parser.add_subparsers(dest="command", required=True)
+    import_parser = sub.add_parser("import", help="Import a CSV file for one crypto")
+    import_parser.add_argument("crypto", help="Crypto name as used in trend_data, e.g. bitcoin")
+    import_parser.add_argument("path")
+    sub.add_parser("list", help="Show the price history stored per crypto")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        if args.command == "import":
+            count = import_csv(conn, args.crypto, args.path)
+            print(f"Imported {count} {args.crypto} candles from {args.path}")
+        else:
+            for row in price_coverage(conn):
+                start = datetime.datetime.fromtimestamp(row["start"], datetime.timezone.utc)
+                end = datetime.datetime.fromtimestamp(row["end"], datetime.timezone.utc)
+                print(f"{row['crypto']:<10} {row['candles']:>8} candles  {start:%Y-%m-%d %H:%M} .. {end:%Y-%m-%d %H:%M}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
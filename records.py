@@ -0,0 +1,78 @@
+"""
+records.py
+
+The record type passed between connectors, pipeline stages and the database writers.
+
+TrendRecord uses __slots__ instead of a per-instance __dict__, and keeps the four VADER scores as flat
+attributes rather than a nested dictionary, so a record costs one small object instead of two dicts.
+That keeps long ingestion runs and backfills cheap when many records are in flight between stages.
+"""
+
+import datetime
+
+# Column order of the trend_data INSERT statements; as_row() follows it
+TREND_COLUMNS = (
+    "title", "crypto", "score", "num_comments", "created",
+    "sentiment_neg", "sentiment_neu", "sentiment_pos", "sentiment_compound", "source", "post_id",
+)
+
+
+class TrendRecord:
+    """A single post or tweet, normalized across sources, plus the fields the pipeline fills in."""
+
+    __slots__ = (
+        "source", "post_id", "title", "selftext", "score", "num_comments", "created", "crypto",
+        "sentiment_neg", "sentiment_neu", "sentiment_pos", "sentiment_compound", "comments",
+    )
+
+    def __init__(self, source, post_id, title, score, num_comments, created, selftext="", crypto=None,
+                 sentiment_neg=0.0, sentiment_neu=1.0, sentiment_pos=0.0, sentiment_compound=0.0, comments=()):
+        self.source = source
+        self.post_id = post_id
+        self.title = title
+        self.selftext = selftext
+        self.score = score
+        self.num_comments = num_comments
+        self.created = created
+        self.crypto = crypto
+        self.sentiment_neg = sentiment_neg
+        self.sentiment_neu = sentiment_neu
+        self.sentiment_pos = sentiment_pos
+        self.sentiment_compound = sentiment_compound
+        # Comment bodies fetched while matching; cleared once keyword discovery has read them
+        self.comments = comments
+
+    def set_sentiment(self, scores):
+        """Copy a VADER polarity_scores() result onto the record."""
+        self.sentiment_neg = scores["neg"]
+        self.sentiment_neu = scores["neu"]
+        self.sentiment_pos = scores["pos"]
+        self.sentiment_compound = scores["compound"]
+
+    @property
+    def sentiment(self):
+        """The sentiment scores as a VADER-style dictionary (built on demand, e.g. for printing)."""
+        return {
+            "neg": self.sentiment_neg,
+            "neu": self.sentiment_neu,
+            "pos": self.sentiment_pos,
+            "compound": self.sentiment_compound,
+        }
+
+    @property
+    def created_text(self):
+        """`created` in the text format stored in trend_data."""
+        if isinstance(self.created, datetime.datetime):
+            return self.created.strftime("%Y-%m-%d %H:%M:%S")
+        return self.created
+
+    def as_row(self):
+        """Return the parameter tuple for a trend_data INSERT in TREND_COLUMNS order."""
+        return (
+            self.title, self.crypto, self.score, self.num_comments, self.created_text,
+            self.sentiment_neg, self.sentiment_neu, self.sentiment_pos, self.sentiment_compound, self.source,
+            None if self.post_id is None else str(self.post_id),
+        )
+
+    def __repr__(self):
+        return f"TrendRecord({self.source!r}, {self.post_id!r}, {self.title!r}, crypto={self.crypto!r})"
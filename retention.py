@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+"""
+retention.py
+
+Retention, downsampling and compaction for trend_data.db, so its size and the cost of long-range
+queries stay bounded however long the aggregators run.
+
+Each run applies these policies, oldest data first:
+
+  1. Duplicates: every scheduled run re-reads the newest posts. write_records() keeps one row per
+     (source, post_id), but rows stored without a post id (older databases and scripts) can repeat.
+     Rows with the same title, created time and crypto are collapsed into the newest one (the one with
+     the most recent score and comment count). Only rows added since the previous run are checked.
+  2. Raw rows older than --raw-days are rolled up into trend_hourly (one row per crypto and hour) and
+     deleted.
+  3. Hourly rows older than --hourly-days are rolled up into trend_daily and deleted, so beyond that
+     horizon only daily summary statistics remain. Engagement snapshots and per-source hourly totals
+     (source_comparison.py) older than the same horizon are dropped.
+  4. Freed pages are returned to the file system with incremental VACUUM, and ANALYZE refreshes the
+     planner statistics.
+
+Rollup rows keep sums rather than means (mentions, score, comments and the four sentiment scores, plus
+the min/max compound score), so rolling the same bucket up over several runs just adds to it and means
+are exact at read time. fetch_history() reads raw rows, hourly and daily rollups as one series;
+api_endpoint.py serves it at /trends/history.
+
+The first run switches the database to auto_vacuum=INCREMENTAL, which takes one full VACUUM; every run
+after that only frees what it deleted. Run it daily from cron or a scheduler while the aggregators
+keep writing: deletes go through the search index in bulk (search.delete_indexed_rows) and each step
+is its own short transaction.
+
+Usage:
+  python retention.py
+  python retention.py --db trend_data.db --raw-days 30 --hourly-days 365 --vacuum-pages 10000
+"""
+
+import argparse
+import datetime
+import os
+import sqlite3
+
+from search import delete_indexed_rows
+from source_comparison import create_source_hourly_table
+
+DB_FILE = "trend_data.db"
+RAW_DAYS = 30
+HOURLY_DAYS = 365
+ANALYSIS_LIMIT = 1000  # Rows ANALYZE samples per index, so it stays fast on large tables
+
+ROLLUP_COLUMNS = (
+    "mentions", "score_sum", "comments_sum", "sentiment_neg_sum", "sentiment_neu_sum",
+    "sentiment_pos_sum", "sentiment_compound_sum", "compound_min", "compound_max",
+)
+
+ROLLUP_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        crypto TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        mentions INTEGER NOT NULL,
+        score_sum INTEGER NOT NULL,
+        comments_sum INTEGER NOT NULL,
+        sentiment_neg_sum REAL NOT NULL,
+        sentiment_neu_sum REAL NOT NULL,
+        sentiment_pos_sum REAL NOT NULL,
+        sentiment_compound_sum REAL NOT NULL,
+        compound_min REAL,
+        compound_max REAL,
+        PRIMARY KEY (crypto, bucket)
+    ) WITHOUT ROWID
+'''
+
+# Merges a rolled-up bucket into one that earlier runs already wrote
+ROLLUP_UPSERT = '''
+    ON CONFLICT (crypto, bucket) DO UPDATE SET
+        mentions = mentions + excluded.mentions,
+        score_sum = score_sum + excluded.score_sum,
+        comments_sum = comments_sum + excluded.comments_sum,
+        sentiment_neg_sum = sentiment_neg_sum + excluded.sentiment_neg_sum,
+        sentiment_neu_sum = sentiment_neu_sum + excluded.sentiment_neu_sum,
+        sentiment_pos_sum = sentiment_pos_sum + excluded.sentiment_pos_sum,
+        sentiment_compound_sum = sentiment_compound_sum + excluded.sentiment_compound_sum,
+        compound_min = MIN(compound_min, excluded.compound_min),
+        compound_max = MAX(compound_max, excluded.compound_max)
+'''
+
+
+def create_rollup_tables(conn):
+    """Create trend_hourly and trend_daily if they do not already exist."""
+    for table in ("trend_hourly", "trend_daily"):
+        conn.execute(ROLLUP_SCHEMA.format(table=table))
+
+
+def _cutoff(days, now=None):
+    """The `created` text before which rows are older than `days` days."""
+    now = now or datetime.datetime.utcnow()
+    return (now - datetime.timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _delete_ids(conn, select_sql, params=()):
+    """Delete the trend_data rows whose ids `select_sql` returns, keeping the search index in step."""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS compact_ids (id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM compact_ids")
+    conn.execute(f"INSERT INTO compact_ids (id) {select_sql}", params)
+    deleted = delete_indexed_rows(conn, "compact_ids")
+    conn.execute("DELETE FROM compact_ids")
+    return deleted
+
+
+def remove_duplicates(conn):
+    """
+    Keep only the newest row of each (title, created, crypto) among rows without a post id. Only the
+    groups of rows added since the previous run are looked for. Returns the number of rows removed.
+    """
+    with conn:
+        # Highest trend_data id already checked for duplicates
+        conn.execute("CREATE TABLE IF NOT EXISTS retention_state (dedupe_last_id INTEGER NOT NULL)")
+        row = conn.execute("SELECT dedupe_last_id FROM retention_state").fetchone()
+        last_id = row[0] if row else 0
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS dedupe_groups (title TEXT, created TEXT, crypto TEXT, keep INTEGER)")
+        conn.execute("CREATE INDEX IF NOT EXISTS temp.dedupe_groups_key ON dedupe_groups (title, created, crypto)")
+        conn.execute("DELETE FROM dedupe_groups")
+        groups = conn.execute('''
+            INSERT INTO dedupe_groups
+            SELECT title, created, crypto, MAX(id) FROM trend_data
+            WHERE id > ? AND post_id IS NULL
+            GROUP BY title, created, crypto
+        ''', (last_id,)).rowcount
+        removed = 0
+        if groups:
+            # One pass over trend_data, looking each row's group up in the index
+            removed = _delete_ids(conn, '''
+                SELECT t.id FROM trend_data t CROSS JOIN dedupe_groups g
+                    ON t.title IS g.title AND t.created IS g.created AND t.crypto IS g.crypto
+                WHERE t.post_id IS NULL AND t.id < g.keep
+            ''')
+        conn.execute("DELETE FROM retention_state")
+        conn.execute("INSERT INTO retention_state (dedupe_last_id) SELECT COALESCE(MAX(id), ?) FROM trend_data",
+                     (last_id,))
+    return removed
+
+
+def roll_up_raw(conn, raw_days=RAW_DAYS, now=None):
+    """Roll trend_data rows older than `raw_days` into trend_hourly and delete them. Returns rows removed."""
+    cutoff = _cutoff(raw_days, now)
+    with conn:
+        conn.execute(f'''
+            INSERT INTO trend_hourly (crypto, bucket, {", ".join(ROLLUP_COLUMNS)})
+            SELECT COALESCE(crypto, 'Unknown'), substr(created, 1, 13) || ':00:00', COUNT(*),
+                   COALESCE(SUM(score), 0), COALESCE(SUM(num_comments), 0),
+                   TOTAL(sentiment_neg), TOTAL(sentiment_neu), TOTAL(sentiment_pos), TOTAL(sentiment_compound),
+                   MIN(sentiment_compound), MAX(sentiment_compound)
+            FROM trend_data
+            WHERE created < ?
+            GROUP BY 1, 2
+            {ROLLUP_UPSERT}
+        ''', (cutoff,))
+        return _delete_ids(conn, "SELECT id FROM trend_data WHERE created < ?", (cutoff,))
+
+
+def roll_up_hourly(conn, hourly_days=HOURLY_DAYS, now=None):
+    """
+    Roll trend_hourly rows older than `hourly_days` into trend_daily and delete them, along with
+    engagement snapshots and per-source hourly totals older than the same horizon.
+
+    Returns:
+      (hourly rows removed, snapshots removed)
+    """
+    cutoff = _cutoff(hourly_days, now)
+    sums = ", ".join(f"SUM({column})" for column in ROLLUP_COLUMNS[:-2])
+    with conn:
+        conn.execute(f'''
+            INSERT INTO trend_daily (crypto, bucket, {", ".join(ROLLUP_COLUMNS)})
+            SELECT crypto, substr(bucket, 1, 10), {sums}, MIN(compound_min), MAX(compound_max)
+            FROM trend_hourly
+            WHERE bucket < ?
+            GROUP BY 1, 2
+            {ROLLUP_UPSERT}
+        ''', (cutoff,))
+        hourly = conn.execute("DELETE FROM trend_hourly WHERE bucket < ?", (cutoff,)).rowcount
+        epoch = int(datetime.datetime.strptime(cutoff, "%Y-%m-%d %H:%M:%S")
+                    .replace(tzinfo=datetime.timezone.utc).timestamp())
+        try:
+            snapshots = conn.execute("DELETE FROM engagement_snapshots WHERE ts < ?", (epoch,)).rowcount
+        except sqlite3.OperationalError:
+            snapshots = 0  # No engagement tables in this database
+        create_source_hourly_table(conn)
+        conn.execute("DELETE FROM source_hourly WHERE hour < ?", (epoch,))
+    return hourly, snapshots
+
+
+def vacuum_and_analyze(conn, vacuum_pages=None):
+    """
+    Return free pages to the file system and refresh planner statistics. The first call on a database
+    switches it to incremental auto-vacuum, which needs one full VACUUM.
+
+    Parameters:
+      conn (sqlite3.Connection): Connection with no transaction open.
+      vacuum_pages (int): Most free pages to release this run (None for all).
+
+    Returns:
+      The number of pages released.
+    """
+    free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    else:
+        # execute() steps the pragma once, which frees a single page; executescript() runs it to completion
+        conn.executescript(f"PRAGMA incremental_vacuum({int(vacuum_pages or 0)})")
+    released = free_before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("ANALYZE")
+    if conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+        # The file only shrinks once the WAL is checkpointed back into it
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return released
+
+
+def compact(db_file=DB_FILE, raw_days=RAW_DAYS, hourly_days=HOURLY_DAYS, dedupe=True, vacuum_pages=None,
+            now=None):
+    """
+    Apply every retention policy to `db_file`.
+
+    Parameters:
+      db_file (str): SQLite database path.
+      raw_days (int): Age in days after which raw rows are rolled into hourly buckets.
+      hourly_days (int): Age in days after which hourly buckets are rolled into daily ones.
+      dedupe (bool): Remove duplicate rows first.
+      vacuum_pages (int): Most free pages to release (None for all).
+      now (datetime): Reference time in UTC (defaults to now), e.g. for backfilled databases.
+
+    Returns:
+      A dictionary of what was done, including the file size before and after.
+    """
+    if hourly_days < raw_days:
+        raise ValueError("hourly_days must be at least raw_days")
+    size_before = os.path.getsize(db_file)
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        with conn:
+            create_rollup_tables(conn)
+        summary = {"duplicates_removed": remove_duplicates(conn) if dedupe else 0}
+        summary["raw_rows_rolled_up"] = roll_up_raw(conn, raw_days, now)
+        summary["hourly_rows_rolled_up"], summary["snapshots_removed"] = roll_up_hourly(conn, hourly_days, now)
+        summary["pages_released"] = vacuum_and_analyze(conn, vacuum_pages)
+    finally:
+        conn.close()
+    summary["size_before"] = size_before
+    summary["size_after"] = os.path.getsize(db_file)
+    return summary
+
+
+def fetch_history(conn, crypto=None, start=None, end=None, interval="day"):
+    """
+    Mentions and mean sentiment per crypto and bucket over the whole retained history, reading raw
+    rows, hourly rollups and (for daily buckets) daily rollups as one series.
+
+    Parameters:
+      conn (sqlite3.Connection): Open connection.
+      crypto (str): Optional crypto filter.
+      start, end (str): Optional 'YYYY-MM-DD[ HH:MM:SS]' bounds on the bucket (inclusive).
+      interval (str): "hour" or "day". Past the hourly horizon only daily buckets exist.
+
+    Returns:
+      [{"crypto", "bucket", "mentions", "avg_score", "avg_comments", "avg_compound",
+        "compound_min", "compound_max"}, ...] ordered by crypto and bucket.
+    """
+    if interval not in ("hour", "day"):
+        raise ValueError("interval must be 'hour' or 'day'")
+    width = 13 if interval == "hour" else 10
+    suffix = " || ':00:00'" if interval == "hour" else ""
+    start = start or "0000-01-01"
+    end = end or "9999-12-31"
+    if len(end) == 10:
+        end += " 23:59:59"
+    create_rollup_tables(conn)
+
+    raw_filter = "WHERE created BETWEEN ? AND ?"
+    rollup_filter = "WHERE bucket BETWEEN ? AND ?"
+    params = [start, end, start, end]
+    if crypto:
+        raw_filter += " AND crypto = ?"
+        rollup_filter += " AND crypto = ?"
+        params = [start, end, crypto, start, end, crypto]
+    daily = ""
+    if interval == "day":
+        daily = f'''
+            UNION ALL
+            SELECT crypto, bucket, {", ".join(ROLLUP_COLUMNS)} FROM trend_daily {rollup_filter}
+        '''
+        # A day is one bucket, so it is included when any part of it is in range
+        params += [start[:10], end, crypto] if crypto else [start[:10], end]
+
+    rows = conn.execute(f'''
+        SELECT crypto, bucket, SUM(mentions), SUM(score_sum), SUM(comments_sum), SUM(sentiment_compound_sum),
+               MIN(compound_min), MAX(compound_max)
+        FROM (
+            SELECT COALESCE(crypto, 'Unknown') AS crypto, substr(created, 1, {width}){suffix} AS bucket,
+                   1 AS mentions, score AS score_sum, num_comments AS comments_sum,
+                   0 AS sentiment_neg_sum, 0 AS sentiment_neu_sum, 0 AS sentiment_pos_sum,
+                   sentiment_compound AS sentiment_compound_sum,
+                   sentiment_compound AS compound_min, sentiment_compound AS compound_max
+            FROM trend_data {raw_filter}
+            UNION ALL
+            SELECT crypto, substr(bucket, 1, {width}){suffix}, {", ".join(ROLLUP_COLUMNS)}
+            FROM trend_hourly {rollup_filter}
+            {daily}
+        )
+        GROUP BY crypto, bucket
+        ORDER BY crypto, bucket
+    ''', params).fetchall()
+    return [
+        {
+            "crypto": crypto_name,
+            "bucket": bucket,
+            "mentions": mentions,
+            "avg_score": round(score_sum / mentions, 2),
+            "avg_comments": round(comments_sum / mentions, 2),
+            "avg_compound": round(compound_sum / mentions, 4),
+            "compound_min": compound_min,
+            "compound_max": compound_max,
+        }
+        for crypto_name, bucket, mentions, score_sum, comments_sum, compound_sum, compound_min, compound_max
+        in rows
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deduplicate, downsample and compact trend_data.db.")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--raw-days", type=int, default=RAW_DAYS,
+                        help="Roll raw rows older than this into hourly buckets")
+    parser.add_argument("--hourly-days", type=int, default=HOURLY_DAYS,
+                        help="Roll hourly buckets older than this into daily ones")
+    parser.add_argument("--no-dedupe", action="store_true", help="Keep duplicate rows")
+    parser.add_argument("--vacuum-pages", type=int, help="Most free pages to release this run (default all)")
+    args = parser.parse_args()
+
+    summary = compact(args.db, args.raw_days, args.hourly_days, not args.no_dedupe, args.vacuum_pages)
+    print(f"Removed {summary['duplicates_removed']} duplicates, rolled up {summary['raw_rows_rolled_up']} raw "
+          f"rows and {summary['hourly_rows_rolled_up']} hourly rows, dropped {summary['snapshots_removed']} "
+          f"engagement snapshots.")
+    print(f"Released {summary['pages_released']} pages: {summary['size_before'] / 1e6:.1f} MB -> "
+          f"{summary['size_after'] / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
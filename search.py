@@ -0,0 +1,203 @@
+"""
+search.py
+
+Full-text search over ingested post titles with SQLite FTS5.
+
+trend_fts is an external-content FTS5 index over trend_data.title: it stores only the inverted index
+and reads titles back from trend_data, so it adds little to the database size.
+
+New rows are indexed in bulk by sync_search_index(), which the shared write path (write_records) calls
+once per batch. It indexes everything past the last indexed id, so rows from writers that bypass
+write_records are picked up by the next batch; /search itself only reads. A per-row
+AFTER INSERT trigger would be simpler, but FTS5 flushes its pending terms at the end of every trigger
+statement, which made inserts about ten times slower. Updates and deletes are rare, so triggers handle
+those, except bulk deletes (retention.py's compaction), which go through delete_indexed_rows().
+
+search_posts() returns the best-ranked (BM25) matches with highlighted titles plus the number of hits
+per day, so any phrase ("ETF approval", "rug pull") can be charted over time without scanning the table.
+api_endpoint.py serves it at /search.
+"""
+
+import sqlite3
+
+# OperationalError messages SQLite gives for a MATCH expression that is not valid FTS5 syntax
+FTS_SYNTAX_ERRORS = ("fts5: syntax error", "unterminated string", "no such column")
+
+FTS_SCHEMA = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS trend_fts USING fts5(
+        title,
+        content='trend_data',
+        content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    ''',
+    # Highest trend_data id already in the index
+    "CREATE TABLE IF NOT EXISTS trend_fts_state (last_id INTEGER NOT NULL)",
+    # Only rows that are already indexed need removing; newer ones are picked up by the next sync
+    '''
+    CREATE TRIGGER IF NOT EXISTS trend_fts_delete AFTER DELETE ON trend_data
+    WHEN old.id <= (SELECT last_id FROM trend_fts_state) BEGIN
+        INSERT INTO trend_fts (trend_fts, rowid, title) VALUES ('delete', old.id, old.title);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trend_fts_update AFTER UPDATE OF title ON trend_data
+    WHEN old.id <= (SELECT last_id FROM trend_fts_state) BEGIN
+        INSERT INTO trend_fts (trend_fts, rowid, title) VALUES ('delete', old.id, old.title);
+        INSERT INTO trend_fts (rowid, title) VALUES (new.id, new.title);
+    END
+    ''',
+]
+
+
+def search_index_exists(conn):
+    """Whether the database has the full-text index (created by writer_daemon.create_tables)."""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'trend_fts'"
+    ).fetchone() is not None
+
+
+def create_search_index(conn):
+    """
+    Create the FTS5 index and its triggers if they do not exist yet. The first time, rows already
+    in trend_data are indexed too. Commits.
+    """
+    exists = search_index_exists(conn)
+    with conn:
+        for statement in FTS_SCHEMA:
+            conn.execute(statement)
+        if not exists:
+            conn.execute("DELETE FROM trend_fts_state")
+            conn.execute("INSERT INTO trend_fts_state (last_id) SELECT COALESCE(MAX(id), 0) FROM trend_data")
+            conn.execute("INSERT INTO trend_fts (trend_fts) VALUES ('rebuild')")
+
+
+def sync_search_index(conn):
+    """
+    Index every trend_data row added since the last sync, in one statement. Runs inside the caller's
+    transaction; does nothing if the database has no search index.
+
+    Returns:
+      The number of rows indexed.
+    """
+    try:
+        last_id = conn.execute("SELECT last_id FROM trend_fts_state").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+    cur = conn.execute(
+        "INSERT INTO trend_fts (rowid, title) SELECT id, title FROM trend_data WHERE id > ?", (last_id,)
+    )
+    if cur.rowcount:
+        conn.execute("UPDATE trend_fts_state SET last_id = (SELECT MAX(id) FROM trend_data)")
+    return cur.rowcount
+
+
+def delete_indexed_rows(conn, id_table):
+    """
+    Delete the trend_data rows whose ids are listed in `id_table` (a table with an `id` column), for
+    bulk deletes such as retention.py's compaction. The row-level delete trigger would issue one FTS5
+    'delete' per row; instead the indexed rows are removed from trend_fts in a single statement and the
+    trigger is suspended for the DELETE. Runs inside the caller's transaction.
+
+    Returns:
+      The number of trend_data rows deleted.
+    """
+    try:
+        last_id = conn.execute("SELECT last_id FROM trend_fts_state").fetchone()[0]
+    except sqlite3.OperationalError:
+        last_id = None
+    if last_id is not None:
+        conn.execute(f'''
+            INSERT INTO trend_fts (trend_fts, rowid, title)
+            SELECT 'delete', t.id, t.title FROM trend_data t
+            WHERE t.id IN (SELECT id FROM {id_table}) AND t.id <= ?
+        ''', (last_id,))
+        conn.execute("DROP TRIGGER IF EXISTS trend_fts_delete")
+    cur = conn.execute(f"DELETE FROM trend_data WHERE id IN (SELECT id FROM {id_table})")
+    if last_id is not None:
+        conn.execute(FTS_SCHEMA[2])
+    return cur.rowcount
+
+
+def _date_bounds(start, end):
+    """Turn optional YYYY-MM-DD[ HH:MM:SS] bounds into inclusive `created` text bounds."""
+    start = start or "0000-01-01"
+    end = end or "9999-12-31"
+    if len(end) == 10:
+        end += " 23:59:59"
+    return start, end
+
+
+def _match(conn, sql, query, params):
+    """
+    Run `sql` with `query` as the MATCH expression. Queries that are not valid FTS5 syntax
+    (stray quotes, hyphens, ...) are retried as a single quoted phrase.
+    """
+    try:
+        return conn.execute(sql, (query,) + params).fetchall()
+    except sqlite3.OperationalError as exc:
+        # Anything else (a locked database, a missing index) is a real error
+        if not str(exc).startswith(FTS_SYNTAX_ERRORS):
+            raise
+        phrase = '"' + query.replace('"', '""') + '"'
+        return conn.execute(sql, (phrase,) + params).fetchall()
+
+
+def search_posts(conn, query, crypto=None, start=None, end=None, limit=50):
+    """
+    Search post titles.
+
+    Parameters:
+      conn (sqlite3.Connection): Open connection; the index must exist (see create_search_index).
+      query (str): FTS5 query, e.g. 'ETF approval', '"rug pull"', 'solana OR sol'.
+      crypto (str): Optional crypto filter.
+      start, end (str): Optional YYYY-MM-DD bounds on `created` (inclusive).
+      limit (int): Most results to return.
+
+    Returns:
+      {"total": hits, "results": [{"id", "title", "crypto", "created", "score", "sentiment_compound",
+       "rank"}, ...] best match first, "daily": [{"day", "hits"}, ...] in date order}
+    """
+    start, end = _date_bounds(start, end)
+    filters = "t.created BETWEEN ? AND ?"
+    params = (start, end)
+    if crypto:
+        filters += " AND t.crypto = ?"
+        params += (crypto,)
+
+    results = _match(conn, f'''
+        SELECT t.id, highlight(trend_fts, 0, '<b>', '</b>'), t.crypto, t.created, t.score,
+               t.sentiment_compound, bm25(trend_fts)
+        FROM trend_fts
+        JOIN trend_data t ON t.id = trend_fts.rowid
+        WHERE trend_fts MATCH ? AND {filters}
+        ORDER BY bm25(trend_fts)
+        LIMIT ?
+    ''', query, params + (limit,))
+
+    daily = _match(conn, f'''
+        SELECT substr(t.created, 1, 10) AS day, COUNT(*)
+        FROM trend_fts
+        JOIN trend_data t ON t.id = trend_fts.rowid
+        WHERE trend_fts MATCH ? AND {filters}
+        GROUP BY day
+        ORDER BY day
+    ''', query, params)
+
+    return {
+        "total": sum(hits for _, hits in daily),
+        "results": [
+            {
+                "id": row_id,
+                "title": title,
+                "crypto": crypto_name,
+                "created": created,
+                "score": score,
+                "sentiment_compound": compound,
+                "rank": round(rank, 4),
+            }
+            for row_id, title, crypto_name, created, score, compound, rank in results
+        ],
+        "daily": [{"day": day, "hits": hits} for day, hits in daily],
+    }
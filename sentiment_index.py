@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+"""
+sentiment_index.py
+
+An engagement-weighted, time-decayed sentiment index per crypto.
+
+Charting the compound score of one post per day lets a single low-karma post swing the line. The index
+instead averages every post's compound score, weighting each by its engagement
+
+    weight = 1 + ln(1 + score) + ln(1 + num_comments)
+
+(logarithmic, so one viral post cannot drown out everything else), and lets older posts fade with a
+half-life of HALF_LIFE seconds:
+
+    index = sum(weight * decay * compound) / sum(weight * decay),   decay = 0.5 ** (age / HALF_LIFE)
+
+Both sums decay by the same factor, so each crypto's state is just (last_ts, weighted_sum, weight_total):
+a new post decays the two sums up to its own time and adds itself, in O(1) whatever the history length.
+A post older than the state's last_ts is decayed to last_ts instead, which gives the same result as if it
+had arrived in order.
+
+write_records() updates the index inside each write transaction. Aggregators re-read their newest posts
+on every run, as their score and comments grow; a re-read post takes its earlier contribution back out
+and adds its new one, at its own time, so the index ends up as if every post had been folded in once
+with its latest numbers (which is what rebuild() does). After every batch, the index value at
+the end of each hour that received posts is stored in sentiment_index as a time series, so
+api_endpoint.py serves /trends/sentiment-index with a plain range scan and nothing is recomputed on read.
+`weight` in each point is the decayed total weight behind the value, i.e. how much recent engagement it
+rests on.
+
+`python sentiment_index.py rebuild` recomputes the index from the posts already in trend_data.
+
+Usage:
+  python sentiment_index.py rebuild --db trend_data.db
+  python sentiment_index.py show bitcoin
+"""
+
+import argparse
+import math
+import sqlite3
+
+from records import TrendRecord
+from spikes import parse_created
+
+DB_FILE = "trend_data.db"
+HALF_LIFE = 24 * 3600
+POINT_INTERVAL = 3600
+DECAY_RATE = math.log(2) / HALF_LIFE
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS sentiment_index_state (
+        crypto TEXT PRIMARY KEY,
+        last_ts INTEGER NOT NULL,
+        weighted_sum REAL NOT NULL,
+        weight_total REAL NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS sentiment_index (
+        crypto TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        value REAL NOT NULL,
+        weight REAL NOT NULL,
+        PRIMARY KEY (crypto, ts)
+    ) WITHOUT ROWID
+    ''',
+]
+
+
+def create_index_tables(conn):
+    """Create the sentiment index tables if they do not already exist."""
+    # Statement by statement: executescript() would commit the caller's open transaction
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+
+def engagement_weight(score, num_comments):
+    """How much one post counts towards the index."""
+    return 1.0 + math.log1p(max(score or 0, 0)) + math.log1p(max(num_comments or 0, 0))
+
+
+class IndexState:
+    """The O(1) running state of one crypto's index."""
+
+    __slots__ = ("last_ts", "weighted_sum", "weight_total")
+
+    def __init__(self, last_ts=None, weighted_sum=0.0, weight_total=0.0):
+        self.last_ts = last_ts
+        self.weighted_sum = weighted_sum
+        self.weight_total = weight_total
+
+    def add(self, ts, compound, weight):
+        """Fold in one post made at epoch `ts`."""
+        if self.last_ts is None:
+            self.last_ts = ts
+        elif ts > self.last_ts:
+            decay = math.exp(-DECAY_RATE * (ts - self.last_ts))
+            self.weighted_sum *= decay
+            self.weight_total *= decay
+            self.last_ts = ts
+        else:
+            weight *= math.exp(-DECAY_RATE * (self.last_ts - ts))
+        self.weighted_sum += weight * compound
+        self.weight_total += weight
+
+    @property
+    def value(self):
+        return self.weighted_sum / self.weight_total if self.weight_total else 0.0
+
+
+def update_sentiment_index(conn, records, previous=None):
+    """
+    Fold a batch of records into each crypto's index and store the resulting hourly points. Runs
+    inside the caller's transaction; records without a tracked crypto are ignored.
+
+    Parameters:
+      conn (sqlite3.Connection): Open connection; the tables are created if needed.
+      records (list): TrendRecord objects with crypto and sentiment filled in.
+      previous (dict): {(source, post_id): (score, num_comments, sentiment_compound)} of posts already
+                       folded in (writer_daemon.known_posts()); those replace their earlier contribution.
+
+    Returns:
+      The number of index points written.
+    """
+    records = [r for r in records if r.crypto and r.crypto != "Unknown"]
+    if not records:
+        return 0
+    create_index_tables(conn)
+    cryptos = sorted({r.crypto for r in records})
+    placeholders = ", ".join("?" for _ in cryptos)
+    states = {
+        crypto: IndexState(last_ts, weighted_sum, weight_total)
+        for crypto, last_ts, weighted_sum, weight_total in conn.execute(
+            f"SELECT crypto, last_ts, weighted_sum, weight_total FROM sentiment_index_state "
+            f"WHERE crypto IN ({placeholders})", cryptos)
+    }
+
+    points = {}
+    previous = dict(previous or {})
+    timed = sorted(((parse_created(r.created), r) for r in records), key=lambda item: item[0])
+    for ts, record in timed:
+        state = states.setdefault(record.crypto, IndexState())
+        current = (record.score, record.num_comments, record.sentiment_compound)
+        if record.post_id is not None:
+            post = (record.source, str(record.post_id))
+            before = previous.get(post)
+            previous[post] = current
+            if before == current:
+                continue
+            if before is not None:
+                # Take the post's earlier contribution back out; both adds are O(1)
+                score, num_comments, compound = before
+                state.add(ts, compound or 0.0, -engagement_weight(score, num_comments))
+        state.add(ts, record.sentiment_compound, engagement_weight(record.score, record.num_comments))
+        # The value as of the end of the hour the state has reached; later posts overwrite it
+        bucket = state.last_ts - state.last_ts % POINT_INTERVAL
+        points[(record.crypto, bucket)] = (state.value, state.weight_total)
+
+    conn.executemany(
+        "INSERT OR REPLACE INTO sentiment_index_state (crypto, last_ts, weighted_sum, weight_total) "
+        "VALUES (?, ?, ?, ?)",
+        [(crypto, s.last_ts, s.weighted_sum, s.weight_total) for crypto, s in states.items() if s.last_ts is not None],
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO sentiment_index (crypto, ts, value, weight) VALUES (?, ?, ?, ?)",
+        [(crypto, bucket, round(value, 6), round(weight, 4)) for (crypto, bucket), (value, weight) in points.items()],
+    )
+    return len(points)
+
+
+def fetch_index(conn, crypto, start=None, end=None):
+    """
+    Return the stored index series for `crypto` between epoch seconds `start` and `end` (inclusive)
+    as [{"ts", "time", "value", "weight"}, ...] in time order.
+    """
+    create_index_tables(conn)
+    rows = conn.execute(
+        "SELECT ts, datetime(ts, 'unixepoch'), value, weight FROM sentiment_index "
+        "WHERE crypto = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+        (crypto, start if start is not None else 0, end if end is not None else 2 ** 62),
+    ).fetchall()
+    return [{"ts": ts, "time": text, "value": value, "weight": weight} for ts, text, value, weight in rows]
+
+
+def latest_index(conn):
+    """Return the current index of every crypto as [{"crypto", "value", "weight", "ts"}, ...]."""
+    create_index_tables(conn)
+    rows = conn.execute(
+        "SELECT crypto, weighted_sum, weight_total, last_ts FROM sentiment_index_state ORDER BY crypto"
+    ).fetchall()
+    return [
+        {"crypto": crypto, "value": round(weighted_sum / weight_total, 6) if weight_total else 0.0,
+         "weight": round(weight_total, 4), "ts": last_ts}
+        for crypto, weighted_sum, weight_total, last_ts in rows
+    ]
+
+
+def rebuild(conn, batch_size=50000):
+    """Recompute the whole index from trend_data, oldest post first. Commits. Returns posts folded in."""
+    with conn:
+        create_index_tables(conn)
+        conn.execute("DELETE FROM sentiment_index_state")
+        conn.execute("DELETE FROM sentiment_index")
+    # trend_data holds one row per post, with its latest numbers
+    cur = conn.execute('''
+        SELECT crypto, score, num_comments, created, sentiment_compound FROM trend_data
+        WHERE crypto IS NOT NULL AND crypto != 'Unknown' AND created IS NOT NULL
+        ORDER BY created
+    ''')
+    total = 0
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            return total
+        records = [
+            TrendRecord(None, None, None, score, num_comments, created, crypto=crypto,
+                        sentiment_compound=compound or 0.0)
+            for crypto, score, num_comments, created, compound in rows
+        ]
+        with conn:
+            update_sentiment_index(conn, records)
+        total += len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the engagement-weighted sentiment index.")
+    parser.add_argument("--db", default=DB_FILE)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="Recompute the index from trend_data")
+    show = sub.add_parser("show", help="Print the latest values, or one crypto's last points")
+    show.add_argument("crypto", nargs="?")
+    show.add_argument("--points", type=int, default=24)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        if args.command == "rebuild":
+            print(f"Rebuilt the sentiment index from {rebuild(conn)} posts")
+        elif args.crypto:
+            for point in fetch_index(conn, args.crypto)[-args.points:]:
+                print(f"{point['time']}  {point['value']:+.4f}  (weight {point['weight']:.1f})")
+        else:
+            for row in latest_index(conn):
+                print(f"{row['crypto']:<10} {row['value']:+.4f}  (weight {row['weight']:.1f})")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
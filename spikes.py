@@ -0,0 +1,237 @@
+"""
+spikes.py
+
+Incremental mention-velocity spike detection.
+
+For every crypto the engine keeps rolling mention counts and sentiment sums over several windows
+(1h, 6h and 24h by default). Each window is a ring buffer of 12 buckets with running totals, so
+adding a mention is O(1): the event lands in its bucket and the totals are bumped. When the clock moves
+past a bucket boundary the oldest bucket is subtracted from the totals and cleared, and the window's
+count at that moment is folded into an exponentially weighted mean and variance -- the baseline. A
+window's z-score is how many baseline standard deviations its current count sits above that mean.
+Sampling starts once the window has covered its full span, and the first samples are averaged with
+weight 1/n rather than alpha, so the baseline starts at the observed rate instead of at zero.
+
+SpikeTracker feeds the engine from trend_data incrementally: it remembers the highest row id it has
+seen and each poll() reads only newer rows (a primary-key range scan), so scores stay current as rows
+are inserted without ever rescanning the table. api_endpoint.py serves the result at /trends/spikes.
+"""
+
+import calendar
+import datetime
+import math
+import sqlite3
+import threading
+import time
+
+# Window name -> length in seconds
+WINDOWS = {"1h": 3600, "6h": 6 * 3600, "24h": 24 * 3600}
+BUCKETS_PER_WINDOW = 12
+# The baseline forgets with a half-life of about a week of bucket samples
+BASELINE_HALF_LIFE = 7 * 24 * 3600
+# Baseline samples (taken once the window has been full once) needed before a z-score is reported
+WARMUP_SAMPLES = 2 * BUCKETS_PER_WINDOW
+
+
+def parse_created(created):
+    """Convert a trend_data `created` value ('YYYY-MM-DD HH:MM:SS', UTC) to epoch seconds."""
+    if isinstance(created, datetime.datetime):
+        return calendar.timegm(created.timetuple())
+    return calendar.timegm(time.strptime(created[:19], "%Y-%m-%d %H:%M:%S"))
+
+
+class RollingWindow:
+    """
+    Mention count and sentiment sum over the last `span` seconds, plus an EWMA baseline of the count.
+
+    Parameters:
+      span (int): Window length in seconds.
+      buckets (int): Number of ring buffer slots; the window slides one slot at a time.
+    """
+
+    __slots__ = ("bucket_seconds", "buckets", "counts", "sentiments", "count", "sentiment",
+                 "current", "alpha", "mean", "var", "sent_mean", "samples", "age")
+
+    def __init__(self, span, buckets=BUCKETS_PER_WINDOW):
+        self.bucket_seconds = span // buckets
+        self.buckets = buckets
+        self.counts = [0] * buckets
+        self.sentiments = [0.0] * buckets
+        self.count = 0
+        self.sentiment = 0.0
+        self.current = None  # Absolute index of the newest bucket
+        self.alpha = 1 - 0.5 ** (self.bucket_seconds / BASELINE_HALF_LIFE)
+        self.mean = 0.0
+        self.var = 0.0
+        self.sent_mean = 0.0
+        self.samples = 0
+        self.age = 0  # Bucket boundaries crossed since the first mention
+
+    def _sample(self):
+        """Fold the current window count into the EWMA baseline (once per bucket boundary)."""
+        self.age += 1
+        if self.age < self.buckets:
+            # The window does not cover its full span yet, so its count would drag the baseline down
+            return
+        self.samples += 1
+        # Plain running mean/variance until 1/n falls below alpha, then EWMA: the baseline starts at the
+        # observed level instead of climbing from zero for weeks
+        rate = max(self.alpha, 1.0 / self.samples)
+        delta = self.count - self.mean
+        self.mean += rate * delta
+        self.var = (1 - rate) * (self.var + rate * delta * delta)
+        if self.count:
+            self.sent_mean += rate * (self.sentiment / self.count - self.sent_mean)
+
+    def advance(self, ts):
+        """Move the window forward so that it ends at `ts`, expiring buckets that fall out of it."""
+        index = int(ts) // self.bucket_seconds
+        if self.current is None:
+            self.current = index
+            return
+        steps = index - self.current
+        if steps <= 0:
+            return
+        # Emptying the whole ring takes `buckets` steps; further steps only feed zeros to the
+        # baseline, so cap them to keep a long gap from costing more than a day of buckets
+        for _ in range(min(steps, self.buckets + 86400 // self.bucket_seconds)):
+            self._sample()
+            self.current += 1
+            slot = self.current % self.buckets
+            self.count -= self.counts[slot]
+            self.sentiment -= self.sentiments[slot]
+            self.counts[slot] = 0
+            self.sentiments[slot] = 0.0
+        self.current = index
+
+    def add(self, ts, sentiment):
+        """Record one mention at `ts`. Mentions older than the window are ignored."""
+        self.advance(ts)
+        index = int(ts) // self.bucket_seconds
+        if index <= self.current - self.buckets:
+            return
+        slot = index % self.buckets
+        self.counts[slot] += 1
+        self.sentiments[slot] += sentiment
+        self.count += 1
+        self.sentiment += sentiment
+
+    @property
+    def zscore(self):
+        """Deviation of the current count from the baseline, in standard deviations (None while warming up)."""
+        if self.samples < WARMUP_SAMPLES:
+            return None
+        # A floor of one mention keeps a flat zero baseline from turning a single post into a huge z
+        return (self.count - self.mean) / max(math.sqrt(self.var), 1.0)
+
+    @property
+    def sentiment_mean(self):
+        return self.sentiment / self.count if self.count else None
+
+
+class SpikeEngine:
+    """Rolling windows for every crypto, updated one mention at a time."""
+
+    def __init__(self, windows=WINDOWS):
+        self.windows = windows
+        self.cryptos = {}
+        self.clock = None
+
+    def add(self, crypto, ts, sentiment):
+        """Record a mention of `crypto` at epoch time `ts` with the given compound sentiment."""
+        if not crypto or crypto == "Unknown":
+            return
+        state = self.cryptos.get(crypto)
+        if state is None:
+            state = self.cryptos[crypto] = {name: RollingWindow(span) for name, span in self.windows.items()}
+        for window in state.values():
+            window.add(ts, sentiment)
+        if self.clock is None or ts > self.clock:
+            self.clock = ts
+
+    def advance(self, ts):
+        """Move every window forward to `ts`, so quiet cryptos decay even without new mentions."""
+        for state in self.cryptos.values():
+            for window in state.values():
+                window.advance(ts)
+        if self.clock is None or ts > self.clock:
+            self.clock = ts
+
+    def scores(self, window="1h"):
+        """Return the current state of one window for every crypto, highest z-score first."""
+        results = []
+        for crypto, state in self.cryptos.items():
+            w = state[window]
+            results.append({
+                "crypto": crypto,
+                "window": window,
+                "count": w.count,
+                "baseline": round(w.mean, 3),
+                "zscore": None if w.zscore is None else round(w.zscore, 3),
+                "sentiment": None if w.sentiment_mean is None else round(w.sentiment_mean, 4),
+                "baseline_sentiment": round(w.sent_mean, 4),
+            })
+        results.sort(key=lambda r: float("-inf") if r["zscore"] is None else r["zscore"], reverse=True)
+        return results
+
+    def spikes(self, window="1h", min_z=3.0, min_count=5):
+        """Return the cryptos whose mention count in `window` is currently spiking."""
+        return [
+            r for r in self.scores(window)
+            if r["zscore"] is not None and r["zscore"] >= min_z and r["count"] >= min_count
+        ]
+
+
+class SpikeTracker:
+    """
+    Keeps a SpikeEngine in sync with the trend_data table by reading only rows added since the last poll.
+
+    Parameters:
+      db_file (str): SQLite database path.
+      min_interval (float): Polls closer together than this (seconds) are skipped.
+    """
+
+    def __init__(self, db_file, min_interval=1.0):
+        self.db_file = db_file
+        self.min_interval = min_interval
+        self.engine = SpikeEngine()
+        self.last_id = 0
+        self.last_poll = 0.0
+        self._lock = threading.Lock()
+
+    def poll(self):
+        """Feed rows inserted since the previous poll into the engine. Returns the number of new rows."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self.last_poll < self.min_interval:
+                return 0
+            self.last_poll = now
+            conn = sqlite3.connect(self.db_file)
+            try:
+                rows = conn.execute(
+                    "SELECT id, crypto, created, sentiment_compound FROM trend_data WHERE id > ? ORDER BY id",
+                    (self.last_id,),
+                )
+                count = 0
+                for row_id, crypto, created, compound in rows:
+                    if created:
+                        self.engine.add(crypto, parse_created(created), compound or 0.0)
+                    self.last_id = row_id
+                    count += 1
+            finally:
+                conn.close()
+            return count
+
+    def spikes(self, window="1h", min_z=3.0, min_count=5, now=None):
+        """Poll for new rows, move the clock to `now` (default: current UTC time) and return spikes."""
+        self.poll()
+        with self._lock:
+            self.engine.advance(now if now is not None else time.time())
+            return self.engine.spikes(window, min_z, min_count)
+
+    def scores(self, window="1h", now=None):
+        """Like spikes(), but returns every crypto's window state regardless of threshold."""
+        self.poll()
+        with self._lock:
+            self.engine.advance(now if now is not None else time.time())
+            return self.engine.scores(window)
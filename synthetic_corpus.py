@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+"""
+synthetic_corpus.py
+
+Generates realistic synthetic Reddit posts and tweets for benchmarks and load tests.
+
+Titles are built from templates in the style of r/CryptoCurrency headlines and crypto Twitter, with coin
+names and tickers drawn from a skewed (Zipf-like) distribution so a few coins dominate, as they do in the
+real data. `density` sets the fraction of items that mention a tracked crypto at all; the rest are generic
+market chatter that the keyword matcher has to scan and reject. Everything is driven by a seeded RNG, so
+the same arguments always produce the same corpus.
+
+Usage:
+  python synthetic_corpus.py db bench.db --rows 1000000 --density 0.6
+  python synthetic_corpus.py fixture fixtures/synthetic.jsonl --rows 10000
+"""
+
+import argparse
+import datetime
+import json
+import random
+import re
+import sqlite3
+
+from records import TrendRecord
+
+# (crypto, spellings used in text); weights fall off with rank
+COINS = [
+    ("bitcoin", ["Bitcoin", "BTC", "bitcoin", "$BTC"]),
+    ("ethereum", ["Ethereum", "ETH", "ether", "$ETH"]),
+    ("solana", ["Solana", "SOL", "$SOL"]),
+    ("xrp", ["XRP", "$XRP", "Ripple XRP"]),
+    ("dogecoin", ["Dogecoin", "DOGE", "$DOGE"]),
+    ("cardano", ["Cardano", "ADA", "$ADA"]),
+]
+COIN_WEIGHTS = [1 / (rank + 1) for rank in range(len(COINS))]
+
+POST_TEMPLATES = [
+    "{coin} {move} {pct}% as {event}",
+    "Why {coin} could {outlook} after {event}",
+    "{coin} whales moved ${amount}M in the last 24 hours",
+    "Is it too late to buy {coin}? Price is {move} {pct}% this week",
+    "{coin} ETF approval odds rise as {event}",
+    "Analysts say {coin} will {outlook} before the halving",
+    "Daily discussion: {coin} {move} while {event}",
+    "{coin} network fees hit a {period} high",
+]
+TWEET_TEMPLATES = [
+    "{coin} just {move} {pct}% 🚀 #crypto",
+    "Loaded more {coin} today. {outlook}!",
+    "{coin} chart looks {mood}. {event}?",
+    "Not financial advice but {coin} is {mood} right now",
+]
+CHATTER = [
+    "Market update: {event}",
+    "What is everyone's strategy for this {period}?",
+    "The SEC just {verb} another exchange",
+    "Lost my seed phrase, any advice?",
+    "Best hardware wallet in {year}?",
+    "Exchanges report record volume as {event}",
+    "Monthly portfolio check-in thread",
+    "Regulators {verb} new stablecoin rules",
+]
+WORDS = {
+    "move": ["surges", "drops", "climbs", "slides", "jumps", "falls", "rallies", "dumps"],
+    "event": ["the Fed holds rates", "ETF inflows surge", "a major exchange gets hacked",
+              "inflation cools", "retail interest returns", "liquidations spike", "the dollar weakens"],
+    "outlook": ["double", "hit new highs", "crash hard", "break resistance", "moon", "retest support"],
+    "mood": ["bullish", "bearish", "wild", "boring", "insane", "strong"],
+    "period": ["month", "quarter", "year", "cycle"],
+    "verb": ["sued", "approved", "fined", "delayed", "proposed"],
+}
+NUMBERS = {"pct": (1, 40), "amount": (5, 900), "year": (2022, 2026)}
+TEMPLATE_FIELDS = {
+    template: re.findall(r"{(\w+)}", template) for template in POST_TEMPLATES + TWEET_TEMPLATES + CHATTER
+}
+
+
+class CorpusGenerator:
+    """
+    Deterministic generator of synthetic posts and tweets.
+
+    Parameters:
+      density (float): Fraction of items that mention a tracked crypto (0..1).
+      seed (int): RNG seed.
+      start (datetime): Timestamp of the first item; items are spaced `spacing` seconds apart on average.
+      tweet_share (float): Fraction of items generated as tweets rather than Reddit posts.
+    """
+
+    def __init__(self, density=0.6, seed=42, start=datetime.datetime(2024, 1, 1), spacing=30, tweet_share=0.3):
+        self.density = density
+        self.rng = random.Random(seed)
+        self.clock = start
+        self.spacing = spacing
+        self.tweet_share = tweet_share
+        self.count = 0
+
+    def _fill(self, template, coin_text):
+        # Only draw values for the fields this template uses; generation dominates large builds
+        random_value = self.rng.random
+        values = {}
+        for field in TEMPLATE_FIELDS[template]:
+            if field == "coin":
+                values[field] = coin_text
+            elif field in NUMBERS:
+                low, high = NUMBERS[field]
+                values[field] = low + int(random_value() * (high - low + 1))
+            else:
+                options = WORDS[field]
+                values[field] = options[int(random_value() * len(options))]
+        return template.format(**values)
+
+    def text(self, tweet=False):
+        """Return (title, crypto) where crypto is the coin mentioned or None for chatter."""
+        rng = self.rng
+        if rng.random() < self.density:
+            crypto, spellings = rng.choices(COINS, COIN_WEIGHTS)[0]
+            templates = TWEET_TEMPLATES if tweet else POST_TEMPLATES
+            return self._fill(rng.choice(templates), rng.choice(spellings)), crypto
+        return self._fill(rng.choice(CHATTER), ""), None
+
+    def record(self, scored=False):
+        """
+        Return the next synthetic TrendRecord. Crypto and sentiment are left for the pipeline to fill in,
+        unless `scored` is set: then the true crypto and a random-but-plausible sentiment are filled in,
+        for building databases quickly without running the matcher and VADER.
+        """
+        rng = self.rng
+        tweet = rng.random() < self.tweet_share
+        title, crypto = self.text(tweet)
+        self.count += 1
+        self.clock += datetime.timedelta(seconds=rng.expovariate(1 / self.spacing))
+        record = TrendRecord(
+            source="twitter" if tweet else "reddit",
+            post_id=f"s{self.count}",
+            title=title,
+            score=int(rng.paretovariate(1.2)) - 1,
+            num_comments=int(rng.paretovariate(1.5)) - 1,
+            created=self.clock.replace(microsecond=0),
+        )
+        if scored:
+            record.crypto = crypto or "Unknown"
+            compound = max(-1.0, min(1.0, rng.gauss(0.05, 0.35)))
+            pos = max(compound, 0.0) * 0.6
+            neg = max(-compound, 0.0) * 0.6
+            record.set_sentiment({"neg": round(neg, 3), "neu": round(1 - pos - neg, 3),
+                                  "pos": round(pos, 3), "compound": round(compound, 4)})
+        return record
+
+    def records(self, rows, scored=False):
+        """Yield `rows` synthetic records."""
+        for _ in range(rows):
+            yield self.record(scored)
+
+
+def build_database(path, rows, density=0.6, seed=42, chunk=50000):
+    """
+    Create (or extend) a trend_data database at `path` with `rows` synthetic rows, written through
+    the same write path as the aggregators (including engagement snapshots and the search index).
+    Returns the number of rows in trend_data afterwards.
+    """
+    from writer_daemon import create_tables, write_records
+
+    conn = sqlite3.connect(path)
+    create_tables(conn)
+    generator = CorpusGenerator(density=density, seed=seed)
+    batch = []
+    for record in generator.records(rows, scored=True):
+        batch.append(record)
+        if len(batch) >= chunk:
+            with conn:
+                write_records(conn, batch)
+            batch = []
+    if batch:
+        with conn:
+            write_records(conn, batch)
+    total = conn.execute("SELECT COUNT(*) FROM trend_data").fetchone()[0]
+    conn.close()
+    return total
+
+
+def write_fixture(path, rows, density=0.6, seed=42, batch_size=100):
+    """Write `rows` synthetic Reddit posts as a connectors.py replay fixture."""
+    generator = CorpusGenerator(density=density, seed=seed, tweet_share=0.0)
+    with open(path, "w", encoding="utf-8") as f:
+        payload = []
+        for record in generator.records(rows):
+            payload.append({
+                "id": record.post_id,
+                "name": f"t3_{record.post_id}",
+                "title": record.title,
+                "selftext": "",
+                "score": record.score,
+                "num_comments": record.num_comments,
+                "created_utc": record.created.replace(tzinfo=datetime.timezone.utc).timestamp(),
+            })
+            if len(payload) == batch_size:
+                f.write(json.dumps({"kind": "batch", "source": "reddit", "cursor": None,
+                                    "next_cursor": None, "payload": payload}) + "\n")
+                payload = []
+        if payload:
+            f.write(json.dumps({"kind": "batch", "source": "reddit", "cursor": None,
+                                "next_cursor": None, "payload": payload}) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic crypto posts and tweets.")
+    parser.add_argument("kind", choices=["db", "fixture"], help="Fill a trend_data database or write a replay fixture")
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=100000, help="Number of items (up to tens of millions)")
+    parser.add_argument("--density", type=float, default=0.6, help="Fraction of items mentioning a tracked crypto")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.kind == "db":
+        total = build_database(args.path, args.rows, args.density, args.seed)
+        print(f"{args.path} now has {total} rows in trend_data")
+    else:
+        write_fixture(args.path, args.rows, args.density, args.seed)
+        print(f"Wrote {args.rows} synthetic posts to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
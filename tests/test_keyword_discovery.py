@@ -0,0 +1,58 @@
+import random
+from collections import Counter
+
+from keyword_discovery import CountMinSketch, KeywordDiscovery, TopK
+
+DAY = 24 * 3600
+START = 1704067200  # 2024-01-01 00:00 UTC
+
+
+def zipf_stream(terms=5000, length=50000, seed=3):
+    """Terms drawn with probability proportional to 1 / rank, in random order."""
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(terms)]
+    return rng.choices(vocabulary, weights=[1 / (rank + 1) for rank in range(terms)], k=length)
+
+
+def test_sketch_never_undercounts():
+    stream = zipf_stream()
+    sketch = CountMinSketch(width=2 ** 10, depth=4)
+    for term in stream:
+        sketch.add(term)
+    true = Counter(stream)
+    errors = [sketch.estimate(term) - count for term, count in true.items()]
+    assert min(errors) >= 0
+    # Overcounts beyond 2N/w should be rare (probability 2^-depth per term)
+    assert sum(error > 2 * len(stream) / sketch.width for error in errors) < len(true) / 16
+    assert sketch.estimate("never seen") <= 2 * len(stream) / sketch.width
+
+
+def test_top_k_recovers_the_heavy_hitters():
+    stream = zipf_stream()
+    sketch, top = CountMinSketch(), TopK(k=50)
+    for term in stream:
+        top.offer(term, sketch.add(term))
+    heaviest = {term for term, _ in Counter(stream).most_common(10)}
+    assert heaviest <= {term for term, _ in top.items()}
+    assert len(top.items()) == 50
+
+
+def test_late_text_counts_towards_the_previous_window():
+    discovery = KeywordDiscovery()
+    # Newest first, as listings arrive: the first post opens the second window
+    discovery.observe("solana rally", START + DAY + 60)
+    discovery.observe("solana rally", START + DAY - 60)
+    discovery.observe("solana rally", START - 60)  # Older than the previous window
+    assert discovery.current.start == START + DAY
+    assert discovery.previous.start == START
+    assert discovery.current.sketch.estimate("solana") == 1
+    assert discovery.previous.sketch.estimate("solana") == 1
+
+
+def test_repolled_posts_are_counted_once():
+    discovery = KeywordDiscovery()
+    for _ in range(3):
+        if discovery.first_sighting(("reddit", "p1"), START + 60):
+            discovery.observe("new token $abc", START + 60)
+    assert discovery.first_sighting(("reddit", "p2"), START + 60)
+    assert discovery.current.sketch.estimate("$abc") == 1
@@ -0,0 +1,87 @@
+import sqlite3
+
+import numpy as np
+
+from lead_lag import DEFAULT_LAGS, INTERVALS, compute_lead_lag, load_series, shift
+from prices import create_price_table
+from retention import create_rollup_tables
+from writer_daemon import create_tables
+
+START = 1704067200  # 2024-01-01 00:00 UTC
+
+
+def test_shift_lags_longer_than_series_are_nan():
+    signal = np.arange(10, dtype=np.float64).reshape(1, 10)
+    shifted = shift(signal, (-24, -12, -1, 0, 1, 12, 24))
+    assert shifted.shape == (7, 1, 10)
+    for i in (0, 1, 5, 6):
+        assert np.isnan(shifted[i]).all()
+    assert shifted[2, 0, :9].tolist() == signal[0, 1:].tolist()
+    assert shifted[3].tolist() == signal.tolist()
+    assert shifted[4, 0, 1:].tolist() == signal[0, :9].tolist()
+
+
+def test_short_daily_history_with_default_lags():
+    conn = sqlite3.connect(":memory:")
+    create_price_table(conn)
+    conn.executemany(
+        "INSERT INTO prices (crypto, ts, close) VALUES ('bitcoin', ?, ?)",
+        [(START + day * 86400, 100.0 + day) for day in range(10)],
+    )
+    conn.execute("CREATE TABLE trend_data (id INTEGER PRIMARY KEY, crypto TEXT, created TEXT, sentiment_compound REAL)")
+    conn.executemany(
+        "INSERT INTO trend_data (crypto, created, sentiment_compound) VALUES ('bitcoin', ?, 0.1)",
+        [(f"2024-01-{day + 1:02d} 12:00:00",) for day in range(10)],
+    )
+    result = compute_lead_lag(conn, INTERVALS["1d"], window=30, lags=DEFAULT_LAGS)
+    stats = result["cryptos"]["bitcoin"]["sentiment"]
+    assert len(stats["corr"]) == len(DEFAULT_LAGS)
+    assert all(value is None for value in stats["corr"])
+
+
+def shifted_db(lag, hours=200, rolled=100):
+    """Hourly prices whose returns follow the mentions (and sentiment) of `lag` hours earlier."""
+    rng = np.random.default_rng(7)
+    mentions = rng.integers(1, 20, hours)
+    returns = rng.normal(0, 0.01, hours)
+    returns[lag:] = 0.01 * (mentions[:-lag] - 10)
+    conn = sqlite3.connect(":memory:")
+    create_tables(conn)
+    create_price_table(conn)
+    create_rollup_tables(conn)
+    conn.executemany("INSERT INTO prices (crypto, ts, close) VALUES ('bitcoin', ?, ?)",
+                     [(START + hour * 3600, close) for hour, close in enumerate(100 * np.exp(np.cumsum(returns)))])
+    for hour, count in enumerate(mentions.tolist()):
+        compound = (count - 10) / 20
+        created = f"2024-01-{1 + hour // 24:02d} {hour % 24:02d}:00:00"
+        if hour < rolled:
+            # Older hours have been rolled up by retention.py
+            conn.execute("INSERT INTO trend_hourly (crypto, bucket, mentions, score_sum, comments_sum, sentiment_neg_sum, "
+                         "sentiment_neu_sum, sentiment_pos_sum, sentiment_compound_sum) "
+                         "VALUES ('bitcoin', ?, ?, 0, 0, 0, 0, 0, ?)", (created, count, compound * count))
+        else:
+            conn.executemany("INSERT INTO trend_data (crypto, created, sentiment_compound) VALUES ('bitcoin', ?, ?)",
+                             [(created.replace(":00:00", f":{i:02d}:00"), compound) for i in range(count)])
+    return conn, mentions
+
+
+def test_best_lag_of_a_shifted_series():
+    conn, mentions = shifted_db(3)
+    _, _, _, _, loaded = load_series(conn, INTERVALS["1h"])
+    assert loaded[0].tolist() == mentions.tolist()
+    stats = compute_lead_lag(conn, INTERVALS["1h"], window=48)["cryptos"]["bitcoin"]
+    assert stats["mentions"]["best_lag"] == 3
+    assert stats["sentiment"]["best_lag"] == 3
+
+
+def test_hours_only_kept_as_daily_rollups_are_unknown():
+    conn, mentions = shifted_db(3)
+    conn.execute("DELETE FROM trend_hourly WHERE bucket < '2024-01-02'")
+    conn.execute("INSERT INTO trend_daily (crypto, bucket, mentions, score_sum, comments_sum, sentiment_neg_sum, "
+                 "sentiment_neu_sum, sentiment_pos_sum, sentiment_compound_sum) "
+                 "VALUES ('bitcoin', '2024-01-01', ?, 0, 0, 0, 0, 0, 0)", (int(mentions[:24].sum()),))
+    _, _, _, _, hourly = load_series(conn, INTERVALS["1h"])
+    assert np.isnan(hourly[0, :24]).all()
+    assert hourly[0, 24:].tolist() == mentions[24:].tolist()
+    _, _, _, _, daily = load_series(conn, INTERVALS["1d"])
+    assert daily[0, 0] == mentions[:24].sum()
@@ -0,0 +1,72 @@
+import sqlite3
+
+import live_updates
+from live_updates import ChangeFeed
+
+
+def make_db(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE trend_data (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, crypto TEXT, score INTEGER, "
+        "num_comments INTEGER, created TEXT, sentiment_neg REAL, sentiment_neu REAL, sentiment_pos REAL, "
+        "sentiment_compound REAL, source TEXT DEFAULT 'reddit')"
+    )
+    add_rows(conn, rows)
+    return conn
+
+
+def add_rows(conn, rows, source="reddit"):
+    with conn:
+        conn.executemany(
+            "INSERT INTO trend_data (title, crypto, score, num_comments, created, sentiment_compound, source) "
+            "VALUES (?, 'bitcoin', 1, 0, '2024-01-01 00:00:00', 0.5, ?)",
+            [(f"post {i}", source) for i in range(rows)],
+        )
+
+
+def test_replay_within_cap_has_no_reset(tmp_path):
+    make_db(tmp_path / "t.db", 10)
+    feed = ChangeFeed(str(tmp_path / "t.db"), poll_interval=60)
+    subscription = feed.subscribe(since=5)
+    rows = subscription.queue.get_nowait()
+    assert [row["id"] for row in rows] == [6, 7, 8, 9, 10]
+    assert subscription.queue.empty()
+
+
+def test_truncated_replay_sends_reset_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(live_updates, "MAX_REPLAY_ROWS", 3)
+    make_db(tmp_path / "t.db", 10)
+    feed = ChangeFeed(str(tmp_path / "t.db"), poll_interval=60)
+    stream = feed.stream(since=2)
+    assert next(stream).startswith("retry:")
+    assert next(stream) == 'id: 10\nevent: reset\ndata: {"last_id": 10}\n\n'
+    assert next(stream).startswith("id: 10\nevent: rows\n")
+    stream.close()
+
+
+def test_poller_survives_database_errors(tmp_path, monkeypatch):
+    make_db(tmp_path / "t.db", 1)
+    calls = []
+    real_poll = ChangeFeed.poll
+
+    def flaky_poll(self, conn):
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        real_poll(self, conn)
+
+    monkeypatch.setattr(ChangeFeed, "poll", flaky_poll)
+    feed = ChangeFeed(str(tmp_path / "t.db"), poll_interval=0.01)
+    subscription = feed.subscribe()
+    add_rows(sqlite3.connect(tmp_path / "t.db"), 1)
+    rows = subscription.queue.get(timeout=5)
+    assert [row["id"] for row in rows] == [2]
+    assert feed._thread.is_alive()
+
+
+def test_rows_carry_their_source(tmp_path):
+    conn = make_db(tmp_path / "t.db", 1)
+    add_rows(conn, 1, source="twitter")
+    feed = ChangeFeed(str(tmp_path / "t.db"), poll_interval=60)
+    rows = feed.subscribe(since=0).queue.get_nowait()
+    assert [row["source"] for row in rows] == ["reddit", "twitter"]
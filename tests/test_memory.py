@@ -0,0 +1,87 @@
+import contextlib
+import datetime
+import json
+import os
+import sqlite3
+import tracemalloc
+
+import numpy as np
+
+import api_endpoint
+import data_aggregator_with_crypto_filter_and_comments as aggregator
+from connectors import ReplayConnector
+from keyword_discovery import KeywordDiscovery
+
+BATCH = 100
+# Every size is well past the /trends fetch batch and the write batch, where memory should be flat
+SIZES = (1500, 3000, 6000)
+# Keeping even one record per row alive costs a few hundred bytes, far above this
+MAX_BYTES_PER_ROW = 16
+
+
+def write_fixture(path):
+    """Write a one-batch Reddit fixture; ReplayConnector loops it to reach any volume."""
+    base = datetime.datetime(2025, 1, 1).timestamp()
+    payload = [
+        {
+            "id": f"p{i}",
+            "name": f"t3_p{i}",
+            "title": f"Post {i} about {'BTC' if i % 2 else 'ETH'} hitting a new high",
+            "selftext": "",
+            "score": i,
+            "num_comments": i % 7,
+            "created_utc": base + i * 60,
+        }
+        for i in range(BATCH)
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"kind": "batch", "source": "reddit", "cursor": None,
+                            "next_cursor": None, "payload": payload}) + "\n")
+
+
+def peak_ingest(fixture, rows):
+    """Peak traced memory (bytes) while ingesting `rows` records into a fresh database."""
+    aggregator.create_database()
+    connector = ReplayConnector(fixture, loops=rows // BATCH)
+    tracemalloc.start()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        aggregator.aggregate_trend_data(connector, max_batches=None, use_writer=False)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def peak_api(rows):
+    """Peak traced memory (bytes) while streaming every row of /trends for a table of `rows` rows."""
+    conn = sqlite3.connect(api_endpoint.DB_FILE)
+    assert conn.execute("SELECT COUNT(*) FROM trend_data").fetchone()[0] == rows
+    conn.close()
+    client = api_endpoint.app.test_client()
+    tracemalloc.start()
+    response = client.get("/trends", buffered=False)
+    for _ in response.response:
+        pass
+    response.close()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def test_ingestion_and_trends_run_in_constant_memory(tmp_path, monkeypatch):
+    fixture = str(tmp_path / "fixture.jsonl")
+    write_fixture(fixture)
+    peaks = {"ingest": [], "api": []}
+    # The first run pays for imports, caches and compiled statements; it is left out of the fit
+    for i, rows in enumerate((SIZES[0],) + SIZES):
+        db_file = str(tmp_path / f"{i}.db")
+        monkeypatch.setattr(aggregator, "DB_FILE", db_file)
+        monkeypatch.setattr(api_endpoint, "DB_FILE", db_file)
+        # Discovery keeps each window's posts; with hour-long windows that state is full at every size
+        monkeypatch.setattr(aggregator, "keyword_discovery", KeywordDiscovery(window=3600))
+        ingest, api = peak_ingest(fixture, rows), peak_api(rows)
+        if i:
+            peaks["ingest"].append(ingest)
+            peaks["api"].append(api)
+    for path, values in peaks.items():
+        slope = np.polyfit(SIZES, values, 1)[0]
+        assert slope < MAX_BYTES_PER_ROW, f"{path} peak grows {slope:.1f} bytes per row: {values}"
@@ -0,0 +1,42 @@
+import sqlite3
+
+import parquet_export
+from engagement import record_snapshots
+from records import TrendRecord
+from writer_daemon import create_tables, write_records
+
+
+def make_db(path):
+    conn = sqlite3.connect(path)
+    create_tables(conn)
+    with conn:
+        write_records(conn, [
+            TrendRecord("reddit", "r1", "bitcoin post", 3, 1, "2024-01-01 10:00:00", crypto="bitcoin"),
+            TrendRecord("twitter", "t1", "bitcoin tweet", 5, 0, "2024-01-01 11:00:00", crypto="bitcoin"),
+        ])
+    conn.close()
+
+
+def test_export_keeps_the_source(tmp_path):
+    make_db(tmp_path / "t.db")
+    out = str(tmp_path / "export")
+    assert parquet_export.export(str(tmp_path / "t.db"), out)["trend_data"] == 2
+    table = parquet_export.load(out, crypto="bitcoin").sort_by("id")
+    assert table["source"].to_pylist() == ["reddit", "twitter"]
+
+
+def test_engagement_is_exported_in_chunks(tmp_path):
+    conn = sqlite3.connect(tmp_path / "t.db")
+    create_tables(conn)
+    records = [TrendRecord("reddit", f"r{i}", "bitcoin post", i, 0, "2024-01-01 10:00:00", crypto="bitcoin")
+               for i in range(5)]
+    with conn:
+        for poll in range(3):
+            for record in records:
+                record.score += 1
+            record_snapshots(conn, records, ts=1704103200 + poll * 60)
+    out = str(tmp_path / "export")
+    assert parquet_export.export_engagement(conn, out, 0, now=1704110000, chunk_rows=2) == (15, 1704103320)
+    table = parquet_export.load(out, table="engagement")
+    assert sorted(zip(table["post_id"].to_pylist(), table["score"].to_pylist())) == sorted(
+        (f"r{i}", i + poll) for i in range(5) for poll in (1, 2, 3))
@@ -0,0 +1,31 @@
+import pytest
+
+from pipeline import BatchStage, Pipeline, Stage
+
+
+def test_items_flow_through_every_stage():
+    received = []
+    pipeline = Pipeline(
+        source=iter(range(250)),
+        stages=[Stage("double", lambda x: 2 * x, workers=3), BatchStage("batch", list, batch_size=100)],
+        sink=received.append,
+    )
+    stats = pipeline.run()
+    assert sorted(received) == [2 * x for x in range(250)]
+    assert [s.items_in for s in stats] == [250, 250, 250]
+
+
+@pytest.mark.parametrize("failing", ["stage", "sink"])
+def test_errors_stop_the_run_and_are_raised(failing):
+    def fail(item):
+        if item == 50:
+            raise ValueError("bad item")
+        return item
+
+    pipeline = Pipeline(
+        source=iter(range(10000)),
+        stages=[Stage("check", fail if failing == "stage" else (lambda x: x), workers=2)],
+        sink=fail if failing == "sink" else None,
+    )
+    with pytest.raises(ValueError, match="bad item"):
+        pipeline.run()
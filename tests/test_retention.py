@@ -0,0 +1,56 @@
+import datetime
+import random
+import sqlite3
+
+from retention import create_rollup_tables, fetch_history, remove_duplicates, roll_up_hourly, roll_up_raw
+from writer_daemon import create_tables
+
+NOW = datetime.datetime(2025, 1, 1)
+TOTALS = "SELECT crypto, SUM(mentions), SUM(score_sum), SUM(comments_sum), ROUND(SUM(sentiment_compound_sum), 6) "
+
+
+def make_db():
+    conn = sqlite3.connect(":memory:")
+    create_tables(conn)
+    create_rollup_tables(conn)
+    return conn
+
+
+def insert_raw(conn, rows):
+    conn.executemany("INSERT INTO trend_data (title, crypto, score, num_comments, created, sentiment_compound) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+
+def test_rollups_keep_the_raw_totals():
+    rng = random.Random(5)
+    conn = make_db()
+    insert_raw(conn, [
+        (f"post {i}", rng.choice(["bitcoin", "ethereum"]), rng.randint(0, 500), rng.randint(0, 50),
+         (datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=rng.randrange(10 * 24 * 60)))
+         .strftime("%Y-%m-%d %H:%M:%S"), round(rng.uniform(-1, 1), 4))
+        for i in range(2000)
+    ])
+    raw = conn.execute("SELECT crypto, COUNT(*), SUM(score), SUM(num_comments), ROUND(TOTAL(sentiment_compound), 6) "
+                       "FROM trend_data GROUP BY crypto ORDER BY crypto").fetchall()
+
+    assert roll_up_raw(conn, raw_days=30, now=NOW) == 2000
+    assert conn.execute(TOTALS + "FROM trend_hourly GROUP BY crypto ORDER BY crypto").fetchall() == raw
+    hourly = conn.execute("SELECT COUNT(*) FROM trend_hourly").fetchone()[0]
+
+    assert roll_up_hourly(conn, hourly_days=30, now=NOW)[0] == hourly
+    assert conn.execute(TOTALS + "FROM trend_daily GROUP BY crypto ORDER BY crypto").fetchall() == raw
+    history = fetch_history(conn, crypto="bitcoin")
+    assert len(history) == 10
+    assert sum(row["mentions"] for row in history) == raw[0][1]
+
+
+def test_duplicates_are_removed_incrementally():
+    conn = make_db()
+    insert_raw(conn, [("same", "bitcoin", score, 0, "2024-01-01 10:00:00", 0.1) for score in (1, 2)])
+    insert_raw(conn, [("other", "bitcoin", 5, 0, "2024-01-01 11:00:00", 0.1)])
+    assert remove_duplicates(conn) == 1
+    assert remove_duplicates(conn) == 0
+    # A later copy of an already checked row replaces it
+    insert_raw(conn, [("same", "bitcoin", 3, 0, "2024-01-01 10:00:00", 0.1)])
+    assert remove_duplicates(conn) == 1
+    assert conn.execute("SELECT title, score FROM trend_data ORDER BY id").fetchall() == [("other", 5), ("same", 3)]
@@ -0,0 +1,43 @@
+import sqlite3
+
+from records import TrendRecord
+from sentiment_index import fetch_index, latest_index, rebuild
+from writer_daemon import create_tables, write_records
+
+
+def make_records(ids, score=10, compound=0.5):
+    return [
+        TrendRecord("reddit", post_id, f"post {post_id}", score, 2, f"2024-01-01 00:{i:02d}:00",
+                    crypto="bitcoin", sentiment_compound=compound)
+        for i, post_id in enumerate(ids)
+    ]
+
+
+def make_db(*batches):
+    conn = sqlite3.connect(":memory:")
+    create_tables(conn)
+    for batch in batches:
+        with conn:
+            write_records(conn, batch)
+    return conn
+
+
+def test_repolled_posts_are_stored_once_with_their_latest_numbers():
+    # The first poll sees new posts with little engagement; the next one sees them again with more
+    conn = make_db(make_records(["a", "b"], score=0), make_records(["a", "b"], score=50) + make_records(["c"]))
+    assert conn.execute("SELECT COUNT(*), SUM(score) FROM trend_data").fetchone() == (3, 110)
+    latest = make_db(make_records(["a", "b"], score=50) + make_records(["c"]))
+    assert latest_index(conn) == latest_index(latest)
+    assert len(fetch_index(conn, "bitcoin")) == 1
+
+
+def test_rebuild_matches_live_updates():
+    conn = make_db(make_records(["a", "b"], score=0), make_records(["a"], score=40, compound=-0.5),
+                   make_records(["a", "b", "c"], score=7))
+    live = latest_index(conn)
+    rebuild(conn)
+    assert latest_index(conn) == live
+
+
+def test_duplicates_within_a_batch_count_once():
+    assert latest_index(make_db(make_records(["a"]))) == latest_index(make_db(make_records(["a", "a"])))
@@ -0,0 +1,50 @@
+import json
+import sqlite3
+
+from records import TrendRecord
+from source_comparison import compare_sources, compare_sources_json
+from writer_daemon import create_tables, write_records
+
+HOUR = 1704067200  # 2024-01-01 00:00 UTC
+
+
+def posts(source, count, compound, hour=HOUR):
+    created = f"2024-01-01 {(hour - HOUR) // 3600:02d}:10:00"
+    return [
+        TrendRecord(source, f"{source}{hour}-{i}", f"{source} post {i}", 1, 0, created,
+                    crypto="bitcoin", sentiment_compound=compound)
+        for i in range(count)
+    ]
+
+
+def make_db():
+    conn = sqlite3.connect(":memory:")
+    create_tables(conn)
+    return conn
+
+
+def test_sources_side_by_side_and_repolls_counted_once():
+    conn = make_db()
+    batch = posts("reddit", 3, 0.5) + posts("pushshift", 2, 0.5) + posts("twitter", 4, -0.5)
+    with conn:
+        write_records(conn, batch)
+        write_records(conn, batch)
+    [row] = compare_sources(conn, "bitcoin")
+    assert row["time"] == "2024-01-01 00:00"
+    assert row["reddit"] == {"mentions": 5, "sentiment": 0.5}
+    assert row["twitter"] == {"mentions": 4, "sentiment": -0.5}
+    assert json.loads(compare_sources_json(conn)) == [row]
+
+
+def test_flags_and_divergent_only():
+    conn = make_db()
+    with conn:
+        # A quiet first hour, then one where the sources disagree on sentiment, then a Twitter-only burst
+        write_records(conn, posts("reddit", 5, 0.2) + posts("twitter", 5, 0.2))
+        write_records(conn, posts("reddit", 5, 0.4, HOUR + 3600) + posts("twitter", 5, -0.4, HOUR + 3600))
+        write_records(conn, posts("twitter", 30, 0.1, HOUR + 7200))
+    rows = compare_sources(conn)
+    assert [row["flags"] for row in rows] == [[], ["sentiment", "direction"], ["volume"]]
+    assert rows[1]["sentiment_gap"] == -0.8
+    assert [row["hour"] for row in compare_sources(conn, divergent_only=True)] == [HOUR + 3600, HOUR + 7200]
+    assert compare_sources(conn, start=HOUR + 3600, end=HOUR + 3600) == [rows[1]]
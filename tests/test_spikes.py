@@ -0,0 +1,59 @@
+import sqlite3
+
+from records import TrendRecord
+from spikes import WINDOWS, SpikeEngine, SpikeTracker
+from writer_daemon import create_tables, write_records
+
+START = 1704067200  # 2024-01-01 00:00 UTC
+
+
+def feed(engine, crypto, start, hours, per_hour):
+    """Mentions of `crypto` spread evenly, `per_hour` every hour."""
+    step = 3600 / per_hour
+    for i in range(int(hours * per_hour)):
+        ts = start + i * step
+        engine.advance(ts)
+        engine.add(crypto, ts, 0.1)
+
+
+def test_constant_rate_never_spikes():
+    engine = SpikeEngine()
+    step = 3600 / 10
+    for i in range(3 * 24 * 10):
+        ts = START + i * step
+        engine.add("bitcoin", ts, 0.1)
+        for window in WINDOWS:
+            assert engine.spikes(window, min_z=3.0, min_count=1) == []
+    for window in WINDOWS:
+        score = engine.scores(window)[0]
+        assert score["zscore"] is not None
+        assert abs(score["zscore"]) < 1
+        assert abs(score["baseline"] - score["count"]) < 0.5
+
+
+def test_burst_after_steady_rate_spikes():
+    engine = SpikeEngine()
+    feed(engine, "bitcoin", START, 48, 10)
+    feed(engine, "bitcoin", START + 48 * 3600, 1, 60)
+    assert [r["crypto"] for r in engine.spikes("1h")] == ["bitcoin"]
+
+
+def test_tracker_reads_new_rows_and_counts_repolled_posts_once(tmp_path):
+    db_file = str(tmp_path / "trends.db")
+    conn = sqlite3.connect(db_file)
+    create_tables(conn)
+    batch = [TrendRecord("reddit", f"p{i}", f"post {i}", 1, 0, f"2024-01-01 00:{i:02d}:00", crypto="bitcoin")
+             for i in range(5)]
+    with conn:
+        write_records(conn, batch)
+    tracker = SpikeTracker(db_file, min_interval=0)
+    assert tracker.poll() == 5
+    with conn:
+        # The next poll of the source sees the same posts again, with one new one
+        write_records(conn, batch + [TrendRecord("reddit", "p5", "post 5", 1, 0, "2024-01-01 00:30:00",
+                                                 crypto="bitcoin")])
+    conn.close()
+    assert tracker.poll() == 1
+    assert tracker.poll() == 0
+    [score] = tracker.scores("1h", now=START + 3599)
+    assert score["count"] == 6
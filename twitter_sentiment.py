@@ -4,7 +4,8 @@ twitter_sentiment.py
 
 This script uses Twitter's free API (via Tweepy) to fetch recent tweets containing a specific keyword
 (e.g., a cryptocurrency like "bitcoin"), performs sentiment analysis on each tweet using NLTK's VADER,
-and prints the results.
+and prints the results. The tweets are also stored in trend_data.db with source "twitter" (through the
+writer daemon when it is running), so source_comparison.py can set them against the Reddit posts.
 
 Dependencies:
   - tweepy
@@ -21,11 +22,15 @@ Usage:
 """
 
 import os
+import sqlite3
 import tweepy
 import datetime
 from nltk.sentiment import SentimentIntensityAnalyzer
 import nltk
 
+from records import TrendRecord
+from writer_daemon import connect_writer, create_tables, write_records
+
 # Download VADER lexicon (if not already present)
 nltk.download('vader_lexicon')
 
@@ -36,6 +41,10 @@ TWITTER_API_KEY = os.getenv("i8rs3xO7UQkP1FiXv5WAJBXWn", "i8rs3xO7UQkP1FiXv5WAJB
 TWITTER_API_SECRET = os.getenv("4nCyTPGrNx17tCTTngAPUwm4vH7pLx9NAVB47PoNDafLrFOTW9", "4nCyTPGrNx17tCTTngAPUwm4vH7pLx9NAVB47PoNDafLrFOTW9")
 TWITTER_BEARER_TOKEN = os.getenv("AAAAAAAAAAAAAAAAAAAAAIk3zgEAAAAAYBbcP2cfLc%2BPLFzigEAnnCIFS5A%3Dw9QhCWcE4xHPL9g0vsCIJGrm40jGdpjgBiRa3IvPlItcfNwGTE", "AAAAAAAAAAAAAAAAAAAAAIk3zgEAAAAAYBbcP2cfLc%2BPLFzigEAnnCIFS5A%3Dw9QhCWcE4xHPL9g0vsCIJGrm40jGdpjgBiRa3IvPlItcfNwGTE")
 
+DB_FILE = "trend_data.db"
+# The cryptos tracked by the Reddit aggregator; each one's tweets are stored under its name
+KEYWORDS = ["bitcoin", "ethereum", "solana", "dogecoin", "xrp"]
+
 def fetch_tweets(keyword, max_results=100):
     """
     Fetch recent tweets matching the keyword using Twitter's API v2.
@@ -51,7 +60,7 @@ def fetch_tweets(keyword, max_results=100):
     client = tweepy.Client(bearer_token=TWITTER_BEARER_TOKEN)
     # Build a query: search for keyword, exclude retweets, and only in English
     query = f"{keyword} -is:retweet lang:en"
-    tweets_response = client.search_recent_tweets(query=query, max_results=max_results, tweet_fields=["created_at", "text"])
+    tweets_response = client.search_recent_tweets(query=query, max_results=max_results, tweet_fields=["created_at", "text", "public_metrics"])
     if tweets_response.data is None:
         return []
     return tweets_response.data
@@ -69,24 +78,63 @@ def analyze_sentiment(text):
     sia = SentimentIntensityAnalyzer()
     return sia.polarity_scores(text)
 
+def to_trend_record(tweet, crypto, sentiment):
+    """
+    Convert a tweet and its sentiment scores into a TrendRecord. Likes map to `score` and replies to
+    `num_comments`, as in connectors.TwitterConnector.
+    """
+    metrics = tweet.public_metrics or {}
+    # created_at is timezone-aware UTC; trend_data stores naive UTC times
+    created = tweet.created_at.replace(tzinfo=None) if tweet.created_at else datetime.datetime.utcnow()
+    record = TrendRecord(
+        source="twitter",
+        post_id=str(tweet.id),
+        title=tweet.text,
+        score=metrics.get("like_count", 0),
+        num_comments=metrics.get("reply_count", 0),
+        created=created,
+        crypto=crypto,
+    )
+    record.set_sentiment(sentiment)
+    return record
+
+def store_tweets(records):
+    """Save TrendRecords to trend_data, through the writer daemon if one is running."""
+    writer = connect_writer()
+    if writer:
+        writer.send(records)
+        writer.flush()
+        writer.close()
+        return
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    create_tables(conn)
+    with conn:
+        write_records(conn, records)
+    conn.close()
+
 def main():
-    # Define the keyword for which to search tweets (e.g., "bitcoin")
-    keyword = "bitcoin"
-    print(f"Fetching tweets for keyword: {keyword}\n")
-    
-    tweets = fetch_tweets(keyword)
-    print(f"Found {len(tweets)} tweets. Analyzing sentiment...\n")
-    
-    # Iterate through the tweets and analyze sentiment
-    for tweet in tweets:
-        text = tweet.text
-        sentiment = analyze_sentiment(text)
-        # Using tweet.created_at if available; otherwise, show 'N/A'
-        created_at = tweet.created_at if tweet.created_at else "N/A"
-        print(f"Tweet: {text}")
-        print(f"Created At: {created_at}")
-        print(f"Sentiment: {sentiment}")
-        print("-" * 80)
+    records = []
+    for keyword in KEYWORDS:
+        print(f"Fetching tweets for keyword: {keyword}\n")
+
+        tweets = fetch_tweets(keyword)
+        print(f"Found {len(tweets)} tweets. Analyzing sentiment...\n")
+
+        # Iterate through the tweets and analyze sentiment
+        for tweet in tweets:
+            text = tweet.text
+            sentiment = analyze_sentiment(text)
+            # Using tweet.created_at if available; otherwise, show 'N/A'
+            created_at = tweet.created_at if tweet.created_at else "N/A"
+            print(f"Tweet: {text}")
+            print(f"Created At: {created_at}")
+            print(f"Sentiment: {sentiment}")
+            print("-" * 80)
+            records.append(to_trend_record(tweet, keyword, sentiment))
+
+    if records:
+        store_tweets(records)
+        print(f"Stored {len(records)} tweets in {DB_FILE}.")
 
 if __name__ == "__main__":
     main()
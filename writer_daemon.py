@@ -0,0 +1,452 @@
+#!/usr/bin/env python
+"""
+writer_daemon.py
+
+A single-writer process for trend_data.db.
+
+When several aggregators and the Pushshift backfill write to the same SQLite file at once, each one's
+connect-insert-commit cycle fights for the database write lock, which shows up as "database is locked"
+errors and stalls. This daemon is the only process that writes: it owns one connection (in WAL mode, so
+the API can keep reading while it writes), and producers hand it records over a local Unix socket.
+
+Records arriving from all producers go onto one queue; a single writer thread drains it and commits
+everything it finds (up to --max-batch records, waiting at most --max-delay seconds to fill a batch) in
+one transaction. Sending is a socket write, so producers never wait on the database or on each other;
+WriterClient.flush() is there for callers that need to know their records are committed.
+
+A batch that finds the database locked (e.g. by retention.py's VACUUM) is retried with backoff. A batch
+that fails for any other reason is written record by record, so one bad record costs only itself.
+Records that still cannot be written are dropped, logged to stderr, counted in db_write_errors and
+reported to their producer's next flush(), which raises instead of waiting forever.
+
+Producers pick the daemon up automatically: connect_writer() returns a client when the socket is live
+and None otherwise, in which case they fall back to writing directly.
+
+Usage:
+  python writer_daemon.py
+  python writer_daemon.py --db trend_data.db --socket trend_writer.sock --max-batch 5000
+"""
+
+import argparse
+import datetime
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Listener
+
+from engagement import LOOKUP_CHUNK, record_snapshots
+from metrics import METRICS_FILE, counter, histogram, write_textfile
+from search import create_search_index, sync_search_index
+from sentiment_index import update_sentiment_index
+from source_comparison import update_source_hourly
+
+DB_FILE = "trend_data.db"
+SOCKET_PATH = os.getenv("TREND_WRITER_SOCKET", "trend_writer.sock")
+AUTHKEY = b"cryptotrend-writer"
+
+WRITE_SECONDS = histogram("db_write_seconds", "Time to write one batch (rows, search index, snapshots)")
+ROWS_WRITTEN = counter("db_rows_written", "Rows written to trend_data")
+WRITE_ERRORS = counter("db_write_errors", "Records the writer daemon could not write and dropped")
+
+# Attempts at a batch while the database is locked, with the delay doubling from RETRY_DELAY seconds
+WRITE_RETRIES = 4
+RETRY_DELAY = 1.0
+
+# Re-polled posts update their existing row's numbers instead of adding another row
+INSERT_SQL = '''
+    INSERT INTO trend_data (title, crypto, score, num_comments, created, sentiment_neg, sentiment_neu, sentiment_pos, sentiment_compound, source, post_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (source, post_id) DO UPDATE SET
+        score = excluded.score, num_comments = excluded.num_comments, sentiment_neg = excluded.sentiment_neg,
+        sentiment_neu = excluded.sentiment_neu, sentiment_pos = excluded.sentiment_pos,
+        sentiment_compound = excluded.sentiment_compound
+'''
+
+# Columns added to trend_data since the first release, with their definitions
+ADDED_COLUMNS = (
+    # Databases from before tweets were stored only ever held Reddit posts
+    ("source", "TEXT DEFAULT 'reddit'"),
+    # Rows from before post ids were stored have none; retention.py dedupes those by title instead
+    ("post_id", "TEXT"),
+)
+
+
+def create_tables(conn):
+    """Create the trend_data table, its post key and its full-text index if they do not already exist."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS trend_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT,
+            crypto TEXT,
+            score INTEGER,
+            num_comments INTEGER,
+            created TEXT,
+            sentiment_neg REAL,
+            sentiment_neu REAL,
+            sentiment_pos REAL,
+            sentiment_compound REAL,
+            source TEXT DEFAULT 'reddit',
+            post_id TEXT
+        )
+    ''')
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(trend_data)")}
+    for name, definition in ADDED_COLUMNS:
+        if name not in columns:
+            conn.execute(f"ALTER TABLE trend_data ADD COLUMN {name} {definition}")
+    # One row per post; rows without a post id (NULL) never conflict
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS trend_data_post ON trend_data (source, post_id)")
+    conn.commit()
+    create_search_index(conn)
+
+
+def known_posts(conn, records):
+    """
+    Return {(source, post_id): (score, num_comments, sentiment_compound)} for the records whose post
+    already has a trend_data row, with one query per LOOKUP_CHUNK posts.
+    """
+    ids = list({(r.source, str(r.post_id)) for r in records if r.post_id is not None})
+    found = {}
+    for i in range(0, len(ids), LOOKUP_CHUNK):
+        chunk = ids[i:i + LOOKUP_CHUNK]
+        rows = conn.execute(f'''
+            WITH batch (source, post_id) AS (VALUES {", ".join("(?, ?)" for _ in chunk)})
+            SELECT t.source, t.post_id, t.score, t.num_comments, t.sentiment_compound
+            FROM batch b JOIN trend_data t ON t.source = b.source AND t.post_id = b.post_id
+        ''', [value for pair in chunk for value in pair])
+        for source, post_id, score, num_comments, compound in rows:
+            found[(source, post_id)] = (score, num_comments, compound)
+    return found
+
+
+def new_posts(records, known):
+    """The records whose post is not in `known` (see known_posts()), each post once."""
+    fresh = []
+    seen = set()
+    for record in records:
+        if record.post_id is None:
+            fresh.append(record)
+            continue
+        post = (record.source, str(record.post_id))
+        if post not in known and post not in seen:
+            seen.add(post)
+            fresh.append(record)
+    return fresh
+
+
+def write_records(conn, records):
+    """
+    Write a batch of records inside the caller's transaction: one trend_data row per post (a re-polled
+    post updates its score and comment count), their search index entries, engagement snapshots for
+    posts whose numbers changed, the sentiment index update and the per-source hourly totals.
+    Used both by the daemon and by producers writing directly.
+
+    Parameters:
+      conn (sqlite3.Connection): Open connection with a transaction in progress (e.g. `with conn:`).
+      records (list): TrendRecord objects with crypto and sentiment filled in.
+    """
+    with WRITE_SECONDS.time():
+        known = known_posts(conn, records)
+        conn.executemany(INSERT_SQL, [record.as_row() for record in records])
+        sync_search_index(conn)
+        record_snapshots(conn, records)
+        # Re-polled posts replace their index contribution; mentions count only new posts
+        update_sentiment_index(conn, records, known)
+        update_source_hourly(conn, new_posts(records, known))
+    ROWS_WRITTEN.inc(len(records))
+
+
+class FlushRequest:
+    """A flush marker queued behind a producer's records; set once they have been written or dropped."""
+
+    def __init__(self, producer):
+        self.producer = producer
+        self.done = threading.Event()
+        self.errors = []
+
+
+class WriterDaemon:
+    """
+    Owns the database connection and serializes writes from any number of producers.
+
+    Parameters:
+      db_file (str): SQLite database path.
+      address (str): Unix socket path to listen on.
+      max_batch (int): Most records committed in one transaction.
+      max_delay (float): Longest time (seconds) to wait for more records before committing a batch.
+      metrics_file (str): Optional path to rewrite with write metrics after every transaction,
+                          for node_exporter's textfile collector (see metrics.py).
+    """
+
+    def __init__(self, db_file=DB_FILE, address=SOCKET_PATH, max_batch=5000, max_delay=0.5,
+                 metrics_file=METRICS_FILE):
+        self.db_file = db_file
+        self.address = address
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.metrics_file = metrics_file
+        self.queue = queue.Queue()
+        self.listener = None
+        self.records_written = 0
+        self.transactions = 0
+        # Write errors per producer, reported on its next flush()
+        self._failures = {}
+        self._stopping = threading.Event()
+        self._serve_thread = None
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Only this process writes, so synchronous=NORMAL is safe under WAL and much cheaper per commit
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        create_tables(conn)
+        return conn
+
+    def _next_batch(self, first):
+        """
+        Collect records and flush markers into one batch, starting from an item already dequeued.
+        Returns the records, the producer each one came from, and the flush markers.
+        """
+        records, producers, waiters = [], [], []
+        deadline = time.monotonic() + self.max_delay
+        item = first
+        while True:
+            if isinstance(item, FlushRequest):
+                # A flush marker: everything queued before it is in this batch, so it can be released
+                waiters.append(item)
+                break
+            producer, batch = item
+            records.extend(batch)
+            producers.extend([producer] * len(batch))
+            if len(records) >= self.max_batch:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        return records, producers, waiters
+
+    def _commit(self, conn, records):
+        """
+        Write one batch, retrying while the database is locked (e.g. by a VACUUM). If it still fails,
+        write the records one at a time so a single bad record does not take the rest down with it.
+
+        Returns:
+          {index in records: error} for the records that could not be written.
+        """
+        delay = RETRY_DELAY
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                with conn:
+                    write_records(conn, records)
+                return {}
+            except sqlite3.OperationalError as exc:
+                if "locked" not in str(exc) and "busy" not in str(exc):
+                    break
+                if attempt == WRITE_RETRIES:
+                    # Record by record would only wait out the same lock once per record
+                    return {i: exc for i in range(len(records))}
+                print(f"Writer: database busy ({exc}), retrying in {delay:g}s", file=sys.stderr)
+                time.sleep(delay)
+                delay *= 2
+            except Exception:
+                break
+
+        failed = {}
+        for i, record in enumerate(records):
+            try:
+                with conn:
+                    write_records(conn, [record])
+            except Exception as exc:
+                failed[i] = exc
+        return failed
+
+    def _write_loop(self):
+        conn = self._open()
+        try:
+            while not (self._stopping.is_set() and self.queue.empty()):
+                try:
+                    first = self.queue.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+                records, producers, waiters = self._next_batch(first)
+                try:
+                    if records:
+                        failed = self._commit(conn, records)
+                        for i, exc in failed.items():
+                            self._failures.setdefault(producers[i], []).append(exc)
+                        if failed:
+                            WRITE_ERRORS.inc(len(failed))
+                            print(f"Writer: dropped {len(failed)} of {len(records)} records: "
+                                  f"{next(iter(failed.values()))!r}", file=sys.stderr)
+                        self.records_written += len(records) - len(failed)
+                        self.transactions += 1
+                        if self.metrics_file:
+                            write_textfile(self.metrics_file)
+                except Exception:
+                    # Never let the writer thread die: producers would queue into a void and flush() hang
+                    traceback.print_exc()
+                finally:
+                    for waiter in waiters:
+                        waiter.errors = self._failures.pop(waiter.producer, [])
+                        waiter.done.set()
+        finally:
+            conn.close()
+
+    def _handle(self, conn):
+        """Read messages from one producer until it disconnects."""
+        producer = object()
+        with conn:
+            while True:
+                try:
+                    kind, payload = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if kind == "records":
+                    self.queue.put((producer, payload))
+                elif kind == "flush":
+                    request = FlushRequest(producer)
+                    self.queue.put(request)
+                    while not request.done.wait(1):
+                        if not self._writer.is_alive():
+                            request.errors = [RuntimeError("writer thread is not running")]
+                            break
+                    if request.errors:
+                        conn.send(("error", f"{len(request.errors)} records were not written: "
+                                            f"{request.errors[0]!r}"))
+                    else:
+                        conn.send(("ok", None))
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.address):
+            return
+        try:
+            Client(self.address, family="AF_UNIX", authkey=AUTHKEY).close()
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(self.address)
+        else:
+            raise RuntimeError(f"A writer daemon is already listening on {self.address}")
+
+    def start(self):
+        """Open the socket and start the writer thread; serve_forever() then accepts producers."""
+        self._remove_stale_socket()
+        self.listener = Listener(self.address, family="AF_UNIX", authkey=AUTHKEY)
+        self._writer.start()
+
+    def serve_forever(self):
+        """Accept producer connections until stop() is called or the process is interrupted."""
+        if self.listener is None:
+            self.start()
+        self._serve_thread = threading.current_thread()
+        try:
+            while not self._stopping.is_set():
+                try:
+                    conn = self.listener.accept()
+                except OSError:
+                    break  # Listener closed by stop()
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            self.stop()
+
+    def _wake_listener(self):
+        try:
+            Client(self.address, family="AF_UNIX", authkey=AUTHKEY).close()
+        except OSError:
+            pass
+
+    def stop(self):
+        """Stop accepting producers, commit everything already queued and remove the socket."""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        if self.listener is not None:
+            if self._serve_thread not in (None, threading.current_thread()):
+                # Closing the socket does not interrupt a blocked accept(), so wake it with a throwaway
+                # connection; accept() then returns and the serving loop sees the stop flag
+                self._wake_listener()
+            self.listener.close()
+        if self._writer.is_alive():
+            self._writer.join()
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+class WriterClient:
+    """
+    Producer side of the writer daemon.
+
+    Parameters:
+      address (str): Unix socket path the daemon listens on.
+    """
+
+    def __init__(self, address=SOCKET_PATH):
+        self.address = address
+        self.conn = Client(address, family="AF_UNIX", authkey=AUTHKEY)
+        self._lock = threading.Lock()
+
+    def send(self, records):
+        """Hand a list of TrendRecord objects to the daemon without waiting for them to be committed."""
+        records = list(records)
+        if records:
+            with self._lock:
+                self.conn.send(("records", records))
+        return records
+
+    def flush(self):
+        """
+        Block until every record sent so far by this client has been committed. Raises RuntimeError
+        if the daemon could not write some of them.
+        """
+        with self._lock:
+            self.conn.send(("flush", None))
+            status, message = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Writer daemon: {message}")
+
+    def close(self):
+        self.conn.close()
+
+
+def connect_writer(address=SOCKET_PATH):
+    """Return a WriterClient if a daemon is listening on `address`, otherwise None."""
+    if not os.path.exists(address):
+        return None
+    try:
+        return WriterClient(address)
+    except (ConnectionRefusedError, FileNotFoundError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serialize all trend_data writes through one process.")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    parser.add_argument("--max-batch", type=int, default=5000)
+    parser.add_argument("--max-delay", type=float, default=0.5)
+    parser.add_argument("--metrics-file", default=METRICS_FILE,
+                        help="Write Prometheus metrics here after every transaction (textfile collector)")
+    args = parser.parse_args()
+
+    daemon = WriterDaemon(args.db, args.socket, args.max_batch, args.max_delay, args.metrics_file)
+    daemon.start()
+    print(f"Writer daemon listening on {args.socket}, writing to {args.db}. Press Ctrl+C to exit.")
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+        print(f"\n{datetime.datetime.now()}: wrote {daemon.records_written} records "
+              f"in {daemon.transactions} transactions")
+
+
+if __name__ == "__main__":
+    main()